@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+import metrics
+
+
+class QueueFullError(Exception):
+    """Raised when a search cannot even be queued because the wait queue is full."""
+
+    def __init__(self, queue_depth: int):
+        super().__init__(f"Search queue is full ({queue_depth} waiting)")
+        self.queue_depth = queue_depth
+
+
+class AdmissionController:
+    """
+    Limits how many searches run at once, shared by the /query endpoints and the Telegram bot.
+
+    At most SEARCH_MAX_CONCURRENCY searches run concurrently (default 4). Further requests wait
+    in a queue of at most SEARCH_MAX_QUEUE entries (default 32); beyond that they are rejected
+    immediately with QueueFullError. Waiters are grouped by key (client address or chat) and
+    served round-robin across keys, so a single busy client cannot starve the others.
+    """
+
+    def __init__(self, max_concurrent: int = None, max_queue: int = None):
+        self._max_concurrent = max_concurrent
+        self._max_queue = max_queue
+        self._active = 0
+        self._queued = 0
+        self._waiting: OrderedDict[str, deque] = OrderedDict()
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def max_concurrent(self) -> int:
+        if self._max_concurrent is not None:
+            return self._max_concurrent
+        return int(os.environ.get("SEARCH_MAX_CONCURRENCY", 4))
+
+    @property
+    def max_queue(self) -> int:
+        return self._max_queue if self._max_queue is not None else int(os.environ.get("SEARCH_MAX_QUEUE", 32))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def is_full(self) -> bool:
+        """True if a new request would be rejected right now."""
+        return self._active >= self.max_concurrent and self._queued >= self.max_queue
+
+    def _position(self, key: str, future: asyncio.Future) -> int:
+        """1-based position of a waiter in the round-robin service order."""
+        index = self._waiting[key].index(future)
+        position = 0
+        for round_ in range(index + 1):
+            for other_key, waiters in self._waiting.items():
+                if len(waiters) <= round_:
+                    continue
+                if other_key == key and round_ == index:
+                    return position + 1
+                position += 1
+        return position + 1
+
+    async def acquire(self, key: str, on_queued=None) -> None:
+        """
+        Wait for a search slot. on_queued, if given, is awaited with the queue position when the
+        request has to wait. Raises QueueFullError if the queue is full.
+        """
+        start = time.monotonic()
+        if self._active < self.max_concurrent and not self._queued:
+            self._active += 1
+            self._record_wait(start)
+            return
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            metrics.registry.inc("search_rejected_total")
+            raise QueueFullError(self._queued)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(key, deque()).append(future)
+        self._queued += 1
+        try:
+            if on_queued is not None:
+                await on_queued(self._position(key, future))
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self.release()
+            else:
+                # Cancelling the task also cancels the future it awaits, so it may already be done here.
+                future.cancel()
+                waiters = self._waiting.get(key)
+                if waiters is not None and future in waiters:
+                    waiters.remove(future)
+                    self._queued -= 1
+                    if not waiters:
+                        del self._waiting[key]
+            raise
+        self._record_wait(start)
+
+    def release(self) -> None:
+        """Free a slot, handing it to the next waiter in round-robin order if there is one."""
+        while self._waiting:
+            key, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._waiting.move_to_end(key)
+            else:
+                del self._waiting[key]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def admit(self, key: str, on_queued=None):
+        await self.acquire(key, on_queued)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _record_wait(self, start: float) -> None:
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if waited > 1:
+            logging.info("Search admitted after waiting %.2fs in queue", waited)
+
+    def export(self) -> None:
+        """Set the current queue gauges in the metrics registry, before it is rendered."""
+        metrics.registry.set("search_active", self._active)
+        metrics.registry.set("search_queue_depth", self._queued)
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self._queued,
+            "max_queue": self.max_queue,
+            "queued_keys": len(self._waiting),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds_avg": round(self.wait_seconds_total / self.admitted, 4) if self.admitted else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
+
+
+controller = AdmissionController()
@@ -1,63 +1,334 @@
+import startup  # first, so its clock starts before the other imports
 import os
+import sys
+import json
+import time
 import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, UploadFile,HTTPException
+from fastapi import FastAPI, File, UploadFile,HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
-import graphrag_utils
+import admission
+import index_builder
+import index_versions
+import llm_client
+import metrics
+import query_cache
+import request_log
 from pathlib import Path
 import asyncio
-import nest_asyncio
 from pydantic import BaseModel
 from typing import Optional
 
-# Apply nest_asyncio to solve event loop issues
-nest_asyncio.apply()
-
 # Configure logging.
 pid = os.getpid()
 logging.basicConfig(filename=f'process_server_{pid}.log', level=logging.INFO,
                     format="%(asctime)s [%(levelname)s] %(message)s")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+if __name__ == "__main__":
+    # telegram_bot imports this module as "agent"; make that this instance instead of a second copy of the app.
+    sys.modules.setdefault("agent", sys.modules[__name__])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.search.mark("app_started")
+    PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    watcher = asyncio.create_task(serve_index(PROJECT_DIRECTORY))
+    # In webhook mode the Telegram bot runs in this process, sharing its index, caches and search admission.
+    app.state.telegram = None
+    if os.environ.get("TELEGRAM_WEBHOOK_URL"):
+        import telegram_bot
+        await telegram_bot.webhook.start()
+        app.state.telegram = telegram_bot.webhook
+    yield
+    if app.state.telegram is not None:
+        await app.state.telegram.stop()
+    watcher.cancel()
+    await llm_client.close_client()
+
+
+async def serve_index(project_directory: str):
+    """
+    Import the search stack and load the index in the background while the server already answers,
+    then load each version the index builder activates as it appears.
+    """
+    await startup.search.preload(project_directory)
+    import index_store
+    await index_store.store.watch(project_directory)
+
+
 # API routes
-app = FastAPI(title="GraphRAG API", description="API for RAG operations")
+app = FastAPI(title="GraphRAG API", description="API for RAG operations", lifespan=lifespan)
 
 
 @app.post("/upload_file")
 async def upload_file(file: UploadFile = File(...)):
+    """
+    Store the upload and queue it for indexing. Returns immediately with a job ID; uploads
+    arriving within INDEX_BATCH_WINDOW seconds are indexed together by one `graphrag update`.
+    """
     try:
         PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
         UPLOAD_DIR = Path(PROJECT_DIRECTORY) / "input"
         UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-        file_content = await file.read()
-        file_location = UPLOAD_DIR / file.filename
-        with open(file_location, "wb") as f:
-            f.write(file_content)
-        await graphrag_utils.update_index(PROJECT_DIRECTORY)
-        return {"message": f"File '{file.filename}' has been uploaded successfully.",
-                "file_location": str(file_location)}
+        filename = Path(file.filename).name
+        file_location = UPLOAD_DIR / filename
+        # Stream to a temporary file so the indexer never picks up a partial upload
+        partial_location = UPLOAD_DIR / f".{filename}.part"
+        with open(partial_location, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        os.replace(partial_location, file_location)
+        job_id = index_builder.submit_job(PROJECT_DIRECTORY, filename)["job_id"]
+        return {"message": f"File '{filename}' has been uploaded successfully and queued for indexing.",
+                "file_location": str(file_location),
+                "job_id": job_id}
     except Exception as e:
         return {"error": str(e)}
 
 
+@app.get("/index_jobs/{job_id}")
+async def index_job_status(job_id: str):
+    """Status and progress of an indexing job created by /upload_file."""
+    status = index_builder.read_job(os.environ.get("WORK_DIRECTORY", "./ragtest"), job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return status
+
+
 class QueryRequest(BaseModel):
     query: str
-    mode: str = "global"
+    # local, global, dynamic, basic, or auto to pick one per question; anything else is a 422
+    mode: query_cache.SearchMode = "global"
+    # Include a per-stage timing breakdown in the response
+    timings: bool = False
 
 
 class Response(BaseModel):
     status: str
     data: Optional[str] = None
     message: Optional[str] = None
+    timings: Optional[list] = None
+
+
+def _busy(e: admission.QueueFullError) -> HTTPException:
+    return HTTPException(status_code=429, detail=f"Server busy, {e.queue_depth} questions queued. Please retry later.",
+                         headers={"Retry-After": "5"})
+
+
+def _not_ready(e: index_versions.IndexNotReadyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
 
 
 @app.post("/query", response_model=Response)
-async def query(request: QueryRequest):
+async def query(request: QueryRequest, http_request: Request):
+    start = time.perf_counter()
+    status = "error"
     try:
         PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
-        response, context = await graphrag_utils.query_index(PROJECT_DIRECTORY, request.query, request.mode)
+        index_versions.require_active_version(PROJECT_DIRECTORY)
+        with metrics.collect_timings() as timings, metrics.span("query", mode=request.mode):
+            await startup.search.ready()
+            import graphrag_utils
+            # Only a search that has to run waits for a slot; cached and coalesced answers skip admission.
+            response, context = await graphrag_utils.query_index(PROJECT_DIRECTORY, request.query, request.mode,
+                                                                 admission_key=_client_key(http_request))
         print("response:", response)
-        return Response(status="success", data=response)
+        status = "success"
+        return Response(status="success", data=response, timings=timings if request.timings else None)
+    except admission.QueueFullError as e:
+        status = "rejected"
+        raise _busy(e)
+    except index_versions.IndexNotReadyError as e:
+        status = "not_ready"
+        raise _not_ready(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        request_log.log.record("api", request.query, request.mode, time.perf_counter() - start, status)
+
+
+def _client_key(http_request: Request) -> str:
+    return http_request.client.host if http_request.client else "unknown"
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/query_stream")
+async def query_stream(request: QueryRequest, http_request: Request):
+    """
+    Streaming /query over Server-Sent Events. Sends a "context" event with retrieval timing and
+    context size, a "token" event per piece of the answer, and a final "done" event carrying the
+    same payload as the /query Response model.
+    """
+    PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    # Reject up front while a plain 429/503 can still be sent; the slot itself is taken once streaming starts.
+    try:
+        index_versions.require_active_version(PROJECT_DIRECTORY)
+    except index_versions.IndexNotReadyError as e:
+        request_log.log.record("api_stream", request.query, request.mode, 0.0, "not_ready")
+        raise _not_ready(e)
+    await startup.search.ready()
+    import graphrag_utils
+    if admission.controller.is_full() and not graphrag_utils.is_cached(PROJECT_DIRECTORY, request.query,
+                                                                       request.mode):
+        request_log.log.record("api_stream", request.query, request.mode, 0.0, "rejected")
+        raise _busy(admission.QueueFullError(admission.controller.queue_depth))
+    client_key = _client_key(http_request)
+
+    async def events():
+        start = time.perf_counter()
+        try:
+            async for event, data in graphrag_utils.stream_query_index(PROJECT_DIRECTORY, request.query,
+                                                                       request.mode, admission_key=client_key):
+                if event == "context":
+                    yield _sse("context", data)
+                elif event == "token":
+                    yield _sse("token", {"text": data})
+                else:
+                    final = Response(status="success", data=data)
+        except admission.QueueFullError as e:
+            final = Response(status="rejected", message=str(e))
+        except index_versions.IndexNotReadyError as e:
+            final = Response(status="not_ready", message=str(e))
+        except Exception as e:
+            logging.error("Error during streaming query: %s", e)
+            final = Response(status="error", message=str(e))
+        request_log.log.record("api_stream", request.query, request.mode, time.perf_counter() - start,
+                               final.status)
+        yield _sse("done", final.model_dump())
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/telegram/webhook")
+async def telegram_webhook(http_request: Request):
+    """Telegram Bot API updates, pushed by Telegram when TELEGRAM_WEBHOOK_URL is set."""
+    telegram = getattr(app.state, "telegram", None)
+    if telegram is None or not telegram.running:
+        raise HTTPException(status_code=404, detail="Telegram webhook mode is not enabled")
+    if not telegram.authorized(http_request.headers.get("X-Telegram-Bot-Api-Secret-Token")):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    await telegram.process(await http_request.json())
+    return {"ok": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Stage latency histograms, LLM token counters, errors and search admission in the Prometheus text format,
+    including those of the index builder process (git update, conversion, index builds and workflows).
+    """
+    admission.controller.export()
+    registry = metrics.registry
+    builder_metrics = index_builder.read_metrics(os.environ.get("WORK_DIRECTORY", "./ragtest"))
+    if builder_metrics is not None:
+        registry = registry.merged(builder_metrics)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admission_stats")
+async def admission_stats():
+    """Running searches, queue depth and wait times of the search admission controller."""
+    return admission.controller.stats()
+
+
+@app.get("/router_stats")
+async def router_stats():
+    """How often mode "auto" routed to each search mode, and the routing thresholds."""
+    await startup.search.ready()
+    import query_router
+    return query_router.router.stats()
+
+
+@app.get("/index_status")
+async def index_status():
+    """Load time and resident size of the in-memory GraphRAG index and of the prebuilt local search engines."""
+    await startup.search.ready()
+    import index_store
+    import local_search_index
+    return {**index_store.store.stats(), "local_search_engines": local_search_index.engines.stats()}
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """Hit/miss counters of the answer caches shared by /query and the Telegram bot, and of the warmed answers."""
+    await startup.search.ready()
+    import cache_warmer
+    import semantic_cache
+    return {"answers": query_cache.cache.stats(), "semantic": semantic_cache.cache.stats(),
+            "warm": cache_warmer.warmer.stats()}
+
+
+@app.get("/health")
+async def health():
+    """Liveness: answers as soon as the server listens, with this process's startup timings."""
+    return {"status": "ok", "pid": os.getpid(), "search_loaded": startup.search.loaded,
+            "startup": startup.search.report()}
+
+
+@app.get("/ready")
+async def ready():
+    """
+    200 once this process has the active index version loaded and can answer questions, 503 with
+    the reason and the index builder's progress until then.
+    """
+    PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    active = index_versions.active_version(PROJECT_DIRECTORY)
+    loaded = None
+    if startup.search.loaded:
+        import index_store
+        loaded = index_store.store.loaded_version(PROJECT_DIRECTORY)
+    if active is not None and loaded == active:
+        return {"status": "ready", "version": active}
+    reason = "index_not_built" if active is None else "index_loading" if startup.search.loaded else "starting"
+    return JSONResponse(status_code=503, headers={"Retry-After": "30"},
+                        content={"status": "not_ready", "reason": reason, "active_version": active,
+                                 "loaded_version": loaded,
+                                 "builder": index_builder.read_status(PROJECT_DIRECTORY)})
+
+
+@app.get("/index_build")
+async def index_build_status():
+    """State, current stage/workflow and timings of the index builder process."""
+    PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    return {**index_builder.read_status(PROJECT_DIRECTORY),
+            "active_version": index_versions.active_version(PROJECT_DIRECTORY)}
+
+
+@app.post("/index_build/cancel", response_model=Response)
+async def index_build_cancel():
+    """Cancel the running index build or update. The previous index version stays active."""
+    PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    if not index_builder.cancel(PROJECT_DIRECTORY):
+        raise HTTPException(status_code=409, detail="No index build is running")
+    return Response(status="success", message="Cancelling the index build")
+
+
+@app.get("/index_versions")
+async def index_versions_list():
+    """Active index version, versions kept for rollback and all versions on disk."""
+    PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    return index_versions.list_versions(PROJECT_DIRECTORY)
+
+
+@app.post("/index_rollback", response_model=Response)
+async def index_rollback():
+    """Re-activate the previous index version."""
+    PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    try:
+        version_id = index_versions.rollback(PROJECT_DIRECTORY)
+        return Response(status="success", data=version_id, message=f"Rolled back to index version {version_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 async def process_question(query: str) -> str:
@@ -70,31 +341,44 @@ async def process_question(query: str) -> str:
     Returns the answer as a string.
     """
     PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY","./ragtest")
+    await startup.search.ready()
+    import graphrag_utils
     response, context = await graphrag_utils.query_index(PROJECT_DIRECTORY, query, 'local')
     return response
 
 
-async def handler_data():
+async def process_question_stream(query: str, admission_key: str = None, on_queued=None):
+    """
+    Streaming variant of process_question: yields pieces of the answer as they are generated.
+    With an admission_key, a search that has to run waits for a search slot (see graphrag_utils.query_index).
+    """
     PROJECT_DIRECTORY = os.environ.get("WORK_DIRECTORY", "./ragtest")
-    try:
-        force_build = graphrag_utils.get_bool_env_var("FORCE_BUILD_GRAPH", default=False)
-        await graphrag_utils.build_index(PROJECT_DIRECTORY, force_build)
-    except Exception as e:
-        logging.error("Stopping index processing. Exception: %s", e)
-        return
+    await startup.search.ready()
+    import graphrag_utils
+    async for event, data in graphrag_utils.stream_query_index(PROJECT_DIRECTORY, query, 'local',
+                                                               admission_key=admission_key, on_queued=on_queued):
+        if event == "token":
+            yield data
 
 
 async def main():
-    asyncio.create_task(handler_data())
     config = uvicorn.Config(app, host="0.0.0.0", port=8000)
     server = uvicorn.Server(config)
     await server.serve()
 
 
+def run_workers(workers: int):
+    """Multi-worker mode: `workers` uvicorn processes serve the API from the memory-mapped index."""
+    uvicorn.run("agent:app", host="0.0.0.0", port=8000, workers=workers, app_dir=APP_DIR)
+
+
 def mask_string(s: str, visible_start: int, visible_end: int) -> str:
     return s[:visible_start] + '*' * (len(s) - visible_start - visible_end) + s[-visible_end:]
 
 
+startup.search.mark("app_imported")
+
+
 if __name__ == "__main__":
     # Load environment variables from .env file.
     load_dotenv()
@@ -125,4 +409,19 @@ if __name__ == "__main__":
     EMBEDDING_MODEL_BASE_URL = os.environ.get("EMBEDDING_API_BASE")
     print(f"EMBEDDING_MODEL_BASE_URL: {EMBEDDING_MODEL_BASE_URL}")
 
-    asyncio.run(main())
+    SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 1))
+    print(f"SERVER_WORKERS: {SERVER_WORKERS}")
+    # The index is built and updated by a separate process (index_builder.py), never on the serving event loop.
+    builder = index_builder.BuilderSupervisor()
+    builder.start()
+    try:
+        if SERVER_WORKERS > 1:
+            if os.environ.get("TELEGRAM_WEBHOOK_URL"):
+                # Registered once here; every worker serves the route with the same secret.
+                import telegram_bot
+                telegram_bot.webhook.register_for_workers()
+            run_workers(SERVER_WORKERS)
+        else:
+            asyncio.run(main())
+    finally:
+        builder.stop()
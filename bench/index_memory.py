@@ -0,0 +1,213 @@
+"""
+Resident memory of a loaded index in each table layout of index_tables.
+
+  full     pd.read_parquet of every column, as the index store used to load the tables
+  compact  only the columns search needs, categoricals, float32 embeddings and memory-mapped text
+  shared   compact with every column memory-mapped, as used with several SERVER_WORKERS
+Each load runs in a fresh interpreter and reports the process RSS growth (anonymous and file-backed
+pages separately, from /proc/self/status) and the size pandas reports for the tables. The GraphRAG
+query objects built from every layout are checked to be identical. Anonymous memory is private to
+each API worker; memory-mapped pages are shared by all workers through the page cache.
+
+Without an output folder a synthetic index shaped like GraphRAG's final tables is generated.
+
+    python bench/index_memory.py                          # synthetic index
+    python bench/index_memory.py ./graphrag_project/output/versions/<version>
+"""
+import gc
+import sys
+import json
+import random
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import pandas as pd
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import index_tables  # noqa: E402
+
+WORDS = ["computing", "network", "storage", "reward", "task", "node", "deploy", "token", "proof", "market",
+         "resource", "cluster", "contract", "wallet", "stake", "job", "image", "model", "space", "config"]
+TYPES = ["ORGANIZATION", "PERSON", "GEO", "EVENT", "TECHNOLOGY", "PRODUCT"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def make_index(folder: Path, entities: int, relationships: int, text_units: int, communities: int,
+               seed: int = 11) -> None:
+    """Write parquet tables with the columns of GraphRAG 1.2's create_final_* outputs."""
+    rng = random.Random(seed)
+    folder.mkdir(parents=True, exist_ok=True)
+    unit_ids = [f"unit-{i:08d}" for i in range(text_units)]
+    titles = [f"ENTITY {i}" for i in range(entities)]
+    entity_ids = [f"entity-{i:08d}" for i in range(entities)]
+    relationship_ids = [f"rel-{i:08d}" for i in range(relationships)]
+    levels = 3
+
+    pd.DataFrame({
+        "id": entity_ids, "human_readable_id": range(entities), "title": titles,
+        "type": [rng.choice(TYPES) for _ in range(entities)],
+        "description": [_sentence(rng, 60) for _ in range(entities)],
+        "text_unit_ids": [rng.sample(unit_ids, 3) for _ in range(entities)],
+    }).to_parquet(folder / index_tables.INDEX_TABLES["entities"])
+
+    node_rows = [(entity_ids[i], i, titles[i], rng.randrange(communities), level, rng.randint(1, 40),
+                  rng.random(), rng.random()) for level in range(levels) for i in range(entities)]
+    pd.DataFrame(node_rows, columns=["id", "human_readable_id", "title", "community", "level", "degree", "x", "y"]
+                 ).to_parquet(folder / index_tables.INDEX_TABLES["nodes"])
+
+    pairs = [rng.sample(range(entities), 2) for _ in range(relationships)]
+    pd.DataFrame({
+        "id": relationship_ids, "human_readable_id": range(relationships),
+        "source": [titles[a] for a, _ in pairs], "target": [titles[b] for _, b in pairs],
+        "description": [_sentence(rng, 30) for _ in range(relationships)],
+        "weight": [rng.random() * 10 for _ in range(relationships)],
+        "combined_degree": [rng.randint(2, 80) for _ in range(relationships)],
+        "text_unit_ids": [rng.sample(unit_ids, 2) for _ in range(relationships)],
+    }).to_parquet(folder / index_tables.INDEX_TABLES["relationships"])
+
+    pd.DataFrame({
+        "id": unit_ids, "human_readable_id": range(text_units),
+        "text": [_sentence(rng, 300) for _ in range(text_units)],
+        "n_tokens": [300] * text_units,
+        "document_ids": [[f"doc-{i // 10}"] for i in range(text_units)],
+        "entity_ids": [rng.sample(entity_ids, 5) for _ in range(text_units)],
+        "relationship_ids": [rng.sample(relationship_ids, 5) for _ in range(text_units)],
+    }).to_parquet(folder / index_tables.INDEX_TABLES["text_units"])
+
+    community_rows = {
+        "id": [f"community-{i}" for i in range(communities)], "human_readable_id": range(communities),
+        "community": range(communities), "parent": [-1] * communities,
+        "level": [i % levels for i in range(communities)], "title": [f"Community {i}" for i in range(communities)],
+    }
+    pd.DataFrame({
+        **community_rows,
+        "entity_ids": [rng.sample(entity_ids, 20) for _ in range(communities)],
+        "relationship_ids": [rng.sample(relationship_ids, 20) for _ in range(communities)],
+        "text_unit_ids": [rng.sample(unit_ids, 10) for _ in range(communities)],
+        "period": ["2026-01-01"] * communities, "size": [20] * communities,
+    }).to_parquet(folder / index_tables.INDEX_TABLES["communities"])
+
+    findings = [[{"summary": _sentence(rng, 8), "explanation": _sentence(rng, 80)} for _ in range(5)]
+                for _ in range(communities)]
+    pd.DataFrame({
+        **community_rows,
+        "summary": [_sentence(rng, 60) for _ in range(communities)],
+        "full_content": [_sentence(rng, 600) for _ in range(communities)],
+        "rank": [rng.random() * 10 for _ in range(communities)],
+        "rank_explanation": [_sentence(rng, 30) for _ in range(communities)],
+        "findings": findings,
+        "full_content_json": [json.dumps({"findings": f}) for f in findings],
+        "period": ["2026-01-01"] * communities, "size": [20] * communities,
+    }).to_parquet(folder / index_tables.INDEX_TABLES["community_reports"])
+
+
+def _memory_status() -> dict:
+    """Resident memory of this process in bytes, from /proc/self/status (Linux)."""
+    fields = {}
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0]) * 1024
+    return fields
+
+
+def _objects_digest(tables: dict) -> str:
+    """Digest of the GraphRAG query objects built from the tables, as the search engines build them."""
+    from graphrag.query.indexer_adapters import (
+        read_indexer_communities,
+        read_indexer_entities,
+        read_indexer_relationships,
+        read_indexer_reports,
+        read_indexer_text_units,
+    )
+
+    digest = hashlib.sha256()
+    for objects in (read_indexer_entities(tables["nodes"], tables["entities"], 2),
+                    read_indexer_relationships(tables["relationships"]),
+                    read_indexer_reports(tables["community_reports"], tables["nodes"], 2),
+                    read_indexer_text_units(tables["text_units"]),
+                    read_indexer_communities(tables["communities"], tables["nodes"], tables["community_reports"])):
+        for item in objects:
+            digest.update(repr(item).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def probe(folder: str, table_layout: str) -> dict:
+    """Load the tables into this (fresh) process and report what it cost."""
+    gc.collect()
+    start = _memory_status()
+    tables = {name: index_tables.load_table(folder, name, table_layout) for name in index_tables.INDEX_TABLES}
+    gc.collect()
+    loaded = _memory_status()
+    sizes = {name: index_tables.memory_bytes(df) for name, df in tables.items()}
+    return {
+        "rss_bytes": loaded["VmRSS"] - start["VmRSS"],
+        "rss_anon_bytes": loaded.get("RssAnon", 0) - start.get("RssAnon", 0),
+        "rss_file_bytes": loaded.get("RssFile", 0) - start.get("RssFile", 0),
+        "table_heap_bytes": sum(heap for heap, _ in sizes.values()),
+        "table_mapped_bytes": sum(mapped for _, mapped in sizes.values()),
+        "columns": {name: len(df.columns) for name, df in tables.items()},
+        "by_table_heap_bytes": {name: heap for name, (heap, _) in sizes.items()},
+        "objects_digest": _objects_digest(tables),
+    }
+
+
+def run_probe(folder: str, table_layout: str) -> dict:
+    args = [sys.executable, __file__, folder, "--probe", table_layout]
+    output = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare index memory in each table layout")
+    parser.add_argument("output_folder", nargs="?", help="Index output folder; a synthetic index if omitted")
+    parser.add_argument("--entities", type=int, default=20000)
+    parser.add_argument("--relationships", type=int, default=60000)
+    parser.add_argument("--text-units", type=int, default=10000)
+    parser.add_argument("--communities", type=int, default=1500)
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    parser.add_argument("--probe", choices=index_tables.LAYOUTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.output_folder, args.probe)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="index_memory_") as workdir:
+        folder = args.output_folder
+        if folder is None:
+            folder = str(Path(workdir) / "output")
+            make_index(Path(folder), args.entities, args.relationships, args.text_units, args.communities)
+        layouts = {}
+        for table_layout in index_tables.LAYOUTS:
+            # Write the memory-mapped files first, as the index builder does, and measure a load that maps them.
+            index_tables.prepare(folder, table_layout)
+            layouts[table_layout] = run_probe(folder, table_layout)
+
+    digests = {table_layout: result.pop("objects_digest") for table_layout, result in layouts.items()}
+    if len(set(digests.values())) != 1:
+        raise SystemExit(f"The table layouts produce different GraphRAG query objects: {digests}")
+    full_anon = layouts["full"]["rss_anon_bytes"]
+    report = {
+        "output_folder": args.output_folder or "synthetic",
+        "layouts": layouts,
+        "anon_reduction": {table_layout: round(1 - result["rss_anon_bytes"] / full_anon, 3)
+                           for table_layout, result in layouts.items() if full_anon},
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Local search context building, before and after prebuilding the lookup structures.
+
+Builds a synthetic graph (entities, relationships, text units, community reports) and compares,
+per query:
+  before  what graphrag.api.local_search does on every call: build a LocalSearchMixedContext from
+          the indexer objects, then build the context with its per-entity relationship scans
+  after   the prebuilt local_search_index.IndexedLocalContext, built once and reused
+The context text of both is checked to be identical. The vector store is replaced by a seeded
+in-memory one, so only context assembly is measured, without embedding calls.
+
+    python bench/local_context.py --entities 20000 --relationships 60000 --queries 50
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+import tiktoken
+import graphrag.config.defaults as defs
+from graphrag.model.community_report import CommunityReport
+from graphrag.model.entity import Entity
+from graphrag.model.relationship import Relationship
+from graphrag.model.text_unit import TextUnit
+from graphrag.query.context_builder.entity_extraction import EntityVectorStoreKey
+from graphrag.query.structured_search.local_search.mixed_context import LocalSearchMixedContext
+from graphrag.vector_stores.base import BaseVectorStore, VectorStoreDocument, VectorStoreSearchResult
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import stats  # noqa: E402
+from local_search_index import IndexedLocalContext  # noqa: E402
+
+# The context builder parameters graphrag.query.factory.get_local_search_engine uses with default settings.
+CONTEXT_PARAMS = {
+    "text_unit_prop": defs.LOCAL_SEARCH_TEXT_UNIT_PROP, "community_prop": defs.LOCAL_SEARCH_COMMUNITY_PROP,
+    "conversation_history_max_turns": defs.LOCAL_SEARCH_CONVERSATION_HISTORY_MAX_TURNS,
+    "conversation_history_user_turns_only": True,
+    "top_k_mapped_entities": defs.LOCAL_SEARCH_TOP_K_MAPPED_ENTITIES,
+    "top_k_relationships": defs.LOCAL_SEARCH_TOP_K_RELATIONSHIPS,
+    "include_entity_rank": True, "include_relationship_weight": True, "include_community_rank": False,
+    "return_candidate_context": False, "embedding_vectorstore_key": EntityVectorStoreKey.ID,
+    "max_tokens": defs.LOCAL_SEARCH_MAX_TOKENS,
+}
+
+
+class SeededVectorStore(BaseVectorStore):
+    """Returns the same pseudo-random entities for the same query text."""
+
+    def __init__(self, entity_ids: list):
+        super().__init__(collection_name="bench")
+        self.entity_ids = entity_ids
+
+    def connect(self, **kwargs):
+        pass
+
+    def load_documents(self, documents, overwrite=True):
+        pass
+
+    def filter_by_id(self, include_ids):
+        pass
+
+    def search_by_id(self, id):
+        return VectorStoreDocument(id=id, text=None, vector=None)
+
+    def similarity_search_by_vector(self, query_embedding, k=10, **kwargs):
+        return []
+
+    def similarity_search_by_text(self, text, text_embedder, k=10, **kwargs):
+        rng = random.Random(text)
+        return [VectorStoreSearchResult(document=VectorStoreDocument(id=entity_id, text=None, vector=None), score=1.0)
+                for entity_id in rng.sample(self.entity_ids, k)]
+
+
+def make_graph(entities: int, relationships: int, text_units: int, communities: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    units = [TextUnit(id=f"t{i}", short_id=str(i), text=f"Text unit {i} " + "lorem ipsum " * 40, n_tokens=90)
+             for i in range(text_units)]
+    entity_list = [Entity(id=f"e{i}", short_id=str(i), title=f"ENTITY {i}", type="ORGANIZATION",
+                          description=f"Entity {i} description " * 5,
+                          community_ids=[str(rng.randrange(communities))],
+                          text_unit_ids=[units[rng.randrange(text_units)].id for _ in range(3)],
+                          rank=rng.randint(1, 50))
+                   for i in range(entities)]
+    relationship_list = []
+    for i in range(relationships):
+        source, target = rng.sample(entity_list, 2)
+        relationship_list.append(Relationship(id=f"r{i}", short_id=str(i), source=source.title, target=target.title,
+                                              weight=rng.random(), description=f"{source.title} relates to "
+                                                                               f"{target.title}",
+                                              text_unit_ids=[units[rng.randrange(text_units)].id],
+                                              rank=rng.randint(1, 100)))
+    reports = [CommunityReport(id=f"c{i}", short_id=str(i), title=f"Community {i}", community_id=str(i),
+                               summary=f"Summary {i}", full_content=f"Community {i} report " * 30, rank=rng.random())
+               for i in range(communities)]
+    return {"entities": entity_list, "relationships": relationship_list, "text_units": units,
+            "community_reports": reports}
+
+
+def builder_args(graph: dict, token_encoder) -> dict:
+    return {
+        "community_reports": graph["community_reports"], "text_units": graph["text_units"],
+        "entities": graph["entities"], "relationships": graph["relationships"], "covariates": {"claims": []},
+        "entity_text_embeddings": SeededVectorStore([entity.id for entity in graph["entities"]]),
+        "embedding_vectorstore_key": EntityVectorStoreKey.ID, "text_embedder": None,
+        "token_encoder": token_encoder,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare local search context building before/after prebuilding")
+    parser.add_argument("--entities", type=int, default=5000)
+    parser.add_argument("--relationships", type=int, default=15000)
+    parser.add_argument("--text-units", type=int, default=3000)
+    parser.add_argument("--communities", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--encoding", default="cl100k_base", help="tiktoken encoding used to count context tokens")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    token_encoder = tiktoken.get_encoding(args.encoding)
+    graph = make_graph(args.entities, args.relationships, args.text_units, args.communities)
+    queries = [f"question {i}" for i in range(args.queries)]
+
+    start = time.perf_counter()
+    prebuilt = IndexedLocalContext(**builder_args(graph, token_encoder))
+    prebuild_seconds = time.perf_counter() - start
+
+    before, after = [], []
+    for query in queries:
+        start = time.perf_counter()
+        stock = LocalSearchMixedContext(**builder_args(graph, token_encoder))
+        expected = stock.build_context(query=query, **CONTEXT_PARAMS)
+        before.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = prebuilt.build_context(query=query, **CONTEXT_PARAMS)
+        after.append(time.perf_counter() - start)
+        if result.context_chunks != expected.context_chunks:
+            raise SystemExit(f"Context mismatch for query {query!r}")
+
+    results = {
+        "graph": {"entities": args.entities, "relationships": args.relationships, "text_units": args.text_units,
+                  "communities": args.communities},
+        "prebuild_seconds": round(prebuild_seconds, 4),
+        "before": stats.summarize(before, sum(before)),
+        "after": stats.summarize(after, sum(after)),
+        "speedup_p50": round(stats.percentile(before, 50) / stats.percentile(after, 50), 2),
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Replay a request log (REQUEST_LOG_PATH) against a running server, keeping the original traffic shape.
+
+Requests are sent at their original relative times divided by --speed (0 sends them as fast as
+possible), with at most --concurrency in flight. Telegram questions are replayed through /query.
+Reports throughput, latency percentiles and error rates, overall and per search mode.
+
+    python bench/replay.py logs/requests.jsonl --url http://127.0.0.1:8000 --speed 2 --concurrency 8
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import stats  # noqa: E402
+
+
+def load_log(path: str, limit: int = None, sources: list = None) -> list:
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if sources and entry.get("source") not in sources:
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries[:limit] if limit else entries
+
+
+def stream_status(body: str) -> str:
+    """The status of the final "done" event of a /query_stream response, or "incomplete" without one."""
+    status = "incomplete"
+    for block in body.split("\n\n"):
+        lines = block.splitlines()
+        if "event: done" not in lines:
+            continue
+        data = "\n".join(line[len("data: "):] for line in lines if line.startswith("data: "))
+        try:
+            status = json.loads(data).get("status") or "incomplete"
+        except ValueError:
+            status = "incomplete"
+    return status
+
+
+async def replay(entries: list, url: str, speed: float, concurrency: int, timeout: float, stream: bool) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    lags = []
+    path = "/query_stream" if stream else "/query"
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        async def send(entry: dict, due: float):
+            async with semaphore:
+                # How far behind the original schedule the request goes out, e.g. when concurrency is the limit.
+                lags.append(max(0.0, time.perf_counter() - due))
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json={"query": entry["query"], "mode": entry.get("mode", "local")})
+                    if response.status_code != 200:
+                        outcome = f"http_{response.status_code}"
+                    elif stream:
+                        outcome = stream_status(response.text)
+                    else:
+                        outcome = "success"
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                results.append((entry.get("mode", "local"), outcome, time.perf_counter() - start))
+
+        tasks = []
+        start = time.perf_counter()
+        first_ts = entries[0]["ts"] if entries else 0
+        for entry in entries:
+            due = start + ((entry["ts"] - first_ts) / speed if speed > 0 else 0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(entry, due)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    def summary(rows: list) -> dict:
+        latencies = [latency for _, outcome, latency in rows if outcome == "success"]
+        return stats.summarize(latencies, elapsed, errors=len(rows) - len(latencies))
+
+    report = {
+        "requests": len(entries),
+        "speed": speed,
+        "concurrency": concurrency,
+        "original_seconds": round(entries[-1]["ts"] - first_ts, 3) if entries else 0.0,
+        "overall": summary(results),
+        "by_mode": {mode: summary([row for row in results if row[0] == mode])
+                    for mode in sorted({row[0] for row in results})},
+        "outcomes": dict(Counter(outcome for _, outcome, _ in results)),
+        "schedule_lag_seconds": {"p50": round(stats.percentile(lags, 50), 4),
+                                 "p95": round(stats.percentile(lags, 95), 4),
+                                 "max": round(max(lags), 4) if lags else 0.0},
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a request log against a running server")
+    parser.add_argument("log", help="JSONL request log written with REQUEST_LOG_PATH")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed relative to the original timing (2 = twice as fast, 0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--source", nargs="+", help="Only replay requests from these sources (api, api_stream, telegram)")
+    parser.add_argument("--stream", action="store_true", help="Send requests to /query_stream instead of /query")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    entries = load_log(args.log, args.limit, args.source)
+    if not entries:
+        parser.error(f"No requests to replay in {args.log}")
+    print(f"Replaying {len(entries)} requests against {args.url} (speed {args.speed}, concurrency {args.concurrency})")
+    report = asyncio.run(replay(entries, args.url, args.speed, args.concurrency, args.timeout, args.stream))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
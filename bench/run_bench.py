@@ -0,0 +1,328 @@
+"""
+Offline benchmark: runs the agent against the local stub LLM (bench/stub_llm.py) and writes the results
+as JSON, so runs of different versions can be diffed.
+
+Measured:
+  cold_start  import time, first index load and first query of a fresh process
+  build       build_index (git update, markdown conversion, full GraphRAG build) over synthetic
+              markdown corpora of increasing size
+  query       query_index throughput and p50/p95/p99 latency per search mode and concurrency level
+  upload      /upload_file response time and time until the queued incremental update is active
+
+    python bench/run_bench.py --sizes 10 50 --concurrency 1 4 16 --queries 32 --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+import stats  # noqa: E402
+
+# Words the synthetic documents are made of; capitalized names become graph entities.
+NAMES = ["Swan", "Chain", "Orchestrator", "Provider", "Lagrange", "Nebula", "Filecoin", "Ethereum", "Validator",
+         "Bridge", "Atlas", "Mercury", "Saturn", "Galaxy", "Horizon", "Aurora", "Zenith", "Pioneer", "Beacon",
+         "Harbor", "Summit", "Vector", "Quasar", "Pulsar", "Comet", "Meteor", "Cosmos", "Orbit", "Nova", "Titan"]
+WORDS = ["computing", "network", "storage", "reward", "task", "node", "deploy", "token", "proof", "market",
+         "resource", "cluster", "contract", "wallet", "stake", "job", "image", "model", "space", "config"]
+
+
+def make_corpus(directory: Path, documents: int, seed: int = 42) -> None:
+    """Create a git repository of synthetic markdown documents, standing in for the documentation repo."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(documents):
+        section = directory / f"section_{i % 10}"
+        section.mkdir(exist_ok=True)
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            names = rng.sample(NAMES, 3)
+            words = rng.choices(WORDS, k=40)
+            paragraphs.append(f"{names[0]} works with {names[1]} and {names[2]}. " + " ".join(words) + ".")
+        body = "\n\n".join(paragraphs)
+        (section / f"doc_{i}.md").write_text(f"# Document {i}\n\n## {rng.choice(NAMES)} overview\n\n{body}\n",
+                                             encoding="utf-8")
+    git = ["git", "-C", str(directory), "-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+    subprocess.run(["git", "init", "-q", str(directory)], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "Synthetic corpus"], check=True)
+
+
+def stub_env(port: int) -> dict:
+    base = f"http://127.0.0.1:{port}/v1"
+    return {
+        "LLM_API_BASE": base, "LLM_BASE_URL": base, "LLM_API_KEY": "stub", "LLM_MODEL": "stub-chat",
+        "EMBEDDING_API_BASE": base, "EMBEDDING_API_KEY": "stub", "EMBEDDING_MODEL": "stub-embedding",
+    }
+
+
+def make_project(project: Path, port: int) -> None:
+    """GraphRAG project with the repo's settings.yaml and a .env pointing at the stub server."""
+    from graphrag.cli.initialize import initialize_project_at
+
+    initialize_project_at(project)
+    shutil.copy(REPO_DIR / "settings.yaml", project / "settings.yaml")
+    (project / ".env").write_text("".join(f"{k}={v}\n" for k, v in stub_env(port).items()), encoding="utf-8")
+
+
+def start_stub(args) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, str(BENCH_DIR / "stub_llm.py"), "--port", str(args.port),
+                                "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+                                "--embedding-latency", str(args.embedding_latency)])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{args.port}/stats", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Stub LLM server did not start")
+
+
+def stub_counters(port: int) -> dict:
+    return httpx.get(f"http://127.0.0.1:{port}/stats", timeout=5).json()["counters"]
+
+
+def counter_delta(before: dict, after: dict) -> dict:
+    return {name: after[name] - before.get(name, 0) for name in after}
+
+
+def question(i: int) -> str:
+    # Distinct questions, so neither the answer cache nor request coalescing hides the search cost.
+    return f"How does {NAMES[i % len(NAMES)]} use {WORDS[i % len(WORDS)]} ({i})?"
+
+
+async def bench_build(args, workdir: Path) -> tuple[list, Path]:
+    import graphrag_utils
+    import index_store
+    import index_versions
+
+    results = []
+    project = None
+    for size in args.sizes:
+        corpus = workdir / f"corpus_{size}"
+        make_corpus(corpus, size)
+        project = workdir / f"project_{size}"
+        make_project(project, args.port)
+        os.environ["REPO_URL"] = str(corpus)
+        before = stub_counters(args.port)
+        start = time.perf_counter()
+        await graphrag_utils.build_index(str(project), force_build_graph=True)
+        seconds = time.perf_counter() - start
+        if index_versions.active_version(str(project)) is None:
+            raise RuntimeError(f"Index build over {size} documents failed, see {workdir / 'bench.log'}")
+        snapshot = await asyncio.to_thread(index_store.store.get, str(project))
+        results.append({
+            "documents": size,
+            "seconds": round(seconds, 3),
+            "rows": {name: len(df) for name, df in snapshot.tables.items()},
+            "llm": counter_delta(before, stub_counters(args.port)),
+        })
+        logging.info("Built index over %d documents in %.2fs", size, seconds)
+        print(f"build {size} documents: {seconds:.2f}s")
+    return results, project
+
+
+async def bench_queries(args, project: Path) -> list:
+    import graphrag_utils
+
+    results = []
+    offset = 0
+    for mode in args.modes:
+        # Warm up: the first query loads the index and the prompts.
+        await graphrag_utils.query_index(str(project), question(10_000), mode)
+        for concurrency in args.concurrency:
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies, errors = [], 0
+
+            async def one(i: int):
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    try:
+                        await graphrag_utils.query_index(str(project), question(i), mode)
+                    except Exception as e:
+                        errors += 1
+                        logging.error("Benchmark query failed: %s", e)
+                        return
+                    latencies.append(time.perf_counter() - start)
+
+            before = stub_counters(args.port)
+            start = time.perf_counter()
+            await asyncio.gather(*(one(offset + i) for i in range(args.queries)))
+            elapsed = time.perf_counter() - start
+            offset += args.queries
+            result = {"mode": mode, "concurrency": concurrency, **stats.summarize(latencies, elapsed, errors),
+                      "llm": counter_delta(before, stub_counters(args.port))}
+            results.append(result)
+            print(f"query {mode} c={concurrency}: {result['throughput_rps']} req/s, "
+                  f"p50 {result['latency_seconds']['p50']}s, p95 {result['latency_seconds']['p95']}s")
+    return results
+
+
+async def bench_upload(args, project: Path) -> dict:
+    import agent
+    import index_builder
+
+    os.environ["WORK_DIRECTORY"] = str(project)
+    # /upload_file only writes job files; the index builder process normally picks them up.
+    builder = asyncio.create_task(index_builder.IndexBuilder(str(project)).run())
+    transport = httpx.ASGITransport(app=agent.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            upload_latencies, job_ids = [], []
+            start = time.perf_counter()
+            for i in range(args.uploads):
+                content = f"{NAMES[i]} Upload {i}\n\n{NAMES[i]} partners with {NAMES[i + 1]} on {WORDS[i]}.\n"
+                started = time.perf_counter()
+                response = await client.post("/upload_file", files={"file": (f"upload_{i}.txt", content.encode())})
+                upload_latencies.append(time.perf_counter() - started)
+                body = response.json()
+                if response.status_code != 200 or "job_id" not in body:
+                    raise RuntimeError(f"Upload {i} failed: {body}")
+                job_ids.append(body["job_id"])
+            statuses = {}
+            deadline = time.perf_counter() + args.upload_timeout
+            while len(statuses) < len(job_ids):
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"Uploads not indexed after {args.upload_timeout}s, "
+                                       f"{len(statuses)} of {len(job_ids)} jobs finished")
+                if builder.done():
+                    raise RuntimeError(f"Index builder stopped: {builder.exception()}")
+                await asyncio.sleep(0.5)
+                for job_id in job_ids:
+                    status = (await client.get(f"/index_jobs/{job_id}")).json()
+                    if status["status"] in ("succeeded", "failed", "cancelled"):
+                        statuses[job_id] = status
+            indexed = time.perf_counter() - start
+    finally:
+        builder.cancel()
+    result = {
+        "uploads": args.uploads,
+        "upload_latency_seconds": stats.summarize(upload_latencies, sum(upload_latencies))["latency_seconds"],
+        "seconds_until_indexed": round(indexed, 3),
+        "failed": sum(1 for status in statuses.values() if status["status"] != "succeeded"),
+    }
+    print(f"upload {args.uploads} files: indexed after {indexed:.2f}s")
+    return result
+
+
+def bench_cold_start(project: Path) -> dict:
+    """Run the cold start probe in a fresh interpreter."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, __file__, "--cold-start-probe", str(project)], check=True,
+                            capture_output=True, text=True, env=os.environ.copy(), cwd=project).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_seconds"] = round(time.perf_counter() - start, 3)
+    print(f"cold start: {result}")
+    return result
+
+
+async def cold_start_probe(project: str) -> dict:
+    start = time.perf_counter()
+    import agent  # noqa: F401
+    import graphrag_utils
+    import index_store
+    imported = time.perf_counter()
+    await asyncio.to_thread(index_store.store.get, project)
+    loaded = time.perf_counter()
+    await graphrag_utils.query_index(project, question(20_000), "local")
+    answered = time.perf_counter()
+    return {"import_seconds": round(imported - start, 3), "index_load_seconds": round(loaded - imported, 3),
+            "first_query_seconds": round(answered - loaded, 3)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "-C", str(REPO_DIR), "rev-parse", "--short", "HEAD"], check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args, workdir: Path) -> dict:
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {name: value for name, value in vars(args).items() if name != "cold_start_probe"},
+        },
+    }
+    results["build"], project = await bench_build(args, workdir)
+    results["cold_start"] = await asyncio.to_thread(bench_cold_start, project)
+    results["query"] = await bench_queries(args, project)
+    if args.uploads:
+        results["upload"] = await bench_upload(args, project)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark against a local stub LLM")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50], help="Corpus sizes (documents) to index")
+    parser.add_argument("--modes", nargs="+", default=["local", "global"], help="Search modes to benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrent queries")
+    parser.add_argument("--queries", type=int, default=32, help="Queries per mode and concurrency level")
+    parser.add_argument("--uploads", type=int, default=3, help="Files uploaded through /upload_file (0 skips)")
+    parser.add_argument("--upload-timeout", type=float, default=600,
+                        help="Seconds to wait for the uploads to be indexed")
+    parser.add_argument("--port", type=int, default=8910, help="Port of the stub LLM server")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub seconds per chat request")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Stub generation speed, 0 = instant")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Stub seconds per embedding call")
+    parser.add_argument("--workdir", help="Directory for corpora and projects (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary working directory")
+    parser.add_argument("--output", help="Result file (default: bench/results/<commit>-<time>.json)")
+    parser.add_argument("--cold-start-probe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Searches answer from the index every time; caches are measured separately.
+    os.environ.update(stub_env(args.port))
+    os.environ.update({"ANSWER_CACHE_SIZE": "0", "SEMANTIC_CACHE_ENABLED": "false", "INDEX_BATCH_WINDOW": "0",
+                       "SEARCH_MAX_QUEUE": "100000"})
+
+    if args.cold_start_probe:
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(asyncio.run(cold_start_probe(args.cold_start_probe))))
+        return
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="graphrag-bench-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    # Configure logging before the agent module does, so its log ends up in the working directory.
+    logging.basicConfig(filename=workdir / "bench.log", level=logging.INFO,
+                        format="%(asctime)s [%(levelname)s] %(message)s")
+    stub = start_stub(args)
+    try:
+        results = asyncio.run(run(args, workdir))
+    finally:
+        stub.terminate()
+        stub.wait()
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = Path(args.output or BENCH_DIR / "results" / f"{results['meta']['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
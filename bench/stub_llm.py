@@ -0,0 +1,179 @@
+"""
+Local OpenAI-compatible stub for benchmarks: /v1/chat/completions (plain and streamed) and /v1/embeddings.
+
+Answers are shaped after the GraphRAG prompt they respond to (entity extraction tuples, description
+summaries, community report JSON, global search map points, plain answers), so a full index build and
+every search mode run against it. Latency is simulated as a fixed per-request delay plus the generated
+tokens at a fixed rate.
+
+    python bench/stub_llm.py --port 8910 --latency 0.2 --tokens-per-second 50
+"""
+import re
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ENTITY_TYPES = ["ORGANIZATION", "PERSON", "GEO", "EVENT"]
+_CAPITALIZED = re.compile(r"\b[A-Z][a-zA-Z]{2,}\b")
+_WORD = re.compile(r"\w+")
+
+settings = {"latency": 0.0, "tokens_per_second": 0.0, "embedding_latency": 0.0, "dimensions": 256}
+counters = {"chat": 0, "chat_streamed": 0, "embeddings": 0, "embedded_texts": 0, "completion_tokens": 0}
+
+app = FastAPI(title="Stub LLM")
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(_WORD.findall(text)))
+
+
+def _extraction(text: str) -> str:
+    names = list(dict.fromkeys(word.upper() for word in _CAPITALIZED.findall(text)))[:8]
+    records = [f'("entity"<|>{name}<|>{ENTITY_TYPES[len(name) % len(ENTITY_TYPES)]}<|>{name} is mentioned in '
+               f'the document in relation to {", ".join(n for n in names if n != name)[:200]})' for name in names]
+    records += [f'("relationship"<|>{source}<|>{target}<|>{source} and {target} appear in the same text<|>5)'
+                for source, target in zip(names, names[1:])]
+    return "##".join(records) + "<|COMPLETE|>"
+
+
+def _community_report(text: str) -> str:
+    names = list(dict.fromkeys(_CAPITALIZED.findall(text)))[:5] or ["Community"]
+    return json.dumps({
+        "title": f"{names[0]} and related entities",
+        "summary": f"This community is centred on {', '.join(names)}.",
+        "rating": 5.0,
+        "rating_explanation": "Synthetic rating from the benchmark stub.",
+        "findings": [{"summary": f"{name} is part of the community",
+                      "explanation": f"{name} is connected to the other entities of this community."}
+                     for name in names],
+    })
+
+
+def _reply(messages: list) -> str:
+    """Pick a response shaped for the GraphRAG prompt in the messages."""
+    last = messages[-1]["content"] if messages else ""
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    if "Answer Y or N" in last:
+        return "N"
+    if last.startswith("MANY entities and relationships were missed"):
+        return "<|COMPLETE|>"
+    if "identify all entities of those types from the text" in prompt:
+        return _extraction(prompt.rsplit("Text:", 1)[-1])
+    if "generating a comprehensive summary of the data provided below" in prompt:
+        descriptions = prompt.rsplit("Description List:", 1)[-1]
+        return " ".join(descriptions.split())[:1000]
+    if "Write a comprehensive report of a community" in prompt:
+        return _community_report(prompt.rsplit("Text:", 1)[-1])
+    if '"points"' in prompt:
+        return json.dumps({"points": [{"description": "The data tables describe the requested topic "
+                                                      "[Data: Reports (0)]", "score": 60}]})
+    question = last[-200:]
+    return ("Based on the indexed documentation, here is a synthetic answer for benchmarking. " * 4 +
+            f"The question was: {question}")
+
+
+def _usage(messages: list, answer: str) -> dict:
+    prompt_tokens = sum(_count_tokens(str(message.get("content", ""))) for message in messages)
+    completion_tokens = _count_tokens(answer)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _embed(text: str) -> list:
+    """Hashed bag of words: texts sharing words get similar vectors, identical texts identical ones."""
+    vector = np.zeros(settings["dimensions"], dtype=np.float32)
+    for word in _WORD.findall(text.casefold()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        vector[int.from_bytes(digest[:4], "little") % len(vector)] += 1 if digest[4] & 1 else -1
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    answer = _reply(messages)
+    usage = _usage(messages, answer)
+    model = body.get("model", "stub")
+    created = int(time.time())
+    counters["completion_tokens"] += usage["completion_tokens"]
+    await asyncio.sleep(settings["latency"])
+
+    if not body.get("stream"):
+        counters["chat"] += 1
+        if settings["tokens_per_second"]:
+            await asyncio.sleep(usage["completion_tokens"] / settings["tokens_per_second"])
+        return JSONResponse({
+            "id": f"stub-{counters['chat']}", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    counters["chat_streamed"] += 1
+
+    async def events():
+        pieces = re.findall(r"\S+\s*", answer) or [answer]
+        for i, piece in enumerate(pieces):
+            if settings["tokens_per_second"]:
+                await asyncio.sleep(1 / settings["tokens_per_second"])
+            chunk = {"id": "stub-stream", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece},
+                                  "finish_reason": "stop" if i == len(pieces) - 1 else None}]}
+            if i == len(pieces) - 1:
+                chunk["usage"] = usage
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    counters["embeddings"] += 1
+    counters["embedded_texts"] += len(inputs)
+    await asyncio.sleep(settings["embedding_latency"])
+    return JSONResponse({
+        "object": "list", "model": body.get("model", "stub-embedding"),
+        "data": [{"object": "embedding", "index": i, "embedding": _embed(str(text))} for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": sum(_count_tokens(str(text)) for text in inputs),
+                  "total_tokens": sum(_count_tokens(str(text)) for text in inputs)},
+    })
+
+
+@app.get("/stats")
+async def stats():
+    return {"settings": settings, "counters": counters}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM and embedding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8910)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every chat request")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Simulated generation speed; 0 returns the whole answer at once")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds added to every embedding call")
+    parser.add_argument("--dimensions", type=int, default=256, help="Embedding dimensions")
+    args = parser.parse_args()
+    settings.update(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                    embedding_latency=args.embedding_latency, dimensions=args.dimensions)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+
+import graphrag_utils
+import index_store
+import index_versions
+import query_cache
+import request_log
+
+# Written to the version folder: the warmed answers and how long warming took.
+WARM_FILE = "warm_answers.json"
+
+
+class CacheWarmer:
+    """
+    Answers the most frequent recent questions against a new index version before it is activated,
+    so the first users after a build or update do not pay for a cold search.
+
+    The index builder runs warm() on the new version folder: it takes the questions of an FAQ file
+    (CACHE_WARM_FAQ, one question per line, asked in each of CACHE_WARM_FAQ_MODES) and then the
+    most frequent successful questions of the last CACHE_WARM_WINDOW seconds of the request log, up
+    to CACHE_WARM_TOP_N (0 disables warming), answers them CACHE_WARM_CONCURRENCY at a time for at
+    most CACHE_WARM_TIMEOUT seconds, and writes the answers next to the index tables. Each API
+    process adds them to its answer cache the first time it serves the version (seed()) and counts
+    how many of its questions they answered.
+    """
+
+    def __init__(self):
+        self._seeded = {}
+        self._warmed = set()
+        self.version = None
+        self.report = None
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def top_n(self) -> int:
+        return int(os.environ.get("CACHE_WARM_TOP_N", 20))
+
+    @property
+    def window(self) -> float:
+        return float(os.environ.get("CACHE_WARM_WINDOW", 7 * 86400))
+
+    @property
+    def concurrency(self) -> int:
+        return max(1, int(os.environ.get("CACHE_WARM_CONCURRENCY", 2)))
+
+    @property
+    def timeout(self) -> float:
+        return float(os.environ.get("CACHE_WARM_TIMEOUT", 300))
+
+    @property
+    def faq_path(self) -> str:
+        return os.environ.get("CACHE_WARM_FAQ", "")
+
+    @property
+    def faq_modes(self) -> list:
+        return [mode.strip() for mode in os.environ.get("CACHE_WARM_FAQ_MODES", "local,global").split(",")
+                if mode.strip() in query_cache.SEARCH_MODES]
+
+    def _faq_questions(self) -> list:
+        if not self.faq_path:
+            return []
+        try:
+            with open(self.faq_path, encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        except OSError as e:
+            logging.warning("Could not read FAQ file %s: %s", self.faq_path, e)
+            return []
+        return [(mode, question) for question in questions for mode in self.faq_modes]
+
+    def _logged_questions(self) -> list:
+        """(mode, query) of successful logged questions from the last window, most frequent first."""
+        if not request_log.log.enabled or not os.path.exists(request_log.log.path):
+            return []
+        since = time.time() - self.window
+        counts = Counter()
+        asked = {}
+        with open(request_log.log.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("ts", 0) < since or entry.get("status") != "success" \
+                        or entry.get("mode") not in query_cache.SEARCH_MODES:
+                    continue
+                key = (entry["mode"], query_cache.normalize_query(entry["query"]))
+                counts[key] += 1
+                asked.setdefault(key, entry["query"])
+        return [(mode, asked[(mode, normalized)]) for (mode, normalized), _ in counts.most_common()]
+
+    def questions(self) -> list:
+        """Questions to warm, FAQ first, without repeats, at most CACHE_WARM_TOP_N."""
+        selected = {}
+        for mode, query in self._faq_questions() + self._logged_questions():
+            selected.setdefault((mode, query_cache.normalize_query(query)), (mode, query))
+        return list(selected.values())[:self.top_n]
+
+    async def warm(self, project_directory: str, output_folder: str) -> dict:
+        """Answer the warm-up questions on a not yet active version and store them in its folder."""
+        # An updated version is a copy of its base, including the answers warmed on the base's index.
+        try:
+            os.remove(os.path.join(output_folder, WARM_FILE))
+        except FileNotFoundError:
+            pass
+        questions = self.questions() if self.top_n > 0 else []
+        if not questions:
+            return None
+        start = time.perf_counter()
+        # Loaded by a store of its own: the version is not active yet, so the shared store must not serve it.
+        snapshot = await asyncio.to_thread(index_store.IndexStore().get, project_directory, output_folder)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def answer(mode: str, query: str):
+            async with semaphore:
+                response, _ = await graphrag_utils._search(snapshot, query, mode)
+                return {"mode": mode, "query": query, "response": response}
+
+        tasks = [asyncio.create_task(answer(mode, query)) for mode, query in questions]
+        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+        answers = []
+        for task in done:
+            if task.exception() is not None:
+                logging.warning("Could not warm an answer: %s", task.exception())
+            else:
+                answers.append(task.result())
+        report = {
+            "version": index_versions.version_of(output_folder),
+            "questions": len(questions),
+            "answered": len(answers),
+            "failed": len(done) - len(answers),
+            "timed_out": len(pending),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        with open(os.path.join(output_folder, WARM_FILE), "w", encoding="utf-8") as f:
+            json.dump({**report, "answers": answers}, f, ensure_ascii=False)
+        logging.info("Warmed %d of %d answers for index version %s in %.1fs", len(answers), len(questions),
+                     report["version"], report["seconds"])
+        return report
+
+    def seed(self, project_directory: str, version: str) -> None:
+        """Put the warmed answers of a version into this process's answer cache, once per version."""
+        key = os.path.abspath(project_directory)
+        if self._seeded.get(key) == version:
+            return
+        self._seeded[key] = version
+        path = os.path.join(index_versions.version_folder(project_directory, version), WARM_FILE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                warmed = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Could not read warmed answers %s: %s", path, e)
+            return
+        self._warmed = set()
+        for answer in warmed.pop("answers"):
+            cache_key = query_cache.cache.key(version, answer["mode"], answer["query"])
+            query_cache.cache.put(cache_key, (answer["response"], {}))
+            self._warmed.add(cache_key)
+        self.version, self.report = version, warmed
+        self.lookups = self.hits = 0
+        logging.info("Seeded the answer cache with %d warmed answers for index version %s", len(self._warmed),
+                     version)
+
+    def record(self, key: tuple) -> None:
+        """Count a question against the warmed version, before the answer cache is consulted."""
+        if key[0] != self.version:
+            return
+        self.lookups += 1
+        if key in self._warmed and query_cache.cache.get(key) is not None:
+            self.hits += 1
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "warm": self.report,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+
+warmer = CacheWarmer()
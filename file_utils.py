@@ -1,45 +1,265 @@
 import os
 import re
+import json
+import hashlib
 import subprocess
 import logging
-import glob
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 import markdown
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+# Written to the conversion output directory; maps each markdown source to its content hash and output file.
+MANIFEST_FILE = ".md_manifest.json"
+
 
 # --------------------
 # Helper Functions for Repository & Conversion
 # --------------------
-def update_repo(local_repo_path: str) -> None:
-    """Clone the repository if it doesn't exist, or pull the latest changes."""
+# Only markdown is checked out: the clone is shallow, fetches blobs on demand, and its sparse checkout
+# holds the markdown files only (non-cone patterns, matched at any depth).
+SPARSE_PATTERNS = ["*.md"]
+
+
+@dataclass
+class RepoChangeset:
+    """
+    Markdown files (paths relative to the repository root) changed between two commits of the docs
+    repository. old_head is None when there is no commit to compare with, and every file counts.
+    """
+    old_head: str = None
+    new_head: str = None
+    added: list = field(default_factory=list)
+    modified: list = field(default_factory=list)
+    deleted: list = field(default_factory=list)
+
+    @property
+    def full(self) -> bool:
+        """True when there is no delta, e.g. nothing was indexed yet: every file has to be looked at."""
+        return self.old_head is None
+
+    @property
+    def moved(self) -> bool:
+        return self.old_head != self.new_head
+
+    @property
+    def paths(self) -> set:
+        return set(self.added) | set(self.modified) | set(self.deleted)
+
+
+def _git(local_repo_path: str, *args) -> str:
+    return subprocess.run(["git", "-C", local_repo_path, *args], check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+def diff_markdown(local_repo_path: str, old_head: str, new_head: str) -> RepoChangeset:
+    """Markdown files added, modified and deleted between two commits. Renames count as a deletion and an addition."""
+    changes = RepoChangeset(old_head=old_head, new_head=new_head)
+    if old_head == new_head:
+        return changes
+    output = _git(local_repo_path, "diff", "--name-status", "--no-renames", old_head, new_head, "--", *SPARSE_PATTERNS)
+    for line in output.splitlines():
+        status, _, path = line.partition("\t")
+        if status == "A":
+            changes.added.append(path)
+        elif status == "D":
+            changes.deleted.append(path)
+        else:
+            changes.modified.append(path)
+    return changes
+
+
+def _has_commit(local_repo_path: str, commit: str) -> bool:
+    """True if the commit is in the clone, fetching it (shallow) if it is not."""
+    for attempt in range(2):
+        try:
+            _git(local_repo_path, "cat-file", "-e", f"{commit}^{{commit}}")
+            return True
+        except subprocess.CalledProcessError:
+            if attempt:
+                return False
+        try:
+            _git(local_repo_path, "fetch", "--depth", "1", "origin", commit)
+        except subprocess.CalledProcessError:
+            return False
+
+
+def update_repo(local_repo_path: str, since: str = None) -> RepoChangeset:
+    """
+    Clone the repository if it doesn't exist, or fetch its latest commit. Returns the markdown
+    files changed between the commit `since` (the one the index was built from) and the new HEAD;
+    old_head == new_head when nothing moved. Without `since`, or if that commit cannot be fetched,
+    old_head is None and no delta is computed.
+    """
     repo_url = os.getenv("REPO_URL")
     if not os.path.exists(local_repo_path):
         logging.info("Cloning repository...")
-        subprocess.run(["git", "clone", repo_url, local_repo_path], check=True)
+        subprocess.run(["git", "clone", "--depth", "1", "--filter=blob:none", "--no-checkout", repo_url,
+                        local_repo_path], check=True)
+        _git(local_repo_path, "sparse-checkout", "set", "--no-cone", *SPARSE_PATTERNS)
+        _git(local_repo_path, "checkout")
+        new_head = _git(local_repo_path, "rev-parse", "HEAD")
     else:
-        logging.info("Repository exists. Pulling latest changes...")
-        subprocess.run(["git", "-C", local_repo_path, "pull"], check=True)
+        logging.info("Repository exists. Fetching latest changes...")
+        old_head = _git(local_repo_path, "rev-parse", "HEAD")
+        branch = _git(local_repo_path, "rev-parse", "--abbrev-ref", "HEAD")
+        _git(local_repo_path, "fetch", "--depth", "1", "origin", branch)
+        new_head = _git(local_repo_path, "rev-parse", "FETCH_HEAD")
+        if new_head != old_head:
+            _git(local_repo_path, "reset", "--hard", new_head)
+
+    if since is None:
+        return RepoChangeset(new_head=new_head)
+    if since != new_head and not _has_commit(local_repo_path, since):
+        logging.warning("Indexed commit %s is not available, looking at every markdown file.", since[:12])
+        return RepoChangeset(new_head=new_head)
+    changes = diff_markdown(local_repo_path, since, new_head)
+    logging.info("Repository at %s (indexed %s): %d added, %d modified, %d deleted markdown files.", new_head[:12],
+                 since[:12], len(changes.added), len(changes.modified), len(changes.deleted))
+    return changes
+
+_HTML_TAG_PATTERN = re.compile('<.*?>')
+# One Markdown instance per process, reset between files, instead of building a new one for every file
+_markdown_converter = None
+
 
 def remove_html_tags(text: str) -> str:
     """Remove HTML tags from a string."""
-    clean = re.compile('<.*?>')
-    return re.sub(clean, '', text)
+    return _HTML_TAG_PATTERN.sub('', text)
+
+@dataclass
+class ConversionChangeset:
+    """Markdown sources (paths relative to the input directory) grouped by what the conversion did with them."""
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+def _output_name(rel_path: str) -> str:
+    """Flatten a relative markdown path into the output file name, e.g. dir/sub/page.md -> dir_sub_page.txt."""
+    dir_prefix = os.path.dirname(rel_path).replace(os.sep, '_')
+    base_name = os.path.splitext(os.path.basename(rel_path))[0]
+
+    # If the file is in a subdirectory, add the directory prefix
+    final_name = f"{dir_prefix}_{base_name}" if dir_prefix else base_name
+    return final_name + ".txt"
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-def convert_markdown_to_text(input_dir: str, output_dir: str) -> None:
+
+def _load_manifest(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_manifest(output_dir: str, manifest: dict) -> None:
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _scan_input(input_dir: str) -> tuple[dict, list]:
+    """Walk the input directory once, skipping hidden entries like .git. Returns (file counts by extension, markdown paths)."""
+    file_counts = {}
+    md_files = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if name.startswith('.'):
+                continue
+            ext = os.path.splitext(name)[1]
+            file_counts[ext] = file_counts.get(ext, 0) + 1
+            if ext == ".md":
+                md_files.append(os.path.join(root, name))
+    return file_counts, sorted(md_files)
+
+
+def convert_markdown_file(file: str, out_file: str) -> None:
+    """Convert a single Markdown file to plain text."""
+    with open(file, "r", encoding="utf-8") as f:
+        md_text = f.read()
+    global _markdown_converter
+    if _markdown_converter is None:
+        _markdown_converter = markdown.Markdown()
+    html = _markdown_converter.reset().convert(md_text)
+    text = " ".join(html.splitlines())
+
+    # Remove HTML tags from the text
+    clean_text = remove_html_tags(text)
+
+    with open(out_file, "w", encoding="utf-8") as out:
+        out.write(clean_text)
+
+
+def _convert_batch(jobs: list) -> list:
+    """Convert a batch of (markdown file, output file) pairs. Returns the error message or None for each pair."""
+    errors = []
+    for file, out_file in jobs:
+        try:
+            convert_markdown_file(file, out_file)
+            errors.append(None)
+        except Exception as e:
+            errors.append(str(e))
+    return errors
+
+
+def _convert_parallel(jobs: list, workers: int, batch_size: int) -> list:
+    """Convert in a process pool. Files are sent in batches to keep per-file IPC overhead low."""
+    # Small jobs are split so that every worker still gets a batch
+    batch_size = max(1, min(batch_size, -(-len(jobs) // workers)))
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    logging.info("Converting %d markdown files with %d workers in %d batches", len(jobs), workers, len(batches))
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_errors in executor.map(_convert_batch, batches):
+            errors.extend(batch_errors)
+    return errors
+
+
+def _record_error(changeset: ConversionChangeset, manifest: dict, new_manifest: dict, file: str, rel_path: str,
+                  error) -> None:
+    changeset.errors[rel_path] = str(error)
+    logging.error("Error converting file %s: %s", file, error)
+    # Keep the last good entry, so the file is retried next time without its old output being removed
+    if rel_path in manifest:
+        new_manifest[rel_path] = manifest[rel_path]
+
+
+def convert_markdown_to_text(input_dir: str, output_dir: str, workers: int = None,
+                             batch_size: int = 32, only: set = None) -> ConversionChangeset:
     """
     Convert all Markdown files in the input directory (recursively) to plain-text files.
     Save the resulting .txt files in the output directory.
+
+    A manifest in the output directory maps each source to its content hash and output file.
+    Only added or changed sources are converted, outputs of deleted sources are removed, and
+    unchanged outputs are left untouched so their mtimes stay meaningful. Returns the changeset.
+
+    With more than one worker (MARKDOWN_WORKERS when not given) the conversion runs in a process
+    pool, batch_size files per task. Output names are the same as in the serial mode.
+
+    only, if given, is the set of sources known to have changed (e.g. RepoChangeset.paths); other
+    sources already in the manifest are kept as they are without being read.
     """
     os.makedirs(output_dir, exist_ok=True)
 
     # Count total number of files by extension
-    file_counts = {}
-    all_files = glob.glob(os.path.join(input_dir, "**/*"), recursive=True)
-    for file in all_files:
-        if os.path.isfile(file):
-            ext = os.path.splitext(file)[1]
-            file_counts[ext] = file_counts.get(ext, 0) + 1
+    file_counts, md_files = _scan_input(input_dir)
 
     # Print the count of each file type
     for ext, count in file_counts.items():
@@ -47,40 +267,70 @@ def convert_markdown_to_text(input_dir: str, output_dir: str) -> None:
         logging.info("Number of %s files: %d", ext if ext else "no extension", count)
 
     # Count number of Markdown files
-    md_files = glob.glob(os.path.join(input_dir, "**/*.md"), recursive=True)
     logging.info("Number of Markdown files: %d", len(md_files))
 
     if not md_files:
         logging.error("No markdown files found in %s", input_dir)
         raise ValueError("No markdown files found in input")
 
-    txt_file_count = 0  # Count number of generated text files
+    manifest = _load_manifest(output_dir)
+    new_manifest = {}
+    changeset = ConversionChangeset()
+    to_convert = []
     for file in md_files:
+        # Get the relative path and convert it to a filename prefix
+        rel_path = os.path.relpath(file, input_dir)
+        out_name = _output_name(rel_path)
+        previous = manifest.get(rel_path)
+        if only is not None and rel_path not in only and previous \
+                and os.path.exists(os.path.join(output_dir, out_name)):
+            changeset.unchanged.append(rel_path)
+            new_manifest[rel_path] = previous
+            continue
         try:
-            # Get the relative path and convert it to a filename prefix
-            rel_path = os.path.relpath(file, input_dir)
-            dir_prefix = os.path.dirname(rel_path).replace(os.sep, '_')
-            base_name = os.path.splitext(os.path.basename(file))[0]
-
-            # If the file is in a subdirectory, add the directory prefix
-            final_name = f"{dir_prefix}_{base_name}" if dir_prefix else base_name
+            digest = _file_hash(file)
+        except Exception as e:
+            _record_error(changeset, manifest, new_manifest, file, rel_path, e)
+            continue
+        if previous and previous["sha256"] == digest and os.path.exists(os.path.join(output_dir, out_name)):
+            changeset.unchanged.append(rel_path)
+            new_manifest[rel_path] = previous
+        else:
+            to_convert.append((file, rel_path, digest, out_name))
 
-            with open(file, "r", encoding="utf-8") as f:
-                md_text = f.read()
-            html = markdown.markdown(md_text)
-            text = " ".join(html.splitlines())
+    if workers is None:
+        workers = int(os.environ.get("MARKDOWN_WORKERS", 1))
+    jobs = [(file, os.path.join(output_dir, out_name)) for file, _, _, out_name in to_convert]
+    if workers > 1 and len(jobs) > 1:
+        errors = _convert_parallel(jobs, workers, batch_size)
+    else:
+        errors = _convert_batch(jobs)
 
-            # Remove HTML tags from the text
-            clean_text = remove_html_tags(text)
+    for (file, rel_path, digest, out_name), error in zip(to_convert, errors):
+        if error is not None:
+            _record_error(changeset, manifest, new_manifest, file, rel_path, error)
+            continue
+        (changeset.changed if rel_path in manifest else changeset.added).append(rel_path)
+        new_manifest[rel_path] = {"sha256": digest, "output": out_name}
 
-            out_file = os.path.join(output_dir, final_name + ".txt")
-            with open(out_file, "w", encoding="utf-8") as out:
-                out.write(clean_text)
+    # Remove outputs whose source was deleted, unless another source still maps to the same name
+    live_outputs = {entry["output"] for entry in new_manifest.values()}
+    for rel_path, entry in manifest.items():
+        if rel_path in new_manifest:
+            continue
+        changeset.removed.append(rel_path)
+        if entry["output"] not in live_outputs:
+            out_file = os.path.join(output_dir, entry["output"])
+            if os.path.exists(out_file):
+                os.remove(out_file)
+    _save_manifest(output_dir, new_manifest)
 
-            txt_file_count += 1  # Increment text file count
-        except Exception as e:
-            logging.error("Error converting file %s: %s", file, e)
+    txt_file_count = len(changeset.added) + len(changeset.changed)
     print(f"Number of generated text files: {txt_file_count}")
-    print(f"Converted {len(md_files)} markdown files to text in {output_dir}.")
+    print(f"Converted {txt_file_count} of {len(md_files)} markdown files to text in {output_dir} "
+          f"({len(changeset.unchanged)} unchanged, {len(changeset.removed)} removed).")
     logging.info("Number of generated text files: %d", txt_file_count)
-    logging.info("Converted %d markdown files to text in %s.", len(md_files), output_dir)
\ No newline at end of file
+    logging.info("Converted %d of %d markdown files to text in %s (%d added, %d changed, %d unchanged, %d removed).",
+                 txt_file_count, len(md_files), output_dir, len(changeset.added), len(changeset.changed),
+                 len(changeset.unchanged), len(changeset.removed))
+    return changeset
@@ -3,17 +3,27 @@ import shutil
 
 # Import Microsoft GraphRAG API and
 import graphrag.api as api
-import pandas as pd
-import requests
-import yaml
 from graphrag.cli.initialize import initialize_project_at
 from graphrag.config.load_config import load_config
 from graphrag.index.typing import PipelineRunResult
 from pathlib import Path
 import subprocess
 import logging
+from contextlib import asynccontextmanager
+import admission
+import cache_warmer
 import file_utils
+import index_store
+import index_tables
+import llm_client
+import index_versions
+import query_cache
+import semantic_cache
+import metrics
+import query_router
+import local_search_index
 import asyncio
+import time
 
 
 def copy_specified_files(src_dir: str, dest_dir: str, files_to_copy: list):
@@ -53,11 +63,13 @@ def copy_specified_files(src_dir: str, dest_dir: str, files_to_copy: list):
 # --------------------
 # GraphRAG Indexing
 # --------------------
-async def build_index(project_directory: str, force_build_graph=False):
+async def build_index(project_directory: str, force_build_graph=False, progress=None):
     """
     Build the GraphRAG index using the provided configuration and query it to retrieve enriched context.
     Skips index building if output files exist (unless FORCE_BUILD_GRAPH is True).
     If test_mode is True, only use a limited set of files for testing.
+    progress, if given, is told each stage by progress.stage(name) and receives the GraphRAG
+    workflow callbacks of the build (see index_builder.BuildProgress).
     """
 
     setting_yaml = os.path.join(project_directory, "settings.yaml")
@@ -70,10 +82,9 @@ async def build_index(project_directory: str, force_build_graph=False):
         copy_specified_files(os.getcwd(), project_directory, [".env", "settings.yaml"])
 
     graphRagConfig = load_config(Path(project_directory), Path(setting_yaml))
-    graphRagConfig.storage.base_dir = os.path.join(project_directory, "output")
     graphRagConfig.reporting.base_dir = os.path.join(project_directory, "logs")
-    graphRagConfig.embeddings.vector_store['db_uri'] = os.path.join(project_directory, "output/lancedb")
     # Determine the input directory based on test mode
+    changeset = None
     if get_bool_env_var("TEST_MODE", default=False):
         data_dir = "test_input"
         test_input_dir = os.path.join(project_directory, data_dir)
@@ -85,53 +96,169 @@ async def build_index(project_directory: str, force_build_graph=False):
         data_dir = "input"
         abs_input_dir = os.path.join(project_directory, data_dir)
         LOCAL_REPO_PATH = os.path.join(project_directory, "doc_swanchain_repo")
-        file_utils.update_repo(LOCAL_REPO_PATH)
+
+    # Define output file paths of the active index version.
+    output_folder = index_versions.active_folder(project_directory)
+    entities_path = os.path.join(output_folder, "create_final_entities.parquet")
+    communities_path = os.path.join(output_folder, "create_final_communities.parquet")
+    community_reports_path = os.path.join(output_folder, "create_final_community_reports.parquet")
+    index_built = os.path.exists(entities_path) and os.path.exists(communities_path) and os.path.exists(
+        community_reports_path)
+
+    repo_changes = None
+    if data_dir == "input":
+        if progress:
+            progress.stage("git_update")
+        # The delta is taken against the commit the active index was built from, not the previous checkout,
+        # so changes pulled by an update that then failed or was cancelled are picked up again.
+        indexed_commit = index_versions.source_commit(project_directory) if index_built else None
+        with metrics.span("git_update"):
+            repo_changes = file_utils.update_repo(LOCAL_REPO_PATH, since=indexed_commit)
+        if index_built and not force_build_graph and not repo_changes.full and not repo_changes.moved:
+            logging.info("Repository unchanged at %s, skipping conversion and index update.", repo_changes.new_head)
+            return
         # Converted text files will be saved under the "input" folder.
-        file_utils.convert_markdown_to_text(LOCAL_REPO_PATH, abs_input_dir)
+        if progress:
+            progress.stage("markdown_conversion")
+        with metrics.span("markdown_conversion"):
+            # With a known indexed commit only the files git reports as changed are read; otherwise all of them.
+            only = None if repo_changes.full else repo_changes.paths
+            changeset = file_utils.convert_markdown_to_text(LOCAL_REPO_PATH, abs_input_dir, only=only)
         logging.info("Using input directory: %s", abs_input_dir)
     if not has_files(abs_input_dir):
         raise ValueError(f"No files found in {abs_input_dir}, cannot build index.\n")
         return
-
-    # Define output file paths.
-    output_folder = os.path.join(project_directory, "output")
-    entities_path = os.path.join(output_folder, "create_final_entities.parquet")
-    communities_path = os.path.join(output_folder, "create_final_communities.parquet")
-    community_reports_path = os.path.join(output_folder, "create_final_community_reports.parquet")
-
-    if not force_build_graph and os.path.exists(entities_path) and os.path.exists(communities_path) and os.path.exists \
-                (community_reports_path):
+    source_commit = repo_changes.new_head if repo_changes else None
+
+    if not force_build_graph and index_built:
+        if repo_changes and not repo_changes.full:
+            # The conversion manifest may already hold files of an earlier, failed update; git knows what the
+            # active index is missing.
+            added, changed, removed = repo_changes.added, repo_changes.modified, repo_changes.deleted
+        elif changeset is not None:
+            added, changed, removed = changeset.added, changeset.changed, changeset.removed
+        else:
+            added = changed = removed = []
+        if changed or removed:
+            # graphrag update only indexes documents with new titles; edits and deletions need a full rebuild.
+            logging.warning("%d changed and %d removed markdown files are not reflected in the index until it is "
+                            "rebuilt with FORCE_BUILD_GRAPH.", len(changed), len(removed))
+        if added:
+            logging.info("Index already built, updating it with %d added markdown files.", len(added))
+            if progress:
+                progress.stage("index_update")
+            await update_index(project_directory, source_commit=source_commit)
+            return
         logging.info("Index already built, skipping index build.")
+        if source_commit:
+            # Nothing the update could add: remember the commit so the next start skips the repository.
+            index_versions.write_source_commit(project_directory, index_versions.active_version(project_directory),
+                                               source_commit)
     else:
         logging.info("Building GraphRAG index...")
+        # Build into a fresh version directory; queries keep using the active version until it is swapped in.
+        version_id, version_folder = index_versions.create_version(project_directory)
+        graphRagConfig.storage.base_dir = version_folder
+        graphRagConfig.embeddings.vector_store['db_uri'] = os.path.join(version_folder, "lancedb")
+        callbacks = [metrics.WorkflowTimingCallbacks("build")]
+        if progress:
+            progress.stage("index_build")
+            callbacks.append(progress)
         try:
-            index_result: list[PipelineRunResult] = await api.build_index(config=graphRagConfig)
+            with metrics.span("index_build"):
+                index_result: list[PipelineRunResult] = await api.build_index(config=graphRagConfig,
+                                                                                callbacks=callbacks)
+            failed = False
             for workflow_result in index_result:
                 if workflow_result.errors:
+                    failed = True
                     logging.error("Workflow '%s' encountered errors: %s", workflow_result.workflow,
                                   workflow_result.errors)
                 else:
                     logging.info("Workflow '%s' succeeded. Details: %s", workflow_result.workflow,
                                  workflow_result.__dict__)
+        except asyncio.CancelledError:
+            logging.warning("Index build cancelled, keeping index version %s active.",
+                            index_versions.active_version(project_directory))
+            index_versions.discard(project_directory, version_id)
+            raise
         except Exception as e:
             logging.error("Exception during index building: %s", e)
+            index_versions.discard(project_directory, version_id)
             raise
+        if failed:
+            logging.error("Index build had errors, keeping index version %s active.",
+                          index_versions.active_version(project_directory))
+            index_versions.discard(project_directory, version_id)
+            return
+        if progress:
+            progress.stage("index_prepare")
+        prepare_version(version_folder)
+        if progress:
+            progress.stage("cache_warm")
+        await warm_version(project_directory, version_folder)
+        if source_commit:
+            index_versions.write_source_commit(project_directory, version_id, source_commit)
+        index_versions.activate(project_directory, version_id)
+        index_versions.gc(project_directory)
+
+
+def prepare_version(output_folder: str):
+    """Write the memory-mapped table files of a new index version before it is activated."""
+    try:
+        with metrics.span("index_prepare"):
+            index_tables.prepare(output_folder)
+    except Exception as e:
+        logging.warning("Could not prepare memory-mapped index tables in %s: %s", output_folder, e)
+
+
+async def warm_version(project_directory: str, output_folder: str):
+    """Answer frequent questions on a new index version before it is activated (see cache_warmer)."""
+    try:
+        with metrics.span("cache_warm"):
+            await cache_warmer.warmer.warm(project_directory, output_folder)
+    except Exception as e:
+        logging.warning("Could not warm the answer cache for %s: %s", output_folder, e)
 
 
-async def update_index(project_directory: str):
+async def update_index(project_directory: str, on_output=None, source_commit: str = None):
+    """
+    Run `graphrag update` on a copy of the active version and activate it. source_commit, if given, is
+    the docs repository commit the input was converted from; it is stored with the new version.
+    """
     logging.info("Updating build GraphRAG index...")
+    # Update a copy of the active version, then swap it in, so queries never see a half-written index.
+    version_id, version_folder = index_versions.create_version(
+        project_directory, base_version=index_versions.active_version(project_directory))
+    settings_path = index_versions.write_version_settings(project_directory, version_id)
     try:
-        settings_path = os.path.join(project_directory, "settings.yaml")
-        await run_graphrag_update(config_path=settings_path, root_path=project_directory, verbose=True)
+        # The update runs in a `graphrag update` subprocess, so only its total duration is recorded.
+        with metrics.span("index_update"):
+            await run_graphrag_update(config_path=settings_path, root_path=project_directory, verbose=True,
+                                      logger="print", on_output=on_output)
+        index_versions.merge_update_output(project_directory, version_id)
         logging.info("Updated build GraphRAG index...")
+    except asyncio.CancelledError:
+        logging.warning("Index update cancelled.")
+        index_versions.discard(project_directory, version_id)
+        raise
     except Exception as e:
         logging.error("Exception during index building: %s", e)
+        index_versions.discard(project_directory, version_id)
         raise
+    finally:
+        os.remove(settings_path)
+    prepare_version(version_folder)
+    await warm_version(project_directory, version_folder)
+    if source_commit:
+        index_versions.write_source_commit(project_directory, version_id, source_commit)
+    index_versions.activate(project_directory, version_id)
+    index_versions.gc(project_directory)
 
 
 async def run_graphrag_update(config_path: str, root_path: str = ".", verbose: bool = False,
                               memprofile: bool = False, logger: str = "rich", cache: bool = True,
-                              skip_validation: bool = False, output_path: str = None):
+                              skip_validation: bool = False, output_path: str = None, on_output=None):
     # Build the command
     cmd = ["graphrag", "update"]
 
@@ -157,77 +284,314 @@ async def run_graphrag_update(config_path: str, root_path: str = ".", verbose: b
     logging.info(f"Running command: {' '.join(cmd)}")
 
     try:
-        # Run the command
-        result = subprocess.run(cmd, shell=False, check=True, text=True, capture_output=True)
+        # Run the command in a child process without blocking the event loop,
+        # passing each output line to on_output as it is produced
+        process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT)
+        output_lines = []
+        try:
+            async for raw_line in process.stdout:
+                line = raw_line.decode("utf-8", errors="replace").rstrip()
+                output_lines.append(line)
+                if on_output and line:
+                    on_output(line)
+            returncode = await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        output = "\n".join(output_lines)
 
         # Check if result is successful
-        if result.returncode == 0:
-            logging.info(f"Command executed successfully, return code: {result.returncode}")
-            logging.info(f"Command Output:\n{result.stdout}")
+        if returncode == 0:
+            logging.info(f"Command executed successfully, return code: {returncode}")
+            logging.info(f"Command Output:\n{output}")
         else:
-            logging.error(f"Command failed with return code: {result.returncode}")
-            logging.error(f"Error Output:\n{result.stderr}")
+            logging.error(f"Command failed with return code: {returncode}")
+            raise subprocess.CalledProcessError(returncode, cmd, output=output, stderr=output)
 
         # Return standard output
-        return result.stdout
+        return output
 
     except subprocess.CalledProcessError as e:
         # Catch errors in command execution
         logging.error(f"Command execution failed with error: {e.stderr}")
-        return f"Error occurred: {e.stderr}"
+        raise
 
     except Exception as e:
         # Catch any other unexpected errors
         logging.error(f"Unexpected error: {str(e)}")
-        return f"Unexpected error: {str(e)}"
+        raise
 
 
 # --------------------
 # GraphRAG Querying Functions
 # --------------------
-async def query_index(project_directory: str, query: str, search_mode: str):
+async def query_index(project_directory: str, query: str, search_mode: str, admission_key: str = None,
+                      on_queued=None):
     """
-    Build the GraphRAG index using the provided configuration and query it to retrieve enriched context.
-    Skips index building if output files exist (unless FORCE_BUILD_GRAPH is True).
-    If test_mode is True, only use a limited set of files for testing.
+    Query the GraphRAG index with the given search mode.
+    The config and index tables come from the process-wide index store, which loads them once
+    and only reloads when the index files change. The active index version is leased for the
+    whole query, so it finishes on that version even if a rebuild is swapped in meanwhile.
+    Answers are cached per index version, and identical concurrent queries share one search.
+    Returns (response, context size): the number of records in each context table, since the
+    context DataFrames themselves are not kept in the cache.
+    search_mode is "local", "global", "dynamic" (global with dynamic community selection), "basic"
+    or "auto", which lets query_router pick one of those per question.
+    With an admission_key, a search that actually runs waits for a slot of admission.controller
+    (on_queued is passed to acquire()); cached and coalesced answers do not take one.
+    Raises index_versions.IndexNotReadyError while no index has been built,
+    admission.QueueFullError when the search queue is full, and ValueError for an unknown mode.
     """
 
-    graphrag_config = load_config(root_dir=Path(project_directory))
-    graphrag_config.storage.base_dir = os.path.join(project_directory, "output")
-    graphrag_config.reporting.base_dir = os.path.join(project_directory, "logs")
-    graphrag_config.embeddings.vector_store['db_uri'] = os.path.join(project_directory, "output/lancedb")
-    # Define index file paths.
-    output_folder = os.path.join(project_directory, "output")
-    entities_path = os.path.join(output_folder, "create_final_entities.parquet")
-    communities_path = os.path.join(output_folder, "create_final_communities.parquet")
-    community_reports_path = os.path.join(output_folder, "create_final_community_reports.parquet")
-    nodes_path = os.path.join(output_folder, "create_final_nodes.parquet")
-    text_units_path = os.path.join(output_folder, "create_final_text_units.parquet")
-    relationships_path = os.path.join(output_folder, "create_final_relationships.parquet")
+    _check_mode(search_mode)
+    version = index_versions.require_active_version(project_directory)
+    cache_warmer.warmer.seed(project_directory, version)
+    key = query_cache.cache.key(version, search_mode, query)
+    cache_warmer.warmer.record(key)
 
-    try:
-        entities = pd.read_parquet(entities_path)
-        communities = pd.read_parquet(communities_path)
-        community_reports = pd.read_parquet(community_reports_path)
-        nodes = pd.read_parquet(nodes_path)
-        text_units = pd.read_parquet(text_units_path)
-        relationships = pd.read_parquet(relationships_path)
-    except Exception as e:
-        logging.error("Error loading index files: %s", e)
-        raise
+    async def compute():
+        async with _admitted(admission_key, on_queued):
+            response, context = await _query_active_version(project_directory, query, search_mode)
+        return response, context_size(context)
+
+    return await query_cache.cache.get_or_compute(key, compute)
+
+
+def _check_mode(search_mode: str) -> None:
+    # Checked before the mode becomes a metrics label, a cache key or a semantic cache filter.
+    if search_mode not in query_cache.SEARCH_MODES:
+        raise ValueError(f"Unsupported query mode: {search_mode}")
 
-    if search_mode == 'local':
+
+def is_cached(project_directory: str, query: str, search_mode: str) -> bool:
+    """True if query_index would answer from the answer cache or a running identical search."""
+    version = index_versions.active_version(project_directory)
+    if version is None:
+        return False
+    cache_warmer.warmer.seed(project_directory, version)
+    return query_cache.cache.has(query_cache.cache.key(version, search_mode, query))
+
+
+@asynccontextmanager
+async def _admitted(admission_key: str, on_queued=None):
+    """Hold a search slot for admission_key while the block runs; no admission without a key."""
+    if admission_key is None:
+        yield
+        return
+    with metrics.span("admission_wait"):
+        await admission.controller.acquire(admission_key, on_queued)
+    try:
+        yield
+    finally:
+        admission.controller.release()
+
+
+async def _query_active_version(project_directory: str, query: str, search_mode: str):
+    with index_versions.lease(project_directory) as output_folder:
+        snapshot = await asyncio.to_thread(index_store.store.get, project_directory, output_folder)
+        if not semantic_cache.cache.enabled:
+            return await _search(snapshot, query, search_mode)
+        # A paraphrase of an already answered question is served without running a search.
+        with metrics.span("semantic_cache_lookup"):
+            answer, embedding = await semantic_cache.cache.lookup(snapshot, search_mode, query)
+        if answer is not None:
+            return answer, {}
+        response, context = await _search(snapshot, query, search_mode)
+        await semantic_cache.cache.store(snapshot, search_mode, query, embedding, response)
+        return response, context
+
+
+async def _search(snapshot: index_store.IndexSnapshot, query: str, search_mode: str):
+    if search_mode == 'auto':
+        search_mode = (await query_router.router.route(snapshot, query)).mode
+    # Context building and the LLM calls happen inside GraphRAG's search API and are timed together here.
+    with metrics.span("search", mode=search_mode):
+        return await _run_search(snapshot, query, search_mode)
+
+
+async def _run_search(snapshot: index_store.IndexSnapshot, query: str, search_mode: str):
+    graphrag_config = snapshot.config
+    entities = snapshot.tables["entities"]
+    communities = snapshot.tables["communities"]
+    community_reports = snapshot.tables["community_reports"]
+    nodes = snapshot.tables["nodes"]
+    text_units = snapshot.tables["text_units"]
+    relationships = snapshot.tables["relationships"]
+
+    if search_mode == 'local' and get_bool_env_var("LOCAL_SEARCH_PREBUILT", default=True):
+        print("using local mode to query")
+        return await local_search_index.engines.search(snapshot, query)
+    elif search_mode == 'local':
         print("using local mode to query")
         return await local_search(query, graphrag_config, entities, community_reports, nodes, text_units, relationships)
     elif search_mode == 'global':
         print("using global mode to query")
         return await global_search(query, graphrag_config, entities, communities, community_reports, nodes)
+    elif search_mode == 'dynamic':
+        print("using global mode with dynamic community selection to query")
+        return await global_search(query, graphrag_config, entities, communities, community_reports, nodes,
+                                   dynamic_community_selection=True)
+    elif search_mode == 'basic':
+        print("using basic mode to query")
+        return await basic_search(query, graphrag_config, text_units)
     else:
         logging.error(f"Error not support query mode, %s", search_mode)
-        raise
+        raise ValueError(f"Unsupported query mode: {search_mode}")
+
+
+async def stream_query_index(project_directory: str, query: str, search_mode: str, admission_key: str = None,
+                             on_queued=None):
+    """
+    Streaming variant of query_index. Yields (event, data) pairs:
+      ("context", {...})  once retrieval is done: retrieval time, context record counts, cache status and
+                          the mode searched (the routed mode for "auto").
+      ("token", str)      for each piece of the answer as the LLM produces it.
+      ("done", str)       with the full answer.
+    Cached answers, and those of an identical search in progress (streamed or not), are replayed as
+    a single token once available, so concurrent askers of one question share one search. A streamed
+    search runs as the answer cache's in-flight computation of the question and is cached like a
+    query_index answer. Admission is as in query_index: only a search that actually runs takes a slot.
+    """
+    _check_mode(search_mode)
+    start = time.perf_counter()
+    version = index_versions.require_active_version(project_directory)
+    cache_warmer.warmer.seed(project_directory, version)
+    key = query_cache.cache.key(version, search_mode, query)
+    cache_warmer.warmer.record(key)
+    cached = await query_cache.cache.lookup(key)
+    if cached is not None:
+        response, size = cached
+        yield "context", _context_event(start, size, cached="answer")
+        yield "token", response
+        yield "done", response
+        return
 
+    events = asyncio.Queue()
 
-async def global_search(query, graphrag_config, entities, communities, community_reports, nodes):
+    async def compute():
+        response, size = None, {}
+        try:
+            async with _admitted(admission_key, on_queued):
+                async for event, data in _stream_active_version(project_directory, query, search_mode, start):
+                    events.put_nowait((event, data))
+                    if event == "context":
+                        size = data["context_size"]
+                    elif event == "done":
+                        response = data
+        finally:
+            events.put_nowait(None)
+        return response, size
+
+    # The search goes on for the askers waiting on it even if this caller stops reading.
+    search = query_cache.cache.start(key, compute)
+    while (event := await events.get()) is not None:
+        yield event
+    await asyncio.shield(search)
+
+
+async def _stream_active_version(project_directory: str, query: str, search_mode: str, start: float):
+    with index_versions.lease(project_directory) as output_folder:
+        snapshot = await asyncio.to_thread(index_store.store.get, project_directory, output_folder)
+        embedding = None
+        if semantic_cache.cache.enabled:
+            with metrics.span("semantic_cache_lookup"):
+                answer, embedding = await semantic_cache.cache.lookup(snapshot, search_mode, query)
+            if answer is not None:
+                yield "context", _context_event(start, {}, cached="semantic")
+                yield "token", answer
+                yield "done", answer
+                return
+
+        routed_mode = search_mode
+        if search_mode == 'auto':
+            routed_mode = (await query_router.router.route(snapshot, query)).mode
+        chunks = _search_streaming(snapshot, query, routed_mode)
+        # GraphRAG's streaming searches yield the context data first, then the answer tokens
+        with metrics.span("context_build", mode=routed_mode):
+            context = await anext(chunks)
+        size = context_size(context)
+        yield "context", _context_event(start, size, mode=routed_mode)
+        tokens = []
+        # Only time spent waiting for the LLM counts, not time spent by the consumer of this generator.
+        generation_seconds = 0.0
+        while True:
+            started = time.perf_counter()
+            try:
+                token = await anext(chunks)
+            except StopAsyncIteration:
+                break
+            finally:
+                generation_seconds += time.perf_counter() - started
+            tokens.append(token)
+            yield "token", token
+        metrics.record("llm_generation", generation_seconds, mode=routed_mode)
+        response = "".join(tokens)
+        if semantic_cache.cache.enabled:
+            await semantic_cache.cache.store(snapshot, search_mode, query, embedding, response)
+        yield "done", response
+
+
+def context_size(context) -> dict:
+    """Number of records per table of a search's context data, the part of it worth caching."""
+    if not isinstance(context, dict):
+        return {}
+    return {name: len(records) for name, records in context.items()}
+
+
+def _context_event(start: float, size: dict, cached: str = None, mode: str = None) -> dict:
+    return {
+        "retrieval_seconds": round(time.perf_counter() - start, 3),
+        "context_size": size,
+        "cached": cached,
+        "mode": mode,
+    }
+
+
+def _search_streaming(snapshot: index_store.IndexSnapshot, query: str, search_mode: str):
+    graphrag_config = snapshot.config
+    tables = snapshot.tables
+    if search_mode == 'local' and get_bool_env_var("LOCAL_SEARCH_PREBUILT", default=True):
+        print("using local mode to stream query")
+        return local_search_index.engines.search_streaming(snapshot, query)
+    elif search_mode == 'local':
+        print("using local mode to stream query")
+        return api.local_search_streaming(
+            config=graphrag_config,
+            nodes=tables["nodes"],
+            entities=tables["entities"],
+            community_reports=tables["community_reports"],
+            text_units=tables["text_units"],
+            relationships=tables["relationships"],
+            covariates=None,
+            community_level=2,
+            response_type="Multiple Paragraphs",
+            query=query,
+        )
+    elif search_mode in ('global', 'dynamic'):
+        print(f"using {search_mode} mode to stream query")
+        return api.global_search_streaming(
+            config=graphrag_config,
+            nodes=tables["nodes"],
+            entities=tables["entities"],
+            communities=tables["communities"],
+            community_reports=tables["community_reports"],
+            community_level=2,
+            dynamic_community_selection=search_mode == 'dynamic',
+            response_type="Multiple Paragraphs",
+            query=query,
+        )
+    elif search_mode == 'basic':
+        print("using basic mode to stream query")
+        return api.basic_search_streaming(config=graphrag_config, text_units=tables["text_units"], query=query)
+    else:
+        logging.error(f"Error not support query mode, %s", search_mode)
+        raise ValueError(f"Unsupported query mode: {search_mode}")
+
+
+async def global_search(query, graphrag_config, entities, communities, community_reports, nodes,
+                        dynamic_community_selection=False):
     try:
         response, context = await api.global_search(
             config=graphrag_config,
@@ -236,7 +600,7 @@ async def global_search(query, graphrag_config, entities, communities, community
             communities=communities,
             community_reports=community_reports,
             community_level=2,
-            dynamic_community_selection=False,
+            dynamic_community_selection=dynamic_community_selection,
             response_type="Multiple Paragraphs",
             query=query,
         )
@@ -266,63 +630,65 @@ async def local_search(query, graphrag_config, entities, community_reports, node
     return response, context
 
 
-def get_chat_response(message: str, max_tokens: int = 100, temperature: float = 1.0, top_p: float = 0.9,
-                      stream: bool = False) -> dict:
+async def basic_search(query, graphrag_config, text_units):
+    try:
+        response, context = await api.basic_search(
+            config=graphrag_config,
+            text_units=text_units,
+            query=query,
+        )
+    except Exception as e:
+        logging.error("Error during basic search: %s", e)
+        raise
+    return response, context
+
+
+SUMMARIZE_PROMPT = """Please summarize the following text while preserving its key points and main ideas. Condense it to a 
+    maximum of 3500 characters. Maintain the core message and important details, but remove redundancies and less 
+    critical information. \n\n"""
+
+
+async def get_chat_response(message: str, max_tokens: int = 100, temperature: float = 1.0,
+                            top_p: float = 0.9) -> dict:
     """
     Send a chat request to the NebulaBlock API and get the model's response.
+    Uses the shared pooled LLM client, which retries 429/5xx responses with backoff.
 
     Parameters:
     - message (str): The user message to send to the model.
-    - model (str): The model name to use, default is "deepseek-ai/DeepSeek-R1-Distill-Llama-70B".
     - max_tokens (int): The maximum number of tokens to generate, default is 100.
     - temperature (float): The temperature controlling randomness, default is 1.0.
     - top_p (float): The top-p value controlling result diversity, default is 0.9.
-    - stream (bool): Whether to use streaming responses, default is False.
 
     Returns:
-    - dict: The response from the model.
+    - dict: The response from the model, or {"error": ...} if the request failed.
     """
 
     LLM_MODEL = os.environ.get("LLM_MODEL", "meta-llama/Llama-3.3-70B-Instruct")
-    LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://inference.nebulablock.com/v1")
-    url = LLM_BASE_URL + "/chat/completions"
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {os.environ.get('LLM_API_KEY')}"
-    }
-
-    prompt = """Please summarize the following text while preserving its key points and main ideas. Condense it to a 
-    maximum of 3500 characters. Maintain the core message and important details, but remove redundancies and less 
-    critical information. \n\n"""
-
-    data = {
-        "messages": [
-            {"role": "user", "content": prompt + message}
-        ],
-        "model": LLM_MODEL,
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": top_p,
-        "stream": stream
-    }
+    messages = [
+        {"role": "user", "content": SUMMARIZE_PROMPT + message}
+    ]
 
     try:
-        # Send the request
-        response = requests.post(url, headers=headers, json=data)
-
-        # Check if the request was successful
-        response.raise_for_status()  # Raise an exception for non-2xx status codes
-
-        # Return the JSON response
-        return response.json()
-
-    except requests.exceptions.RequestException as e:
+        return await llm_client.get_client().chat(messages, LLM_MODEL, max_tokens=max_tokens,
+                                                  temperature=temperature, top_p=top_p)
+    except llm_client.LLMError as e:
         # Handle request errors
         print(f"Error making request: {e}")
         return {"error": str(e)}
 
 
+async def stream_chat_response(message: str, max_tokens: int = 100, temperature: float = 1.0, top_p: float = 0.9):
+    """Streaming variant of get_chat_response: yields the summary tokens as the model produces them."""
+    LLM_MODEL = os.environ.get("LLM_MODEL", "meta-llama/Llama-3.3-70B-Instruct")
+    messages = [
+        {"role": "user", "content": SUMMARIZE_PROMPT + message}
+    ]
+    async for token in llm_client.get_client().stream_chat(messages, LLM_MODEL, max_tokens=max_tokens,
+                                                           temperature=temperature, top_p=top_p):
+        yield token
+
+
 def has_files(directory: str) -> bool:
     return any(os.path.isfile(os.path.join(directory, f)) for f in os.listdir(directory))
 
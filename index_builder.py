@@ -0,0 +1,315 @@
+"""
+Index builder process.
+
+The API process only answers queries; this process does every index write, so git, markdown
+conversion and GraphRAG's CPU-heavy workflows never run on the serving event loop. It runs the
+startup build (git update, markdown conversion, graphrag index), then the incremental updates for
+uploaded files, which the API hands over as job files under <project>/index_jobs/. Its state and
+progress are published in <project>/index_builder.json, its metrics in
+<project>/index_builder_metrics.json (served by the API's /metrics), and SIGUSR1 cancels the running build or
+update. A new version reaches the API workers when it is activated: output/CURRENT.json is
+replaced, and each worker notices that and loads the version in the background.
+
+agent.py starts this process and restarts it if it exits (BuilderSupervisor). To run it on its own:
+
+    python index_builder.py
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import signal
+import asyncio
+import logging
+import threading
+import subprocess
+from dataclasses import asdict
+
+from dotenv import load_dotenv
+
+import index_queue
+import index_versions
+import metrics
+
+JOBS_DIR = "index_jobs"
+STATUS_FILE = "index_builder.json"
+# The builder's metrics registry (git, conversion, build and workflow spans), merged into the API's /metrics.
+METRICS_FILE = "index_builder_metrics.json"
+# Finished job files are deleted after this many seconds.
+JOB_FILE_TTL = 7 * 24 * 3600
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _write_json(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _jobs_dir(project_directory: str) -> str:
+    return os.path.join(project_directory, JOBS_DIR)
+
+
+def _write_job(project_directory: str, job: dict) -> None:
+    _write_json(os.path.join(_jobs_dir(project_directory), f"{job['job_id']}.json"), job)
+
+
+def submit_job(project_directory: str, filename: str) -> dict:
+    """Queue an uploaded file for the index builder. Called by the API."""
+    job = asdict(index_queue.IndexJob(job_id=uuid.uuid4().hex, filename=filename))
+    _write_job(project_directory, job)
+    logging.info("Handed index job %s for %s to the index builder", job["job_id"], filename)
+    return job
+
+
+def read_job(project_directory: str, job_id: str) -> dict:
+    """Last status the index builder published for a job, or None if there is no such job."""
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    return _read_json(os.path.join(_jobs_dir(project_directory), f"{job_id}.json"))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_status(project_directory: str) -> dict:
+    """
+    The builder's last published state: "starting", "building", "updating", "idle", "failed" or
+    "cancelled", the current stage and workflow, and timings. "alive" tells whether it still runs.
+    """
+    status = _read_json(os.path.join(project_directory, STATUS_FILE))
+    if status is None:
+        return {"state": "not_started", "alive": False}
+    return {**status, "alive": _process_alive(status["pid"])}
+
+
+def read_metrics(project_directory: str) -> dict:
+    """Snapshot of the builder's metrics registry as of its last published status, or None."""
+    try:
+        return _read_json(os.path.join(project_directory, METRICS_FILE))
+    except ValueError:
+        return None
+
+
+def cancel(project_directory: str) -> bool:
+    """Ask the builder to cancel its running build or update. False if nothing is running."""
+    status = read_status(project_directory)
+    if not status["alive"] or status["state"] not in ("building", "updating"):
+        return False
+    os.kill(status["pid"], signal.SIGUSR1)
+    return True
+
+
+class BuildProgress:
+    """
+    Progress of a build, reported by graphrag_utils.build_index: stage() for its own steps, and
+    GraphRAG's pipeline callbacks (graphrag.callbacks.workflow_callbacks.WorkflowCallbacks) for
+    the index workflows.
+    """
+
+    def __init__(self, publish):
+        self._publish = publish
+        self.workflows_completed = 0
+
+    def stage(self, name: str) -> None:
+        self._publish(stage=name, workflow=None)
+
+    def workflow_start(self, name: str, instance: object) -> None:
+        self._publish(workflow=name)
+
+    def workflow_end(self, name: str, instance: object) -> None:
+        self.workflows_completed += 1
+        self._publish(workflows_completed=self.workflows_completed)
+
+    def progress(self, progress) -> None:
+        pass
+
+    def error(self, message: str, cause: BaseException = None, stack: str = None, details: dict = None) -> None:
+        pass
+
+    def warning(self, message: str, details: dict = None) -> None:
+        pass
+
+    def log(self, message: str, details: dict = None) -> None:
+        pass
+
+
+class IndexBuilder:
+    """Runs the startup build, then feeds job files written by the API to the update queue."""
+
+    def __init__(self, project_directory: str):
+        self.project_directory = project_directory
+        self.status = {"pid": os.getpid(), "state": "starting", "stage": None, "workflow": None,
+                       "workflows_completed": 0, "started_at": None, "finished_at": None, "error": None}
+        self._build = None
+        index_queue.queue.on_change = self._job_changed
+
+    def _publish(self, **changes) -> None:
+        self.status.update(changes, updated_at=time.time())
+        try:
+            _write_json(os.path.join(self.project_directory, STATUS_FILE), self.status)
+            # Every span ends before the next status change, so the API sees them all by the end of a build.
+            _write_json(os.path.join(self.project_directory, METRICS_FILE), metrics.registry.snapshot())
+        except OSError as e:
+            logging.error("Could not publish index builder status: %s", e)
+
+    def _job_changed(self, job: index_queue.IndexJob) -> None:
+        _write_job(self.project_directory, asdict(job))
+        if job.status == "running":
+            if self.status["state"] != "updating":
+                self._publish(state="updating", stage="index_update", workflow=None, workflows_completed=0,
+                              started_at=job.started_at, finished_at=None, error=None)
+            else:
+                self._publish(workflow=job.progress, workflows_completed=job.workflows_completed)
+        elif job.finished_at is not None and self.status["state"] == "updating":
+            state = {"succeeded": "idle"}.get(job.status, job.status)
+            self._publish(state=state, stage=None, workflow=None, finished_at=job.finished_at, error=job.error)
+
+    def cancel(self) -> None:
+        """SIGUSR1: cancel the running build or update batch. Takes effect at its next await."""
+        if self._build is not None and not self._build.done():
+            logging.warning("Cancelling index build")
+            self._build.cancel()
+        elif index_queue.queue.cancel_batch():
+            logging.warning("Cancelling index update")
+
+    @property
+    def poll_interval(self) -> float:
+        return float(os.environ.get("INDEX_JOB_POLL_INTERVAL", 2))
+
+    def _job_files(self) -> list:
+        directory = _jobs_dir(self.project_directory)
+        if not os.path.isdir(directory):
+            return []
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(".json")]
+        return sorted(entries, key=lambda entry: entry.stat().st_mtime)
+
+    def _recover_jobs(self) -> None:
+        """Jobs that were running when a previous builder stopped will not finish."""
+        for entry in self._job_files():
+            job = read_job(self.project_directory, entry.name[:-len(".json")])
+            if job and job["status"] == "running":
+                job.update(status="failed", error="Index builder restarted", finished_at=time.time())
+                _write_job(self.project_directory, job)
+
+    def _collect_jobs(self) -> None:
+        now = time.time()
+        for entry in self._job_files():
+            job_id = entry.name[:-len(".json")]
+            if index_queue.queue.get(job_id) is not None:
+                continue
+            job = read_job(self.project_directory, job_id)
+            if job is None:
+                continue
+            if job["status"] == "queued":
+                index_queue.queue.submit(self.project_directory, job["filename"], job_id=job_id)
+            elif job["finished_at"] and now - job["finished_at"] > JOB_FILE_TTL:
+                os.remove(entry.path)
+
+    async def _startup_build(self) -> None:
+        # Imported here: the API process uses this module for job files and status without the search stack.
+        import graphrag_utils
+
+        removed = index_versions.discard_unfinished(self.project_directory)
+        if removed:
+            logging.warning("Removed index versions left over from an interrupted build: %s", removed)
+        force_build = graphrag_utils.get_bool_env_var("FORCE_BUILD_GRAPH", default=False)
+        self._publish(state="building", started_at=time.time())
+        self._build = asyncio.create_task(graphrag_utils.build_index(self.project_directory, force_build,
+                                                                     progress=BuildProgress(self._publish)))
+        await asyncio.wait([self._build])
+        if self._build.cancelled():
+            self._publish(state="cancelled", stage=None, workflow=None, finished_at=time.time())
+        elif self._build.exception() is not None:
+            logging.error("Startup index build failed: %s", self._build.exception())
+            self._publish(state="failed", error=str(self._build.exception()), finished_at=time.time())
+        else:
+            self._publish(state="idle", stage=None, workflow=None, finished_at=time.time())
+
+    async def run(self):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self.cancel)
+        self._recover_jobs()
+        await self._startup_build()
+        logging.info("Index builder waiting for uploads in %s", _jobs_dir(self.project_directory))
+        while True:
+            try:
+                self._collect_jobs()
+            except OSError as e:
+                logging.error("Could not read index jobs: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+
+class BuilderSupervisor:
+    """
+    Runs this module as a child process of the API server and restarts it if it exits, waiting
+    2, 4, 8... (at most 60) seconds between consecutive restarts.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.restarts = 0
+        self._stopping = threading.Event()
+
+    def _spawn(self) -> subprocess.Popen:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__)])
+        logging.info("Started index builder process %s", process.pid)
+        return process
+
+    def start(self) -> None:
+        self.process = self._spawn()
+        threading.Thread(target=self._supervise, name="index-builder-supervisor", daemon=True).start()
+
+    def _supervise(self) -> None:
+        failures = 0
+        while True:
+            started = time.monotonic()
+            returncode = self.process.wait()
+            if self._stopping.is_set():
+                return
+            # A builder that ran for a while before exiting is restarted without delay escalation.
+            failures = 1 if time.monotonic() - started > 600 else failures + 1
+            delay = min(60, 2 ** failures)
+            logging.error("Index builder exited with code %s, restarting it in %ds", returncode, delay)
+            if self._stopping.wait(delay):
+                return
+            self.restarts += 1
+            self.process = self._spawn()
+
+    def stop(self, timeout: float = 30) -> None:
+        self._stopping.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    project_directory = os.environ.get("WORK_DIRECTORY", "./ragtest")
+    asyncio.run(IndexBuilder(project_directory).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+
+
+# Finished jobs kept for status queries.
+MAX_FINISHED_JOBS = 1000
+
+
+@dataclass
+class IndexJob:
+    job_id: str
+    filename: str
+    status: str = "queued"  # queued -> running -> succeeded | failed | cancelled
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    batch_id: str = None
+    batch_size: int = 0
+    workflows_completed: int = 0
+    progress: str = None
+    error: str = None
+
+
+class IndexQueue:
+    """
+    Debounced queue of incremental index updates.
+
+    Uploads only enqueue a job. A background worker waits until no upload has arrived for
+    INDEX_BATCH_WINDOW seconds (but at most INDEX_BATCH_MAX_WAIT seconds after the first one),
+    then runs a single `graphrag update` subprocess for the whole batch. on_change, if set, is
+    called with a job whenever its status or progress changes.
+    """
+
+    def __init__(self):
+        self.jobs: OrderedDict[str, IndexJob] = OrderedDict()
+        self._pending: list[IndexJob] = []
+        self._project_directory = None
+        self._last_submit = 0.0
+        self._wakeup = None
+        self._worker = None
+        self._batch = None
+        self.on_change = None
+
+    def submit(self, project_directory: str, filename: str, job_id: str = None) -> IndexJob:
+        job = IndexJob(job_id=job_id or uuid.uuid4().hex, filename=filename)
+        self.jobs[job.job_id] = job
+        self._pending.append(job)
+        self._project_directory = project_directory
+        self._last_submit = time.monotonic()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+        logging.info("Queued index job %s for %s", job.job_id, filename)
+        return job
+
+    def get(self, job_id: str) -> IndexJob:
+        return self.jobs.get(job_id)
+
+    def _changed(self, batch: list):
+        if self.on_change is None:
+            return
+        for job in batch:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                logging.error("Could not publish the status of index job %s: %s", job.job_id, e)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            await self._debounce()
+            batch, self._pending = self._pending, []
+            # A separate task, so cancel_batch() stops this batch without stopping the queue.
+            self._batch = asyncio.create_task(self._run_batch(self._project_directory, batch))
+            await asyncio.wait([self._batch])
+            self._batch = None
+            self._trim()
+
+    def cancel_batch(self) -> bool:
+        """Cancel the running update batch, if any. Its jobs end as "cancelled"."""
+        if self._batch is None or self._batch.done():
+            return False
+        self._batch.cancel()
+        return True
+
+    async def _debounce(self):
+        window = float(os.environ.get("INDEX_BATCH_WINDOW", 10))
+        max_wait = float(os.environ.get("INDEX_BATCH_MAX_WAIT", 120))
+        first_submit = time.monotonic()
+        while True:
+            now = time.monotonic()
+            remaining = min(self._last_submit + window, first_submit + max_wait) - now
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def _run_batch(self, project_directory: str, batch: list):
+        batch_id = uuid.uuid4().hex
+        started_at = time.time()
+        for job in batch:
+            job.status, job.started_at, job.batch_id, job.batch_size = "running", started_at, batch_id, len(batch)
+        logging.info("Running index update batch %s for %d uploaded files", batch_id, len(batch))
+        self._changed(batch)
+
+        def on_output(line: str):
+            for job in batch:
+                job.progress = line
+                # The print logger reports each finished workflow with a rocket prefix.
+                if line.startswith("🚀"):
+                    job.workflows_completed += 1
+            if line.startswith("🚀"):
+                self._changed(batch)
+
+        # Imported here: the API process uses IndexJob for job files without importing the search stack.
+        import graphrag_utils
+
+        try:
+            await graphrag_utils.update_index(project_directory, on_output=on_output)
+            status, error = "succeeded", None
+        except asyncio.CancelledError:
+            logging.warning("Index update batch %s cancelled", batch_id)
+            status, error = "cancelled", "Cancelled"
+        except Exception as e:
+            logging.error("Index update batch %s failed: %s", batch_id, e)
+            status, error = "failed", str(e)
+        finished_at = time.time()
+        for job in batch:
+            job.status, job.error, job.finished_at = status, error, finished_at
+        self._changed(batch)
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def status(self, job_id: str) -> dict:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        result = asdict(job)
+        if job.status == "queued":
+            result["queue_position"] = next(i for i, j in enumerate(self._pending) if j is job) + 1
+        return result
+
+
+queue = IndexQueue()
@@ -0,0 +1,242 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from graphrag.config.load_config import load_config
+from graphrag.config.models.graph_rag_config import GraphRagConfig
+from graphrag.query.llm.get_client import get_text_embedder
+
+import index_tables
+import index_versions
+import metrics
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """
+    A loaded GraphRAG index: the query config plus the index tables.
+
+    Snapshots are shared by every concurrent request, so the DataFrames must be treated as read-only.
+    resident_bytes is the heap memory of the tables; mapped_bytes is text served from memory-mapped
+    Arrow files, which the OS pages in when read and can drop again under memory pressure.
+    """
+    project_directory: str
+    version: str
+    output_folder: str
+    config: GraphRagConfig
+    tables: dict
+    fingerprint: tuple
+    loaded_at: float
+    load_seconds: float
+    resident_bytes: int
+    mapped_bytes: int = 0
+    config_seconds: float = 0.0
+
+
+def _file_signature(path: str) -> tuple:
+    st = os.stat(path)
+    return path, st.st_mtime_ns, st.st_size
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_query_config(project_directory: str, output_folder: str) -> GraphRagConfig:
+    """Load settings.yaml and point storage, reporting and the vector store at the given output folder."""
+    graphrag_config = load_config(root_dir=Path(project_directory))
+    graphrag_config.storage.base_dir = output_folder
+    graphrag_config.reporting.base_dir = os.path.join(project_directory, "logs")
+    graphrag_config.embeddings.vector_store['db_uri'] = os.path.join(output_folder, "lancedb")
+    return graphrag_config
+
+
+_embedders: dict[str, tuple] = {}
+
+
+def text_embedder(snapshot: IndexSnapshot):
+    """The query embedding client for the snapshot's config, created once per loaded config rather than per question."""
+    embedder = _embedders.get(snapshot.project_directory)
+    if embedder is None or embedder[0] is not snapshot.config:
+        embedder = (snapshot.config, get_text_embedder(snapshot.config))
+        _embedders[snapshot.project_directory] = embedder
+    return embedder[1]
+
+
+class IndexStore:
+    """
+    Process-wide cache of the GraphRAG query config and index tables.
+
+    The index is loaded on first use and kept resident, one snapshot per project and index version.
+    While a new version is activated, the snapshot of the previous one stays resident for as long as
+    this process holds leases on it, so queries on either version do not evict each other's snapshot;
+    it is dropped once the active version is requested and the old leases have drained. Each call to
+    get() stats the index files
+    and settings.yaml; the index is only reloaded when their mtimes or sizes change. With
+    hash_contents enabled a changed mtime is confirmed against the content hash first, so a
+    touched but otherwise identical file does not trigger a reload.
+    """
+
+    def __init__(self, hash_contents: bool = None):
+        self._hash_contents = hash_contents
+        self._lock = threading.Lock()
+        self._snapshots: dict[tuple, IndexSnapshot] = {}
+        self._hashes: dict[tuple, tuple] = {}
+        self.loads = 0
+
+    @property
+    def hash_contents(self) -> bool:
+        if self._hash_contents is not None:
+            return self._hash_contents
+        return os.environ.get("INDEX_STORE_HASH", "false").lower() in ['true', '1', 't', 'y', 'yes']
+
+
+    def _watched_files(self, project_directory: str, output_folder: str) -> list:
+        files = [os.path.join(output_folder, name) for name in index_tables.INDEX_TABLES.values()]
+        settings_path = os.path.join(project_directory, "settings.yaml")
+        if os.path.exists(settings_path):
+            files.append(settings_path)
+        return files
+
+    def get(self, project_directory: str, output_folder: str = None) -> IndexSnapshot:
+        """
+        Return the resident snapshot for the project and index version, (re)loading it if the index
+        files changed. output_folder defaults to the active index version.
+        """
+        active = output_folder is None
+        if active:
+            output_folder = index_versions.active_folder(project_directory)
+        files = self._watched_files(project_directory, output_folder)
+        try:
+            fingerprint = tuple(_file_signature(path) for path in files)
+        except FileNotFoundError as e:
+            logging.error("Error loading index files: %s", e)
+            raise
+
+        key = os.path.abspath(project_directory), os.path.abspath(output_folder)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.fingerprint == fingerprint:
+            if len(self._snapshots) > 1:
+                self._drop_drained(project_directory, key, active)
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot.fingerprint == fingerprint:
+                return snapshot
+            hashes = None
+            if self.hash_contents:
+                hashes = tuple(_file_hash(path) for path in files)
+                if snapshot is not None and self._hashes.get(key) == hashes:
+                    logging.info("Index files touched but content unchanged, keeping resident index.")
+                    snapshot = replace(snapshot, fingerprint=fingerprint)
+                    self._snapshots[key] = snapshot
+                    return snapshot
+            snapshot = self._load(project_directory, output_folder, fingerprint)
+            self._snapshots[key] = snapshot
+            self._hashes[key] = hashes
+        self._drop_drained(project_directory, key, active)
+        return snapshot
+
+    def _drop_drained(self, project_directory: str, key: tuple, active: bool) -> None:
+        """
+        Once the active version's snapshot (key) is requested, drop the project's other snapshots
+        that no query in this process holds a lease on.
+        """
+        if not active and key[1] != os.path.abspath(index_versions.active_folder(project_directory)):
+            return
+        with self._lock:
+            for other in [other for other in self._snapshots if other[0] == key[0] and other != key]:
+                if not index_versions.held(self._snapshots[other].output_folder):
+                    logging.info("Dropping resident index %s", other[1])
+                    del self._snapshots[other]
+                    self._hashes.pop(other, None)
+
+    def _load(self, project_directory: str, output_folder: str, fingerprint: tuple) -> IndexSnapshot:
+        start = time.perf_counter()
+        with metrics.span("config_load"):
+            graphrag_config = load_query_config(project_directory, output_folder)
+        config_seconds = time.perf_counter() - start
+        try:
+            with metrics.span("parquet_load"):
+                table_layout = index_tables.layout()
+                tables = {name: index_tables.load_table(output_folder, name, table_layout)
+                          for name in index_tables.INDEX_TABLES}
+        except Exception as e:
+            logging.error("Error loading index files: %s", e)
+            raise
+        load_seconds = time.perf_counter() - start
+        sizes = [index_tables.memory_bytes(df) for df in tables.values()]
+        resident_bytes = sum(heap for heap, _ in sizes)
+        mapped_bytes = sum(mapped for _, mapped in sizes)
+        self.loads += 1
+        logging.info("Loaded GraphRAG index from %s in %.2fs, resident size %.1f MB, memory-mapped text %.1f MB",
+                     output_folder, load_seconds, resident_bytes / (1024 * 1024), mapped_bytes / (1024 * 1024))
+        return IndexSnapshot(
+            project_directory=project_directory,
+            version=index_versions.version_of(output_folder),
+            output_folder=output_folder,
+            config=graphrag_config,
+            tables=tables,
+            fingerprint=fingerprint,
+            loaded_at=time.time(),
+            load_seconds=load_seconds,
+            resident_bytes=resident_bytes,
+            mapped_bytes=mapped_bytes,
+            config_seconds=config_seconds,
+        )
+
+    async def watch(self, project_directory: str):
+        """
+        Load each newly activated index version in the background, so the first query after the
+        index builder activates it does not wait for the load. Polls output/CURRENT.json every
+        INDEX_WATCH_INTERVAL seconds (default 2).
+        """
+        loaded = None
+        while True:
+            version = index_versions.active_version(project_directory)
+            if version is not None and version != loaded:
+                loaded = version
+                try:
+                    await asyncio.to_thread(self.get, project_directory)
+                    logging.info("Index version %s is loaded", version)
+                except Exception as e:
+                    logging.error("Could not load index version %s: %s", version, e)
+            await asyncio.sleep(float(os.environ.get("INDEX_WATCH_INTERVAL", 2)))
+
+    def loaded_version(self, project_directory: str) -> str | None:
+        """Version of the newest index resident in this process, or None if none is loaded."""
+        project = os.path.abspath(project_directory)
+        snapshots = [snapshot for key, snapshot in self._snapshots.items() if key[0] == project]
+        return max(snapshots, key=lambda snapshot: snapshot.loaded_at).version if snapshots else None
+
+    def stats(self) -> dict:
+        """Load time and resident size of every loaded index."""
+        return {
+            "pid": os.getpid(),
+            "layout": index_tables.layout(),
+            "loads": self.loads,
+            "indexes": [
+                {
+                    "version": snapshot.version,
+                    "output_folder": snapshot.output_folder,
+                    "loaded_at": snapshot.loaded_at,
+                    "load_seconds": round(snapshot.load_seconds, 3),
+                    "resident_bytes": snapshot.resident_bytes,
+                    "mapped_bytes": snapshot.mapped_bytes,
+                    "rows": {name: len(df) for name, df in snapshot.tables.items()},
+                }
+                for snapshot in self._snapshots.values()
+            ],
+        }
+
+
+store = IndexStore()
@@ -0,0 +1,204 @@
+import os
+import json
+import fcntl
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+# Index tables read by the query functions, keyed by the name they are passed to GraphRAG with.
+INDEX_TABLES = {
+    "entities": "create_final_entities.parquet",
+    "communities": "create_final_communities.parquet",
+    "community_reports": "create_final_community_reports.parquet",
+    "nodes": "create_final_nodes.parquet",
+    "text_units": "create_final_text_units.parquet",
+    "relationships": "create_final_relationships.parquet",
+}
+
+# Columns the GraphRAG query adapters (graphrag.query.indexer_adapters) read from each table. The
+# others (node layout, report findings and JSON, community membership lists...) are only used while
+# indexing.
+TABLE_COLUMNS = {
+    "entities": ["id", "human_readable_id", "title", "type", "description", "text_unit_ids"],
+    "communities": ["id", "community", "level", "title"],
+    "community_reports": ["id", "community", "level", "title", "summary", "full_content", "rank"],
+    "nodes": ["id", "title", "community", "level", "degree"],
+    "text_units": ["id", "text", "n_tokens", "document_ids", "entity_ids", "relationship_ids"],
+    "relationships": ["id", "human_readable_id", "source", "target", "description", "weight", "combined_degree",
+                      "text_unit_ids"],
+}
+
+# Embedding columns the adapters use when the index has them, stored as one float32 block per column.
+EMBEDDING_COLUMNS = {
+    "entities": ["description_embedding"],
+    "community_reports": ["full_content_embedding"],
+}
+
+# Strings with few distinct values, stored as categoricals.
+CATEGORICAL_COLUMNS = {
+    "entities": ["type"],
+    "relationships": ["source", "target"],
+}
+
+# Long text, kept in an uncompressed Arrow file next to the parquet file and memory-mapped, so it is
+# paged in from the page cache when read instead of copied onto the heap. Columns with missing values
+# are loaded normally, as GraphRAG expects None rather than pd.NA for them.
+MAPPED_TEXT_COLUMNS = {
+    "entities": ["description"],
+    "relationships": ["description"],
+    "community_reports": ["summary", "full_content"],
+    "text_units": ["text"],
+}
+MAPPED_FILE_SUFFIX = ".arrow"
+
+# full     every column, as GraphRAG writes the tables
+# compact  the columns search needs, with categoricals, float32 embeddings and memory-mapped text
+# shared   compact, but every string and list column without missing values is memory-mapped, so
+#          API workers serving the same index share its pages instead of each holding a copy.
+#          Numbers stay on the heap: they are small, and GraphRAG's groupby/fillna on them does not
+#          support Arrow-backed columns.
+LAYOUTS = ("full", "compact", "shared")
+
+
+def layout() -> str:
+    """Table layout for this process: INDEX_COMPACT=False reads full tables, several SERVER_WORKERS share them."""
+    if os.environ.get("INDEX_COMPACT", "true").lower() not in ['true', '1', 't', 'y', 'yes']:
+        return "full"
+    return "shared" if int(os.environ.get("SERVER_WORKERS", 1)) > 1 else "compact"
+
+
+def _columns(schema: pa.Schema, name: str) -> list:
+    return [column for column in TABLE_COLUMNS[name] + EMBEDDING_COLUMNS.get(name, []) if column in schema.names]
+
+
+def _mapped_candidates(schema: pa.Schema, name: str, columns: list, table_layout: str) -> list:
+    if table_layout == "shared":
+        on_heap = CATEGORICAL_COLUMNS.get(name, []) + EMBEDDING_COLUMNS.get(name, [])
+        return [column for column in columns if column not in on_heap
+                and _is_string_or_list(schema.field(column).type)]
+    return [column for column in MAPPED_TEXT_COLUMNS.get(name, []) if column in columns]
+
+
+def _is_string_or_list(arrow_type: pa.DataType) -> bool:
+    return (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+            or pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type))
+
+
+def _source_signature(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _open_mapped_file(mapped_path: str, source: str, columns: list) -> dict:
+    """Memory-map a file written by _write_mapped_file, or return None if it is missing or stale."""
+    try:
+        reader = ipc.open_file(pa.memory_map(mapped_path))
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    metadata = reader.schema.metadata or {}
+    if metadata.get(b"source") != source.encode() or json.loads(metadata.get(b"columns", b"[]")) != columns:
+        return None
+    table = reader.read_all()
+    return {name: table.column(name) for name in table.column_names}
+
+
+def _write_mapped_file(path: str, mapped_path: str, source: str, columns: list) -> None:
+    table = pq.read_table(path, columns=columns)
+    table = table.select([name for name in columns if table.column(name).null_count == 0])
+    table = table.replace_schema_metadata({"source": source, "columns": json.dumps(columns)})
+    tmp_path = f"{mapped_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, mapped_path)
+
+
+def mapped_columns(path: str, columns: list) -> dict:
+    """
+    The given columns of a parquet table as Arrow arrays backed by a memory-mapped file next to it,
+    written on first use and rewritten when the parquet file changes. Columns with missing values
+    are left out. Returns {} if the file cannot be written, e.g. on a read-only output folder.
+    """
+    if not columns:
+        return {}
+    mapped_path = path[:-len(".parquet")] + MAPPED_FILE_SUFFIX
+    source = _source_signature(path)
+    arrays = _open_mapped_file(mapped_path, source, columns)
+    if arrays is not None:
+        return arrays
+    try:
+        # Processes loading the same version write the file once, and all map that one file.
+        with open(mapped_path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            arrays = _open_mapped_file(mapped_path, source, columns)
+            if arrays is None:
+                _write_mapped_file(path, mapped_path, source, columns)
+    except OSError as e:
+        logging.warning("Could not write %s, loading its columns into memory: %s", mapped_path, e)
+        return {}
+    return arrays or _open_mapped_file(mapped_path, source, columns) or {}
+
+
+def prepare(output_folder: str, table_layout: str = None) -> None:
+    """Write the memory-mapped files of an index version, so the first load after activating it does not."""
+    table_layout = table_layout or layout()
+    if table_layout == "full":
+        return
+    for name, filename in INDEX_TABLES.items():
+        path = os.path.join(output_folder, filename)
+        schema = pq.read_schema(path)
+        mapped_columns(path, _mapped_candidates(schema, name, _columns(schema, name), table_layout))
+
+
+def _float32_block(series: pd.Series) -> pd.Series:
+    """Rows of an embedding column as views into one contiguous float32 matrix."""
+    values = series.to_numpy()
+    if len(values) == 0 or any(value is None for value in values) or len({len(value) for value in values}) > 1:
+        return series
+    matrix = np.ascontiguousarray(np.stack(values), dtype=np.float32)
+    rows = np.empty(len(matrix), dtype=object)
+    for i, row in enumerate(matrix):
+        rows[i] = row
+    return pd.Series(rows, index=series.index, name=series.name)
+
+
+def _range_index(path: str) -> pd.RangeIndex:
+    """The index pd.read_parquet gives a table written with a RangeIndex, for reads without heap columns."""
+    for index in (pq.read_schema(path).pandas_metadata or {}).get("index_columns", []):
+        if isinstance(index, dict) and index.get("kind") == "range":
+            return pd.RangeIndex(index["start"], index["stop"], index["step"], name=index.get("name"))
+    return pd.RangeIndex(pq.ParquetFile(path).metadata.num_rows)
+
+
+def load_table(output_folder: str, name: str, table_layout: str = "compact") -> pd.DataFrame:
+    """Read one index table in the given layout (see LAYOUTS)."""
+    path = os.path.join(output_folder, INDEX_TABLES[name])
+    if table_layout == "full":
+        return pd.read_parquet(path)
+
+    schema = pq.read_schema(path)
+    columns = _columns(schema, name)
+    mapped = mapped_columns(path, _mapped_candidates(schema, name, columns, table_layout))
+    heap_columns = [column for column in columns if column not in mapped]
+    df = pq.read_table(path, columns=heap_columns, use_pandas_metadata=True).to_pandas()
+    if not heap_columns and len(df) == 0:
+        df = pd.DataFrame(index=_range_index(path))
+    for column, array in mapped.items():
+        df[column] = pd.Series(pd.arrays.ArrowExtensionArray(array), index=df.index)
+    for column in CATEGORICAL_COLUMNS.get(name, []):
+        if column in df:
+            df[column] = df[column].astype("category")
+    for column in EMBEDDING_COLUMNS.get(name, []):
+        if column in df:
+            df[column] = _float32_block(df[column])
+    return df[columns]
+
+
+def memory_bytes(df: pd.DataFrame) -> tuple:
+    """(heap bytes, memory-mapped bytes) of a loaded table."""
+    usage = df.memory_usage(deep=True)
+    mapped = sum(int(usage[column]) for column in df.columns if isinstance(df[column].dtype, pd.ArrowDtype))
+    return int(usage.sum()) - mapped, mapped
@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+
+import yaml
+
+# Every build is written to output/versions/<version_id>/ (parquet tables and lancedb together).
+# output/CURRENT.json names the active version plus the older ones kept for rollback, and is
+# only ever replaced with os.replace, so switching versions is a single atomic rename.
+VERSIONS_DIR = "versions"
+POINTER_FILE = "CURRENT.json"
+LEGACY_VERSION = "legacy"
+# Present in a version directory until it is activated, so gc() leaves builds in progress alone.
+BUILDING_MARKER = ".building"
+# Docs repository commit the version's markdown input was converted from, for incremental repo syncs.
+SOURCE_COMMIT_FILE = "source_commit"
+# <version folder>/.leases/<pid> exists while that process runs queries on the version, so gc() in the index
+# builder process leaves versions alone that API workers are still reading.
+LEASES_DIR = ".leases"
+# Scratch directory inside a version for `graphrag update`, which writes its merged tables to update_index_storage
+# rather than to storage; merge_update_output() moves them into the version.
+UPDATE_DIR = ".update_output"
+
+_lock = threading.Lock()
+_leases: dict[str, int] = {}
+
+
+class IndexNotReadyError(Exception):
+    """No index version has been built yet, so there is nothing to query."""
+
+
+def _output_root(project_directory: str) -> str:
+    return os.path.join(project_directory, "output")
+
+
+def _pointer_path(project_directory: str) -> str:
+    return os.path.join(_output_root(project_directory), POINTER_FILE)
+
+
+def version_folder(project_directory: str, version_id: str) -> str:
+    """Directory holding the tables and vector store of a version."""
+    if version_id == LEGACY_VERSION:
+        return _output_root(project_directory)
+    return os.path.join(_output_root(project_directory), VERSIONS_DIR, version_id)
+
+
+def version_of(folder: str) -> str:
+    """Inverse of version_folder()."""
+    folder = os.path.normpath(folder)
+    if os.path.basename(os.path.dirname(folder)) == VERSIONS_DIR:
+        return os.path.basename(folder)
+    return LEGACY_VERSION
+
+
+def read_pointer(project_directory: str) -> dict:
+    """Return {"current": version_id | None, "history": [older version ids, newest first]}."""
+    try:
+        with open(_pointer_path(project_directory), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # Indexes built before versioning live directly in output/.
+        if os.path.exists(os.path.join(_output_root(project_directory), "create_final_entities.parquet")):
+            return {"current": LEGACY_VERSION, "history": []}
+        return {"current": None, "history": []}
+
+
+def _write_pointer(project_directory: str, pointer: dict) -> None:
+    path = _pointer_path(project_directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pointer, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def active_version(project_directory: str) -> str | None:
+    return read_pointer(project_directory)["current"]
+
+
+def require_active_version(project_directory: str) -> str:
+    """The active version id; raises IndexNotReadyError while no index has been built."""
+    version_id = active_version(project_directory)
+    if version_id is None:
+        raise IndexNotReadyError("The index is not built yet. Please try again once the index build has finished.")
+    return version_id
+
+
+def active_folder(project_directory: str) -> str:
+    """Output folder of the active version; falls back to output/ when nothing has been built yet."""
+    version_id = active_version(project_directory)
+    if version_id is None:
+        return _output_root(project_directory)
+    return version_folder(project_directory, version_id)
+
+
+def create_version(project_directory: str, base_version: str | None = None) -> tuple[str, str]:
+    """
+    Create a new, not yet active, version directory.
+    If base_version is given its tables and vector store are copied in, so an incremental
+    update can run against the copy while the base keeps serving queries.
+    """
+    version_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    folder = version_folder(project_directory, version_id)
+    if base_version is not None:
+        base_folder = version_folder(project_directory, base_version)
+        patterns = [LEASES_DIR, UPDATE_DIR]
+        if base_version == LEGACY_VERSION:
+            patterns += [VERSIONS_DIR, POINTER_FILE, f"{POINTER_FILE}.*"]
+        ignore = shutil.ignore_patterns(*patterns)
+        shutil.copytree(base_folder, folder, ignore=ignore)
+    else:
+        os.makedirs(folder)
+    open(os.path.join(folder, BUILDING_MARKER), "w").close()
+    logging.info("Created index version %s at %s (base: %s)", version_id, folder, base_version)
+    return version_id, folder
+
+
+def write_source_commit(project_directory: str, version_id: str, commit: str) -> None:
+    """Record the docs repository commit a version was built or updated from."""
+    path = os.path.join(version_folder(project_directory, version_id), SOURCE_COMMIT_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(commit)
+    os.replace(tmp_path, path)
+
+
+def source_commit(project_directory: str) -> str | None:
+    """Docs repository commit of the active version, or None if it was not recorded."""
+    version_id = active_version(project_directory)
+    if version_id is None:
+        return None
+    try:
+        with open(os.path.join(version_folder(project_directory, version_id), SOURCE_COMMIT_FILE),
+                  encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_version_settings(project_directory: str, version_id: str) -> str:
+    """
+    Write a copy of settings.yaml whose storage and vector store point at the version directory,
+    and whose update_index_storage is the version's scratch directory, for the graphrag CLI. It is placed in the project root because graphrag resolves .env and
+    relative paths against the config file's directory.
+    """
+    with open(os.path.join(project_directory, "settings.yaml"), "r", encoding="utf-8") as f:
+        settings = yaml.safe_load(f)
+    folder = os.path.abspath(version_folder(project_directory, version_id))
+    settings.setdefault("storage", {})["base_dir"] = folder
+    settings.setdefault("embeddings", {}).setdefault("vector_store", {})["db_uri"] = os.path.join(folder, "lancedb")
+    settings["update_index_storage"] = {"type": "file", "base_dir": os.path.join(folder, UPDATE_DIR)}
+    settings_path = os.path.join(project_directory, f".settings.{version_id}.yaml")
+    with open(settings_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(settings, f, sort_keys=False)
+    return settings_path
+
+
+def merge_update_output(project_directory: str, version_id: str) -> list:
+    """
+    Move the tables `graphrag update` merged (old plus new documents) from the version's scratch
+    directory over the base tables copied into the version, then remove the scratch directory.
+    Returns the table names; raises ValueError if the update wrote none.
+    """
+    folder = version_folder(project_directory, version_id)
+    update_folder = os.path.join(folder, UPDATE_DIR)
+    tables = sorted(name for name in (os.listdir(update_folder) if os.path.isdir(update_folder) else [])
+                    if name.startswith("create_final_") and name.endswith(".parquet"))
+    if not tables:
+        raise ValueError(f"graphrag update wrote no tables to {update_folder}")
+    for name in tables:
+        os.replace(os.path.join(update_folder, name), os.path.join(folder, name))
+    shutil.rmtree(update_folder, ignore_errors=True)
+    logging.info("Merged updated tables into index version %s: %s", version_id, tables)
+    return tables
+
+
+def activate(project_directory: str, version_id: str) -> None:
+    """Atomically make version_id the active version."""
+    marker = os.path.join(version_folder(project_directory, version_id), BUILDING_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+    with _lock:
+        pointer = read_pointer(project_directory)
+        history = [pointer["current"]] if pointer["current"] else []
+        history += [v for v in pointer["history"] if v != version_id and v not in history]
+        _write_pointer(project_directory, {"current": version_id, "history": history})
+    logging.info("Activated index version %s", version_id)
+
+
+def rollback(project_directory: str) -> str:
+    """Re-activate the previous version. Returns the now active version id."""
+    with _lock:
+        pointer = read_pointer(project_directory)
+        history = [v for v in pointer["history"] if os.path.isdir(version_folder(project_directory, v))]
+        if not history:
+            raise ValueError("No previous index version to roll back to")
+        _write_pointer(project_directory, {"current": history[0], "history": history[1:]})
+    logging.info("Rolled back index version %s -> %s", pointer["current"], history[0])
+    return history[0]
+
+
+def discard(project_directory: str, version_id: str) -> None:
+    """Remove a version that was never activated, e.g. after a failed build."""
+    shutil.rmtree(version_folder(project_directory, version_id), ignore_errors=True)
+    logging.info("Discarded index version %s", version_id)
+
+
+def discard_unfinished(project_directory: str) -> list:
+    """
+    Remove versions still marked as being built. Only called by the index builder when it starts,
+    when such versions are left over from a build that was killed. Returns the removed version ids.
+    """
+    versions_root = os.path.join(_output_root(project_directory), VERSIONS_DIR)
+    if not os.path.isdir(versions_root):
+        return []
+    unfinished = [version_id for version_id in os.listdir(versions_root)
+                  if os.path.exists(os.path.join(versions_root, version_id, BUILDING_MARKER))]
+    for version_id in unfinished:
+        discard(project_directory, version_id)
+    return unfinished
+
+
+@contextmanager
+def lease(project_directory: str):
+    """
+    Pin the active version for the duration of a query and yield its output folder.
+    Leased versions are never garbage-collected, so a query that started on a version
+    finishes on it even if a newer version is activated meanwhile. Leases are counted per
+    process; while a process holds any, its lease file in the version folder tells gc() in
+    other processes.
+    """
+    with _lock:
+        folder = active_folder(project_directory)
+        _leases[folder] = _leases.get(folder, 0) + 1
+        if _leases[folder] == 1:
+            _write_lease_file(folder)
+    try:
+        yield folder
+    finally:
+        with _lock:
+            _leases[folder] -= 1
+            if not _leases[folder]:
+                del _leases[folder]
+                _remove_lease_file(folder)
+
+
+def held(folder: str) -> bool:
+    """True if this process holds a lease on the version in folder."""
+    return folder in _leases
+
+
+def _lease_file(folder: str) -> str:
+    return os.path.join(folder, LEASES_DIR, str(os.getpid()))
+
+
+def _write_lease_file(folder: str) -> None:
+    try:
+        os.makedirs(os.path.join(folder, LEASES_DIR), exist_ok=True)
+        open(_lease_file(folder), "w").close()
+    except OSError as e:
+        logging.warning("Could not write lease file in %s: %s", folder, e)
+
+
+def _remove_lease_file(folder: str) -> None:
+    try:
+        os.remove(_lease_file(folder))
+    except OSError:
+        pass
+
+
+def _leased(folder: str) -> bool:
+    """True if this or another live process holds a lease on the version in folder."""
+    if folder in _leases:
+        return True
+    try:
+        names = os.listdir(os.path.join(folder, LEASES_DIR))
+    except FileNotFoundError:
+        return False
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            os.kill(int(name), 0)
+            return True
+        except ProcessLookupError:
+            # Left behind by a process that was killed mid-query.
+            continue
+        except PermissionError:
+            return True
+    return False
+
+
+def list_versions(project_directory: str) -> dict:
+    pointer = read_pointer(project_directory)
+    versions_root = os.path.join(_output_root(project_directory), VERSIONS_DIR)
+    on_disk = sorted(os.listdir(versions_root)) if os.path.isdir(versions_root) else []
+    return {**pointer, "versions": on_disk}
+
+
+def gc(project_directory: str, keep: int = None) -> list:
+    """
+    Delete version directories that are neither active, among the `keep` most recent previous
+    versions (INDEX_KEEP_VERSIONS, default 2), leased by an in-flight query of any process nor
+    still being built. Returns the removed version ids.
+    """
+    if keep is None:
+        keep = int(os.environ.get("INDEX_KEEP_VERSIONS", 2))
+    versions_root = os.path.join(_output_root(project_directory), VERSIONS_DIR)
+    if not os.path.isdir(versions_root):
+        return []
+    removed = []
+    with _lock:
+        pointer = read_pointer(project_directory)
+        retained = {pointer["current"], *pointer["history"][:keep]}
+        for version_id in os.listdir(versions_root):
+            folder = version_folder(project_directory, version_id)
+            if version_id in retained or _leased(folder):
+                continue
+            if os.path.exists(os.path.join(folder, BUILDING_MARKER)):
+                continue
+            shutil.rmtree(folder, ignore_errors=True)
+            removed.append(version_id)
+        if removed:
+            history = [v for v in pointer["history"] if v not in removed]
+            _write_pointer(project_directory, {"current": pointer["current"], "history": history})
+    if removed:
+        logging.info("Garbage-collected index versions: %s", removed)
+    return removed
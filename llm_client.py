@@ -0,0 +1,169 @@
+import os
+import json
+import random
+import time
+import asyncio
+import logging
+
+import httpx
+
+import metrics
+
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504, 520, 522, 524}
+
+
+class LLMError(Exception):
+    """Raised when an LLM request still fails after all retries."""
+
+
+class LLMClient:
+    """
+    Async client for OpenAI-compatible chat completion endpoints.
+
+    A single httpx.AsyncClient keeps connections alive between calls, every request has a
+    timeout, 429/5xx responses and transport errors are retried with jittered exponential
+    backoff (honouring Retry-After), and at most max_concurrency requests run against each
+    endpoint at a time.
+    """
+
+    def __init__(self, base_url: str, api_key: str = None, timeout: float = 60.0, max_retries: int = 5,
+                 max_concurrency: int = 8, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+            limits=httpx.Limits(max_connections=max_concurrency * 2, max_keepalive_connections=max_concurrency),
+            headers={"Content-Type": "application/json",
+                     **({"Authorization": f"Bearer {api_key}"} if api_key else {})},
+        )
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(url)
+        if semaphore is None:
+            semaphore = self._semaphores[url] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _backoff(self, attempt: int, response: httpx.Response = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        # "Full jitter": spread retries of concurrent callers instead of having them retry in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _post(self, path: str, payload: dict, stream: bool = False) -> httpx.Response:
+        """POST with retries. Returns the response with status 2xx; the caller must close streamed responses."""
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                request = self._http.build_request("POST", url, json=payload)
+                response = await self._http.send(request, stream=stream)
+                if response.status_code < 400:
+                    return response
+                if stream:
+                    await response.aread()
+                    await response.aclose()
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    raise LLMError(f"LLM request to {url} failed with status {response.status_code}: {response.text}")
+                logging.warning("LLM request to %s returned %d, retrying (attempt %d/%d)", url,
+                                response.status_code, attempt + 1, self.max_retries)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise LLMError(f"LLM request to {url} failed: {e}") from e
+                logging.warning("LLM request to %s failed: %s, retrying (attempt %d/%d)", url, e, attempt + 1,
+                                self.max_retries)
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def chat(self, messages: list, model: str, **params) -> dict:
+        """Send a chat completion request and return the JSON response."""
+        payload = {"messages": messages, "model": model, **params, "stream": False}
+        async with self._semaphore(self.base_url):
+            with metrics.span("llm_call", model=model, streamed=False):
+                response = await self._post("/chat/completions", payload)
+        result = response.json()
+        usage = result.get("usage") or {}
+        metrics.record_tokens(model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        return result
+
+    async def stream_chat(self, messages: list, model: str, **params):
+        """Send a streaming chat completion request and yield content tokens as they arrive."""
+        payload = {"messages": messages, "model": model, **params, "stream": True}
+        async with self._semaphore(self.base_url):
+            start = time.perf_counter()
+            response = await self._post("/chat/completions", payload, stream=True)
+            usage = {}
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    # Servers that report usage on streams send it with the last chunk.
+                    usage = chunk.get("usage") or usage
+                    for choice in chunk.get("choices", []):
+                        token = (choice.get("delta") or {}).get("content")
+                        if token:
+                            yield token
+            finally:
+                await response.aclose()
+                metrics.record("llm_call", time.perf_counter() - start, model=model, streamed=True)
+                metrics.record_tokens(model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+_client: LLMClient = None
+_client_loop = None
+
+
+def get_client() -> LLMClient:
+    """
+    The shared client for the configured LLM endpoint (LLM_BASE_URL, LLM_API_KEY). Settings:
+    LLM_TIMEOUT (seconds, default 60), LLM_MAX_RETRIES (default 5), LLM_MAX_CONCURRENCY (default 8).
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # Connections and semaphores belong to an event loop, so a new loop gets a new client.
+    if _client is None or _client_loop is not loop:
+        if _client is not None:
+            _close_superseded(_client, _client_loop)
+        _client = LLMClient(
+            base_url=os.environ.get("LLM_BASE_URL", "https://inference.nebulablock.com/v1"),
+            api_key=os.environ.get("LLM_API_KEY"),
+            timeout=float(os.environ.get("LLM_TIMEOUT", 60)),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", 5)),
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 8)),
+        )
+        _client_loop = loop
+    return _client
+
+
+def _close_superseded(client: LLMClient, loop: asyncio.AbstractEventLoop) -> None:
+    """Close the client of another event loop on that loop, if it still runs."""
+    if loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    else:
+        # Its connections can only be closed by their own loop; they are released when the client is collected.
+        logging.warning("Dropping the LLM client of an event loop that is no longer running without closing it; "
+                        "call llm_client.close_client() before the loop ends.")
+
+
+async def close_client() -> None:
+    """Close the shared client if it belongs to the running event loop, e.g. when the server shuts down."""
+    global _client, _client_loop
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        client, _client, _client_loop = _client, None, None
+        await client.aclose()
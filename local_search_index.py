@@ -0,0 +1,203 @@
+import copy
+import asyncio
+import time
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+
+from graphrag.api.query import _reformat_context_data
+from graphrag.index.config.embeddings import entity_description_embedding
+from graphrag.query.factory import get_local_search_engine
+from graphrag.query.indexer_adapters import (
+    read_indexer_entities,
+    read_indexer_relationships,
+    read_indexer_reports,
+    read_indexer_text_units,
+)
+from graphrag.query.structured_search.local_search.mixed_context import LocalSearchMixedContext
+from graphrag.utils.embeddings import create_collection_name
+from graphrag.vector_stores.factory import VectorStoreFactory
+
+import index_store
+import metrics
+
+COMMUNITY_LEVEL = 2
+RESPONSE_TYPE = "Multiple Paragraphs"
+
+
+class IndexedLocalContext(LocalSearchMixedContext):
+    """
+    GraphRAG's local search context builder with a relationship adjacency index.
+
+    The stock builder scans every relationship once per selected entity, both to rank text units
+    and to pick the relationships that go into the context. Relationships are indexed by entity title
+    here, and those methods run on a view holding only the relationships of the selected entities.
+    Every relationship they would have kept touches a selected entity, so the context is the same.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.relationships_by_entity = defaultdict(list)
+        self._relationship_order = {}
+        for position, relationship in enumerate(self.relationships.values()):
+            self._relationship_order[relationship.id] = position
+            self.relationships_by_entity[relationship.source].append(relationship)
+            if relationship.target != relationship.source:
+                self.relationships_by_entity[relationship.target].append(relationship)
+
+    def _view(self, selected_entities: list) -> "IndexedLocalContext":
+        """Shallow copy limited to the relationships of the selected entities, in their original order."""
+        related = {}
+        for entity in selected_entities:
+            for relationship in self.relationships_by_entity.get(entity.title, ()):
+                related[relationship.id] = relationship
+        view = copy.copy(self)
+        view.relationships = {rid: related[rid] for rid in sorted(related, key=self._relationship_order.__getitem__)}
+        return view
+
+    def _build_text_unit_context(self, selected_entities, **kwargs):
+        return LocalSearchMixedContext._build_text_unit_context(self._view(selected_entities), selected_entities,
+                                                                **kwargs)
+
+    def _build_local_context(self, selected_entities, **kwargs):
+        return LocalSearchMixedContext._build_local_context(self._view(selected_entities), selected_entities,
+                                                            **kwargs)
+
+
+def build_local_search_engine(snapshot: index_store.IndexSnapshot):
+    """
+    Build the local search engine for an index snapshot the way graphrag.api.local_search does on
+    every call (indexer objects, vector store connection, prompt, LLM and embedding clients), but
+    with the adjacency-indexed context builder.
+    """
+    config = snapshot.config
+    tables = snapshot.tables
+    vector_store_args = config.embeddings.vector_store
+    collection_name = create_collection_name(vector_store_args.get("container_name", "default"),
+                                             entity_description_embedding)
+    description_embedding_store = VectorStoreFactory().create_vector_store(
+        vector_store_type=vector_store_args["type"],
+        kwargs={**vector_store_args, "collection_name": collection_name})
+    description_embedding_store.connect(**vector_store_args)
+
+    prompt = None
+    if config.local_search.prompt:
+        prompt_file = Path(config.root_dir) / config.local_search.prompt
+        if prompt_file.exists():
+            prompt = prompt_file.read_bytes().decode(encoding="utf-8")
+
+    engine = get_local_search_engine(
+        config=config,
+        reports=read_indexer_reports(tables["community_reports"], tables["nodes"], COMMUNITY_LEVEL),
+        text_units=read_indexer_text_units(tables["text_units"]),
+        entities=read_indexer_entities(tables["nodes"], tables["entities"], COMMUNITY_LEVEL),
+        relationships=read_indexer_relationships(tables["relationships"]),
+        covariates={"claims": []},
+        description_embedding_store=description_embedding_store,
+        response_type=RESPONSE_TYPE,
+        system_prompt=prompt,
+    )
+    stock = engine.context_builder
+    engine.context_builder = IndexedLocalContext(
+        community_reports=list(stock.community_reports.values()),
+        text_units=list(stock.text_units.values()),
+        entities=list(stock.entities.values()),
+        relationships=list(stock.relationships.values()),
+        covariates=stock.covariates,
+        entity_text_embeddings=stock.entity_text_embeddings,
+        embedding_vectorstore_key=stock.embedding_vectorstore_key,
+        text_embedder=stock.text_embedder,
+        token_encoder=stock.token_encoder,
+    )
+    return engine
+
+
+def _anonymous_bytes() -> int:
+    """Private resident memory of this process in bytes, from /proc/self/status (Linux); 0 elsewhere."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class LocalSearchEngines:
+    """
+    One prebuilt local search engine per resident index snapshot. Built on the first local search
+    against a snapshot and dropped when the snapshot is replaced. Like the index store, the engines of
+    the active and the previous version are kept while a new version is activated, so queries still
+    leasing the old version do not make the engine be rebuilt back and forth.
+
+    An engine holds the entities, relationships, text units and community reports as Python objects,
+    text included, so it takes private heap memory in every worker on top of the shared memory-mapped
+    tables. stats() reports how much each engine added to the process when it was built.
+    """
+
+    # Engines kept per project: the active version's and the previous one's.
+    PER_PROJECT = 2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines: OrderedDict[tuple, tuple] = OrderedDict()
+        self.builds = 0
+        self.build_seconds = 0.0
+
+    def get(self, snapshot: index_store.IndexSnapshot):
+        key = snapshot.project_directory, snapshot.output_folder
+        entry = self._engines.get(key)
+        if entry is not None and entry[0] is snapshot.tables:
+            return entry[1]
+        with self._lock:
+            entry = self._engines.get(key)
+            if entry is not None and entry[0] is snapshot.tables:
+                return entry[1]
+            with metrics.span("local_engine_build"):
+                start = time.perf_counter()
+                memory_before = _anonymous_bytes()
+                engine = build_local_search_engine(snapshot)
+                resident_bytes = max(0, _anonymous_bytes() - memory_before)
+                seconds = time.perf_counter() - start
+            self._engines.pop(key, None)
+            self._engines[key] = (snapshot.tables, engine, {"version": snapshot.version, "built_at": time.time(),
+                                                            "build_seconds": round(seconds, 3),
+                                                            "resident_bytes": resident_bytes})
+            project_keys = [other for other in self._engines if other[0] == snapshot.project_directory]
+            for other in project_keys[:-self.PER_PROJECT]:
+                del self._engines[other]
+            self.builds += 1
+            self.build_seconds = seconds
+            logging.info("Built local search engine for index version %s in %.2fs, resident size %.1f MB",
+                         snapshot.version, seconds, resident_bytes / (1024 * 1024))
+            return engine
+
+    def stats(self) -> dict:
+        """Build time and private memory of every prebuilt engine in this process."""
+        return {
+            "builds": self.builds,
+            "engines": [info for _, _, info in list(self._engines.values())],
+        }
+
+    async def search(self, snapshot: index_store.IndexSnapshot, query: str):
+        """Local search with the prebuilt engine. Returns (response, context) like graphrag.api.local_search."""
+        engine = await asyncio.to_thread(self.get, snapshot)
+        result = await engine.asearch(query=query)
+        metrics.record_tokens(snapshot.config.llm.model, result.prompt_tokens, result.output_tokens)
+        return result.response, _reformat_context_data(result.context_data)
+
+    async def search_streaming(self, snapshot: index_store.IndexSnapshot, query: str):
+        """Like graphrag.api.local_search_streaming: yields the context data first, then the answer tokens."""
+        engine = await asyncio.to_thread(self.get, snapshot)
+        first = True
+        async for chunk in engine.astream_search(query=query):
+            if first:
+                first = False
+                yield _reformat_context_data(chunk)
+            else:
+                yield chunk
+
+
+engines = LocalSearchEngines()
@@ -0,0 +1,227 @@
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets; LLM calls and index builds need the long tail.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Per-request timing breakdown, collected only while a request has asked for it.
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values, as in a Prometheus histogram."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    """
+    In-process metrics: latency histograms per stage, counters (LLM tokens, errors) and gauges, each keyed
+    by a metric name and a set of labels. Rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._help: dict[str, str] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def snapshot(self) -> dict:
+        """The values of all metrics as JSON-serializable lists, for another process to merge (see merged())."""
+        with self._lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+                "histograms": [[name, list(labels), histogram.counts, histogram.count, histogram.sum]
+                               for (name, labels), histogram in self._histograms.items()],
+            }
+
+    def merged(self, snapshot: dict) -> "Registry":
+        """A copy of this registry with the values of another process's snapshot added to its own."""
+        registry = Registry()
+        registry._help = self._help
+        for source in (self.snapshot(), snapshot):
+            for name, labels, value in source["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                registry._counters[key] = registry._counters.get(key, 0) + value
+            for name, labels, value in source["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                registry._gauges[key] = registry._gauges.get(key, 0) + value
+            for name, labels, counts, count, total in source["histograms"]:
+                histogram = registry._histograms.setdefault((name, tuple(map(tuple, labels))), Histogram())
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.count += count
+                histogram.sum += total
+        return registry
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    @staticmethod
+    def _labels(labels: tuple, extra: tuple = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("stage_seconds", "Latency of each processing stage in seconds.")
+registry.describe("stage_errors_total", "Stages that ended with an exception.")
+registry.describe("llm_tokens_total", "Tokens sent to (prompt) and received from (completion) the LLM.")
+registry.describe("search_rejected_total", "Searches turned away because the admission queue was full.")
+registry.describe("search_active", "Searches running now.")
+registry.describe("search_queue_depth", "Searches waiting for a slot.")
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """
+    Time a block as one observation of stage_seconds{stage=...}. Failed blocks are also counted in
+    stage_errors_total. If the current request collects timings, the span is added to its breakdown.
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, failed, **labels)
+
+
+def record(stage: str, seconds: float, failed: bool = False, **labels) -> None:
+    """Record an already measured stage duration, for stages that cannot be wrapped in a single span()."""
+    registry.observe("stage_seconds", seconds, stage=stage, **labels)
+    if failed:
+        registry.inc("stage_errors_total", stage=stage, **labels)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append({"stage": stage, **labels, "seconds": round(seconds, 4)})
+
+
+def record_tokens(model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    if prompt_tokens:
+        registry.inc("llm_tokens_total", prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        registry.inc("llm_tokens_total", completion_tokens, model=model, kind="completion")
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append({"stage": "llm_tokens", "model": model, "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens})
+
+
+@contextmanager
+def collect_timings():
+    """Collect the spans of the current request (including threads and tasks it starts) into the yielded list."""
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+class WorkflowTimingCallbacks:
+    """
+    GraphRAG pipeline callbacks (graphrag.callbacks.workflow_callbacks.WorkflowCallbacks) recording
+    the duration of every index workflow. Defined without importing graphrag so this module stays light.
+    """
+
+    def __init__(self, operation: str = "build"):
+        self.operation = operation
+        self._started: dict[str, float] = {}
+
+    def workflow_start(self, name: str, instance: object) -> None:
+        self._started[name] = time.perf_counter()
+
+    def workflow_end(self, name: str, instance: object) -> None:
+        start = self._started.pop(name, None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        registry.observe("stage_seconds", seconds, stage="index_workflow", workflow=name, operation=self.operation)
+        logging.info("Index workflow %s finished in %.2fs", name, seconds)
+
+    def progress(self, progress) -> None:
+        pass
+
+    def error(self, message: str, cause: BaseException = None, stack: str = None, details: dict = None) -> None:
+        registry.inc("stage_errors_total", stage="index_workflow", operation=self.operation)
+
+    def warning(self, message: str, details: dict = None) -> None:
+        pass
+
+    def log(self, message: str, details: dict = None) -> None:
+        pass
@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Literal, get_args
+
+# Search modes the API accepts: GraphRAG's searches, plus "auto" to let query_router pick one per question.
+# Requests with other modes are rejected before anything is timed, cached or embedded for them.
+SearchMode = Literal["local", "global", "dynamic", "basic", "auto"]
+SEARCH_MODES = get_args(SearchMode)
+
+
+def normalize_query(query: str) -> str:
+    """Queries differing only in case or whitespace share cache entries."""
+    return " ".join(query.split()).casefold()
+
+
+class AnswerCache:
+    """
+    Bounded LRU/TTL cache of query answers with single-flight coalescing.
+
+    Entries are keyed by (index version, search mode, normalized query), so activating a new
+    index version makes every older entry unreachable; they age out of the LRU. Identical
+    queries arriving while one is being computed wait for that computation instead of starting
+    their own. Callers store small values (graphrag_utils keeps the answer text and the context
+    record counts, not the context DataFrames), so the entry count bounds memory. Size and TTL
+    come from ANSWER_CACHE_SIZE (0 disables caching, coalescing still applies) and
+    ANSWER_CACHE_TTL in seconds.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size if self._max_size is not None else int(os.environ.get("ANSWER_CACHE_SIZE", 1024))
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl if self._ttl is not None else float(os.environ.get("ANSWER_CACHE_TTL", 3600))
+
+    @staticmethod
+    def key(version: str, mode: str, query: str) -> tuple:
+        return version, mode, normalize_query(query)
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, value) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def has(self, key: tuple) -> bool:
+        """True if key is cached or being computed, so asking for it does not start a search."""
+        return self.get(key) is not None or key in self._inflight
+
+    async def lookup(self, key: tuple):
+        """
+        Cached value for key, or the result of its in-flight computation; None (counted as a miss) if
+        there is neither, for callers that compute the value themselves.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            return None
+        self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def get_or_compute(self, key: tuple, compute):
+        """Return the cached value for key, or await compute() once for all concurrent callers and cache it."""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self.start(key, compute)
+        # Shielded, so a caller that gives up does not cancel the computation for the others.
+        return await asyncio.shield(task)
+
+    def start(self, key: tuple, compute) -> asyncio.Task:
+        """
+        Run compute() as the in-flight computation of key and cache its value, for a caller that
+        has just missed in lookup(). Identical lookups and get_or_compute() calls wait for it.
+        """
+        task = asyncio.ensure_future(self._compute(key, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _compute(self, key: tuple, compute):
+        value = await compute()
+        self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+cache = AnswerCache()
@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass
+
+import lancedb
+from graphrag.index.config.embeddings import entity_description_embedding
+from graphrag.utils.embeddings import create_collection_name
+
+import graphrag_utils
+import index_store
+import metrics
+
+# Search modes the router chooses from. "dynamic" is global search with dynamic community selection.
+ROUTED_MODES = ("basic", "local", "global", "dynamic")
+
+# Phrases asking about the corpus as a whole, which only the community-report map-reduce answers well.
+_GLOBAL_CUES = re.compile(
+    r"\b(overall|overview|summar(y|ise|ize)|in general|main (themes?|topics?|ideas?|points?|features?)"
+    r"|key (themes?|topics?|ideas?|points?|features?)|high[- ]level|compare|comparison|trends?|everything"
+    r"|all (the )?(features|components|topics|products|services))\b",
+    re.IGNORECASE)
+_WORD = re.compile(r"[\w\-.]+")
+# Longest entity title (in words) matched against the query.
+MAX_TITLE_WORDS = 4
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    mode: str
+    reason: str
+    seconds: float
+    similarity: float = None
+
+
+class QueryRouter:
+    """
+    Picks the cheapest search mode likely to answer a question, for queries sent with mode "auto".
+
+    In order:
+      1. Questions about the corpus as a whole (overview, summarize, main topics, compare...) go to
+         global search, with dynamic community selection once the index has at least
+         ROUTER_DYNAMIC_MIN_REPORTS community reports (default 50).
+      2. Questions naming a known entity go to local search.
+      3. Otherwise the question is embedded and compared with the entity descriptions in the vector
+         store: local search if the best cosine similarity is at least ROUTER_LOCAL_THRESHOLD
+         (default 0.5), basic (text unit vector) search if not. Set ROUTER_USE_EMBEDDINGS=False to
+         skip this step and use basic search directly.
+    """
+
+    def __init__(self):
+        self._titles = {}
+        self._tables = {}
+        self.decisions = Counter()
+
+    @property
+    def local_threshold(self) -> float:
+        return float(os.environ.get("ROUTER_LOCAL_THRESHOLD", 0.5))
+
+    @property
+    def dynamic_min_reports(self) -> int:
+        return int(os.environ.get("ROUTER_DYNAMIC_MIN_REPORTS", 50))
+
+    @property
+    def use_embeddings(self) -> bool:
+        return graphrag_utils.get_bool_env_var("ROUTER_USE_EMBEDDINGS", default=True)
+
+    def _entity_titles(self, snapshot: index_store.IndexSnapshot) -> frozenset:
+        cached = self._titles.get(snapshot.project_directory)
+        if cached is None or cached[0] is not snapshot.tables:
+            titles = frozenset(title.casefold() for title in snapshot.tables["entities"]["title"].dropna()
+                               if len(title) >= 3)
+            cached = self._titles[snapshot.project_directory] = (snapshot.tables, titles)
+        return cached[1]
+
+    def _mentioned_entity(self, snapshot: index_store.IndexSnapshot, query: str) -> str:
+        titles = self._entity_titles(snapshot)
+        words = [word.strip(".-").casefold() for word in _WORD.findall(query)]
+        for size in range(min(MAX_TITLE_WORDS, len(words)), 0, -1):
+            for i in range(len(words) - size + 1):
+                candidate = " ".join(words[i:i + size])
+                if candidate in titles:
+                    return candidate
+        return None
+
+    def _entity_table(self, snapshot: index_store.IndexSnapshot):
+        table = self._tables.get(snapshot.output_folder)
+        if table is None:
+            vector_store = snapshot.config.embeddings.vector_store
+            name = create_collection_name(vector_store.get("container_name", "default"), entity_description_embedding)
+            table = lancedb.connect(vector_store["db_uri"]).open_table(name)
+            # Only the active version's table is kept open.
+            self._tables = {snapshot.output_folder: table}
+        return table
+
+    def _best_entity_similarity(self, snapshot: index_store.IndexSnapshot, vector: list) -> float:
+        matches = self._entity_table(snapshot).search(vector).metric("cosine").limit(1).to_list()
+        return 1 - matches[0]["_distance"] if matches else 0.0
+
+    async def _decide(self, snapshot: index_store.IndexSnapshot, query: str) -> tuple:
+        cue = _GLOBAL_CUES.search(query)
+        if cue:
+            reports = len(snapshot.tables["community_reports"])
+            mode = "dynamic" if reports >= self.dynamic_min_reports else "global"
+            return mode, f"global cue '{cue.group(0)}', {reports} community reports", None
+        entity = self._mentioned_entity(snapshot, query)
+        if entity:
+            return "local", f"mentions entity '{entity}'", None
+        if not self.use_embeddings:
+            return "basic", "no entity mentioned", None
+        try:
+            vector = await index_store.text_embedder(snapshot).aembed(query)
+            similarity = await asyncio.to_thread(self._best_entity_similarity, snapshot, vector)
+        except Exception as e:
+            logging.error("Query routing by embedding failed, using local search: %s", e)
+            return "local", f"embedding lookup failed: {e}", None
+        if similarity >= self.local_threshold:
+            return "local", f"entity description similarity {similarity:.3f}", similarity
+        return "basic", f"entity description similarity {similarity:.3f} below threshold", similarity
+
+    async def route(self, snapshot: index_store.IndexSnapshot, query: str) -> RouteDecision:
+        start = time.perf_counter()
+        mode, reason, similarity = await self._decide(snapshot, query)
+        seconds = time.perf_counter() - start
+        self.decisions[mode] += 1
+        metrics.record("route", seconds, mode=mode)
+        logging.info("Routed query to %s search in %.3fs (%s): %s", mode, seconds, reason, query)
+        return RouteDecision(mode=mode, reason=reason, seconds=seconds, similarity=similarity)
+
+    def stats(self) -> dict:
+        return {
+            "decisions": dict(self.decisions),
+            "local_threshold": self.local_threshold,
+            "dynamic_min_reports": self.dynamic_min_reports,
+            "use_embeddings": self.use_embeddings,
+        }
+
+
+router = QueryRouter()
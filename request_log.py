@@ -0,0 +1,59 @@
+import os
+import json
+import time
+import logging
+import threading
+
+
+class RequestLog:
+    """
+    Optional JSONL log of every question asked through /query, /query_stream and the Telegram bot,
+    one line per request with its timestamp, source, search mode, latency and outcome. Enabled by
+    setting REQUEST_LOG_PATH; bench/replay.py plays such a log back against a running server.
+    """
+
+    def __init__(self, path: str = None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_path = None
+        self.errors = 0
+
+    @property
+    def path(self) -> str:
+        return self._path if self._path is not None else os.environ.get("REQUEST_LOG_PATH", "")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, source: str, query: str, mode: str, latency: float, status: str, **extra) -> None:
+        """Append one request. Failures are logged and otherwise ignored, so logging never fails a request."""
+        path = self.path
+        if not path:
+            return
+        entry = {"ts": round(time.time(), 3), "source": source, "mode": mode, "query": query,
+                 "latency_seconds": round(latency, 4), "status": status, **extra}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self._file is None or self._file_path != path:
+                    self.close()
+                    directory = os.path.dirname(path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    # Line buffered: every request reaches the file even if the process is killed.
+                    self._file = open(path, "a", encoding="utf-8", buffering=1)
+                    self._file_path = path
+                self._file.write(line)
+        except OSError as e:
+            self.errors += 1
+            logging.error("Could not write request log %s: %s", path, e)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+log = RequestLog()
@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+import lancedb
+
+import graphrag_utils
+import index_store
+import query_cache
+
+TABLE_NAME = "answers"
+
+
+def _quote(value: str) -> str:
+    """A string literal for a LanceDB filter."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+class SemanticCache:
+    """
+    Optional cache of answers to semantically similar questions, stored in a LanceDB table under
+    output/semantic_cache, next to the GraphRAG vector store.
+
+    Questions are embedded with the configured embedding model. A past answer for the same index
+    version and search mode is returned when its question's cosine similarity is at least
+    SEMANTIC_CACHE_THRESHOLD. Entries older than SEMANTIC_CACHE_TTL seconds or beyond the newest
+    SEMANTIC_CACHE_SIZE are evicted, as is everything from other index versions.
+    Enabled with SEMANTIC_CACHE_ENABLED.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._write_lock = threading.Lock()
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return graphrag_utils.get_bool_env_var("SEMANTIC_CACHE_ENABLED", default=False)
+
+    @property
+    def threshold(self) -> float:
+        return float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.92))
+
+    @property
+    def max_age(self) -> float:
+        return float(os.environ.get("SEMANTIC_CACHE_TTL", 86400))
+
+    @property
+    def max_size(self) -> int:
+        return int(os.environ.get("SEMANTIC_CACHE_SIZE", 5000))
+
+    def _table(self, project_directory: str):
+        """Open the cache table, or None if nothing has been cached yet."""
+        table = self._tables.get(project_directory)
+        if table is None:
+            db = lancedb.connect(os.path.join(project_directory, "output", "semantic_cache"))
+            if TABLE_NAME not in db.table_names():
+                return None
+            table = self._tables[project_directory] = db.open_table(TABLE_NAME)
+        return table
+
+    def _evict_other_versions(self, project_directory: str, table, version: str) -> None:
+        if self._versions.get(project_directory) != version:
+            table.delete(f"version != {_quote(version)}")
+            self._versions[project_directory] = version
+
+    def _lookup(self, project_directory: str, version: str, mode: str, vector: list):
+        table = self._table(project_directory)
+        if table is None:
+            return None
+        self._evict_other_versions(project_directory, table, version)
+        cutoff = time.time() - self.max_age
+        matches = (table.search(vector)
+                   .metric("cosine")
+                   .where(f"version = {_quote(version)} AND mode = {_quote(mode)} AND created_at >= {cutoff}",
+                          prefilter=True)
+                   .limit(1)
+                   .to_list())
+        if not matches:
+            return None
+        similarity = 1 - matches[0]["_distance"]
+        if similarity < self.threshold:
+            return None
+        logging.info("Semantic cache hit (similarity %.3f) for cached question: %s", similarity, matches[0]["query"])
+        return matches[0]["response"]
+
+    def _store(self, project_directory: str, version: str, mode: str, query: str, vector: list, response: str):
+        record = {"vector": vector, "query": query, "mode": mode, "version": version, "response": response,
+                  "created_at": time.time()}
+        table = self._table(project_directory)
+        if table is None:
+            db = lancedb.connect(os.path.join(project_directory, "output", "semantic_cache"))
+            table = self._tables[project_directory] = db.create_table(TABLE_NAME, data=[record])
+            self._versions[project_directory] = version
+            return
+        self._evict_other_versions(project_directory, table, version)
+        table.add([record])
+        table.delete(f"created_at < {time.time() - self.max_age}")
+        overflow = table.count_rows() - self.max_size
+        if overflow > 0:
+            created = sorted(row["created_at"] for row in table.search().select(["created_at"])
+                             .limit(table.count_rows()).to_list())
+            table.delete(f"created_at <= {created[overflow - 1]}")
+
+    def _locked_store(self, *args):
+        with self._write_lock:
+            self._store(*args)
+
+    async def lookup(self, snapshot: index_store.IndexSnapshot, mode: str, query: str):
+        """
+        Return (answer, embedding) — answer is None on a miss. The embedding is passed back to store()
+        so a miss does not embed the question twice. Modes the server does not search are not looked up.
+        """
+        if mode not in query_cache.SEARCH_MODES:
+            return None, None
+        try:
+            vector = await index_store.text_embedder(snapshot).aembed(query)
+            answer = await asyncio.to_thread(self._lookup, snapshot.project_directory, snapshot.version, mode, vector)
+        except Exception as e:
+            self.errors += 1
+            logging.error("Semantic cache lookup failed: %s", e)
+            return None, None
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer, vector
+
+    async def store(self, snapshot: index_store.IndexSnapshot, mode: str, query: str, vector: list, response: str):
+        if vector is None or not isinstance(response, str) or mode not in query_cache.SEARCH_MODES:
+            return
+        try:
+            await asyncio.to_thread(self._locked_store, snapshot.project_directory, snapshot.version, mode, query, vector,
+                                    response)
+        except Exception as e:
+            self.errors += 1
+            logging.error("Semantic cache store failed: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+cache = SemanticCache()
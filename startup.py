@@ -0,0 +1,84 @@
+import time
+import asyncio
+import logging
+import importlib
+
+# Modules that pull in GraphRAG, pandas, pyarrow and LanceDB, which take seconds to import. The API
+# imports them after it starts listening (see SearchStack.preload), not when agent.py is imported.
+SEARCH_MODULES = ["graphrag_utils", "index_store", "local_search_index", "query_router", "semantic_cache",
+                  "cache_warmer"]
+
+
+class SearchStack:
+    """
+    Deferred import of the search stack, plus the startup timing report of this process.
+
+    The server binds its port and answers /health right after the light modules are imported. The
+    lifespan then runs preload() in the background: it imports SEARCH_MODULES in a thread and loads
+    the active index version. Requests that need those modules await ready() first, so they wait
+    for the preload instead of blocking the event loop on the import lock.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.stages = {}
+        self.marks = {}
+        self.error = None
+        self._task = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._task is not None and self._task.done() and self._task.exception() is None
+
+    def mark(self, name: str) -> None:
+        """Record that the process reached a point of its startup, in seconds since this module was imported."""
+        self.marks[name] = round(time.perf_counter() - self.started, 3)
+        logging.info("Startup: %s after %.2fs", name, self.marks[name])
+
+    def _import_modules(self) -> None:
+        start = time.perf_counter()
+        for name in SEARCH_MODULES:
+            importlib.import_module(name)
+        self.stages["search_import"] = round(time.perf_counter() - start, 3)
+
+    async def _load(self) -> None:
+        await asyncio.to_thread(self._import_modules)
+        self.mark("search_imported")
+
+    def ready(self):
+        """
+        Awaitable that completes once the search modules are imported; starts the import if needed.
+        A failed import is forgotten once its waiters have seen the error, so the next caller retries it.
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._load())
+            self._task.add_done_callback(self._forget_failure)
+        return asyncio.shield(self._task)
+
+    def _forget_failure(self, task: asyncio.Task) -> None:
+        if self._task is task and (task.cancelled() or task.exception() is not None):
+            self._task = None
+
+    async def preload(self, project_directory: str) -> None:
+        """Import the search stack, then load the active index version if there is one."""
+        try:
+            await self.ready()
+            import index_store
+            import index_versions
+
+            if index_versions.active_version(project_directory) is not None:
+                snapshot = await asyncio.to_thread(index_store.store.get, project_directory)
+                self.stages["config_load"] = round(snapshot.config_seconds, 3)
+                self.stages["index_load"] = round(snapshot.load_seconds - snapshot.config_seconds, 3)
+                self.mark("index_loaded")
+        except Exception as e:
+            self.error = str(e)
+            logging.error("Startup preload failed: %s", e)
+        logging.info("Startup timings: %s", self.report())
+
+    def report(self) -> dict:
+        return {"started_at": self.started_at, "stages": self.stages, "marks": self.marks, "error": self.error}
+
+
+search = SearchStack()
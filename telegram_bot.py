@@ -1,13 +1,27 @@
 import asyncio
+import hmac
 import os
+import secrets
+import time
 import telegramify_markdown
 import telegramify_markdown.customize as customize
-from telegram import Update, MessageEntity
+from telegram import Message, Update, MessageEntity
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes
 import logging
 from dotenv import load_dotenv
-from agent import process_question  # Import the agent function
+import admission
+import index_versions
+import request_log
+import startup
+from agent import process_question_stream  # Import the agent function
 customize.strict_markdown = False
+# Maximum length of a Telegram text message.
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Set by the parent of SERVER_WORKERS uvicorn workers once it has registered the webhook, so the workers don't.
+WEBHOOK_REGISTERED_ENV = "TELEGRAM_WEBHOOK_REGISTERED"
+# Sent instead of an empty answer, which Telegram would reject.
+EMPTY_ANSWER = "Sorry, I could not find an answer to your question."
 # Configure logging.
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -18,25 +32,270 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Process user messages by calling the agent."""
+    """Process user messages by calling the agent, editing the reply as the answer streams in."""
     user_question = update.message.text
-    await update.message.reply_text("Processing your question, please wait...")
+    placeholder = await update.message.reply_text("Processing your question, please wait...")
+    reply = StreamingReply(placeholder)
+
+    async def on_queued(position: int):
+        try:
+            await placeholder.edit_text(f"Busy right now, you are #{position} in queue. Please wait...")
+        except TelegramError as e:
+            logging.warning("Could not report queue position: %s", e)
+
+    answer = ""
+    status = "success"
+    start = time.perf_counter()
     try:
-        # Call the process_question function from the agent module.
-        answer = await process_question(user_question)
+        # Searches are admitted per chat, so one busy group cannot starve the others; cached answers skip the queue.
+        async for token in process_question_stream(user_question, admission_key=f"chat:{update.effective_chat.id}",
+                                                   on_queued=on_queued):
+            answer += token
+            await reply.update(answer)
         logging.info("answer: %s", answer)
+    except admission.QueueFullError:
+        logging.warning("Search queue full, turning away question from chat %s", update.effective_chat.id)
+        answer = "The bot is busy answering other questions right now. Please try again in a minute."
+        status = "rejected"
+    except index_versions.IndexNotReadyError:
+        answer = "The knowledge base is still being built. Please ask again in a few minutes."
+        status = "not_ready"
     except Exception as e:
         logging.error("Error processing question: %s", e)
         answer = "There was an error processing your question. Please try again later."
-    await update.message.reply_text(text=telegramify_markdown.markdownify(answer), parse_mode="MarkdownV2")
+        status = "error"
+    request_log.log.record("telegram", user_question, "local", time.perf_counter() - start, status)
+    await reply.finish(update, answer)
+
+
+class StreamingReply:
+    """
+    Shows a streamed answer by editing one placeholder message.
+
+    Edits are sent at most every TELEGRAM_EDIT_INTERVAL seconds (default 1.5) as plain text, and
+    Telegram's RetryAfter is honoured and other failed edits are skipped. The final answer is rendered with telegramify_markdown and
+    split over several messages when it exceeds Telegram's length limit.
+    """
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.interval = float(os.getenv("TELEGRAM_EDIT_INTERVAL", 1.5))
+        self._next_edit = 0.0
+        self._last_text = message.text
+
+    async def update(self, answer: str):
+        now = time.monotonic()
+        if now < self._next_edit:
+            return
+        text = answer if len(answer) <= TELEGRAM_MESSAGE_LIMIT else answer[:TELEGRAM_MESSAGE_LIMIT - 1] + "…"
+        if not text.strip() or text == self._last_text:
+            return
+        self._next_edit = now + self.interval
+        try:
+            await self.message.edit_text(text)
+            self._last_text = text
+        except RetryAfter as e:
+            self._next_edit = time.monotonic() + _seconds(e.retry_after)
+        except TelegramError as e:
+            # An intermediate edit is best effort; a network error must not cost the answer.
+            logging.warning("Could not update streamed answer: %s", e)
+
+    async def finish(self, update: Update, answer: str):
+        chunks = split_markdown(answer) or [EMPTY_ANSWER]
+        for i, chunk in enumerate(chunks):
+            if i == 0:
+                await self._send_final(self.message.edit_text, chunk)
+            else:
+                await self._send_final(update.message.reply_text, chunk)
+
+    @staticmethod
+    async def _send_final(send, chunk: str):
+        for _ in range(3):
+            try:
+                await send(text=telegramify_markdown.markdownify(chunk), parse_mode="MarkdownV2")
+                return
+            except RetryAfter as e:
+                await asyncio.sleep(_seconds(e.retry_after))
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    return
+                # Fall back to plain text if the MarkdownV2 rendering is rejected
+                logging.warning("Could not send answer as MarkdownV2: %s", e)
+                await send(text=chunk[:TELEGRAM_MESSAGE_LIMIT])
+                return
+
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+def split_markdown(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """
+    Split a markdown answer into chunks whose MarkdownV2 rendering fits in one Telegram message.
+    Splits at the last paragraph break that fits, else the last line break, else the last space,
+    falling back to a hard cut. An empty or blank answer gives no chunks.
+    """
+    if not text.strip():
+        return []
+    if len(telegramify_markdown.markdownify(text)) <= limit:
+        return [text]
+    # Escaping makes the rendering longer than the source, so aim well below the limit.
+    size = limit * 3 // 4
+    while True:
+        chunks = []
+        rest = text
+        while rest:
+            if len(rest) <= size:
+                chunks.append(rest)
+                break
+            for sep in ("\n\n", "\n", " "):
+                cut = rest.rfind(sep, 0, size)
+                if cut > 0:
+                    # Drop the separator and blank lines, but keep the indentation of the next line.
+                    chunks.append(rest[:cut])
+                    rest = rest[cut + len(sep):].lstrip("\n")
+                    break
+            else:
+                chunks.append(rest[:size])
+                rest = rest[size:]
+        if size <= 256 or all(len(telegramify_markdown.markdownify(chunk)) <= limit for chunk in chunks):
+            return [chunk for chunk in chunks if chunk.strip()]
+        size //= 2
+
+
+async def _preload(application) -> None:
+    application.create_task(startup.search.preload(os.environ.get("WORK_DIRECTORY", "./ragtest")))
+
+
+def build_application(token: str, webhook: bool = False):
+    """
+    The bot application with its handlers. Updates are handled concurrently; the search admission
+    controller limits how many questions are answered at once. TELEGRAM_API_BASE points the bot at
+    another Bot API server, e.g. a local one or a stub for testing.
+    """
+    builder = ApplicationBuilder().token(token).concurrent_updates(True)
+    api_base = os.getenv("TELEGRAM_API_BASE")
+    if api_base:
+        builder = builder.base_url(f"{api_base}/bot").base_file_url(f"{api_base}/file/bot")
+    if webhook:
+        # Updates are pushed to the agent's FastAPI app instead of being polled.
+        builder = builder.updater(None)
+    application = builder.build()
+    application.add_handler(CommandHandler('start', start))
+    application.add_handler(
+        MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Entity(MessageEntity.MENTION), handle_message))
+    return application
+
+
+class WebhookBot:
+    """
+    The bot in webhook mode, served by the agent's FastAPI app (POST /telegram/webhook) so it shares
+    that process's index, caches and search admission. Enabled by TELEGRAM_WEBHOOK_URL, the public
+    HTTPS URL of that route, which is registered with Telegram on start. Telegram sends
+    TELEGRAM_WEBHOOK_SECRET in the X-Telegram-Bot-Api-Secret-Token header of every update; if it is
+    not set, a random one is generated, and updates without the secret are refused.
+
+    With several uvicorn workers the parent process registers the webhook once
+    (register_for_workers) and the workers inherit its secret through the environment.
+    """
+
+    def __init__(self):
+        self.application = None
+        self.updates = 0
+
+    @property
+    def url(self) -> str:
+        return os.environ.get("TELEGRAM_WEBHOOK_URL", "")
+
+    @property
+    def secret(self) -> str:
+        return os.environ.get("TELEGRAM_WEBHOOK_SECRET", "")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    @property
+    def running(self) -> bool:
+        return self.application is not None
+
+    @property
+    def registered_by_parent(self) -> bool:
+        return os.environ.get(WEBHOOK_REGISTERED_ENV) == self.url
+
+    def ensure_secret(self) -> str:
+        """Generate TELEGRAM_WEBHOOK_SECRET if it is not set; it goes into the environment for worker processes."""
+        if not self.secret:
+            os.environ["TELEGRAM_WEBHOOK_SECRET"] = secrets.token_urlsafe(32)
+            logging.info("TELEGRAM_WEBHOOK_SECRET is not set, generated one for this run.")
+        return self.secret
+
+    async def register(self, bot) -> bool:
+        try:
+            await bot.set_webhook(url=self.url, secret_token=self.ensure_secret(), allowed_updates=Update.ALL_TYPES)
+            logging.info("Telegram webhook registered at %s", self.url)
+            return True
+        except TelegramError as e:
+            # Updates POSTed to the route are still handled, e.g. when the webhook is registered elsewhere.
+            logging.error("Could not register Telegram webhook %s: %s", self.url, e)
+            return False
+
+    def register_for_workers(self) -> None:
+        """Register the webhook from the parent process before it starts the uvicorn workers."""
+        self.ensure_secret()
+
+        async def register():
+            application = build_application(os.getenv("TELEGRAM_BOT_TOKEN"), webhook=True)
+            try:
+                async with application.bot as bot:
+                    await self.register(bot)
+            except Exception as e:
+                logging.error("Could not register Telegram webhook %s: %s", self.url, e)
+
+        asyncio.run(register())
+        os.environ[WEBHOOK_REGISTERED_ENV] = self.url
+
+    async def start(self) -> None:
+        """
+        Start the bot application and register the webhook. A bad token or an unreachable Bot API is
+        logged and leaves the bot stopped (the route answers 404); the API keeps serving.
+        """
+        self.ensure_secret()
+        application = build_application(os.getenv("TELEGRAM_BOT_TOKEN"), webhook=True)
+        try:
+            await application.initialize()
+            await application.start()
+        except Exception as e:
+            logging.error("Could not start the Telegram bot in webhook mode: %s", e)
+            return
+        self.application = application
+        if not self.registered_by_parent:
+            await self.register(application.bot)
+
+    async def stop(self) -> None:
+        if self.application is None:
+            return
+        application, self.application = self.application, None
+        await application.stop()
+        await application.shutdown()
+
+    def authorized(self, secret_token: str) -> bool:
+        return bool(self.secret) and hmac.compare_digest(secret_token or "", self.secret)
+
+    async def process(self, payload: dict) -> None:
+        """Queue one update; it is handled in the background so Telegram gets its reply right away."""
+        self.updates += 1
+        await self.application.update_queue.put(Update.de_json(payload, self.application.bot))
+
+
+webhook = WebhookBot()
 
 
 if __name__ == '__main__':
     load_dotenv()  # Load environment variables from .env file
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")  # Get the token from the .env file
     logging.info("TELEGRAM_BOT_TOKEN: %s", TELEGRAM_BOT_TOKEN)
-    application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
-    application.add_handler(CommandHandler('start', start))
-    application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Entity(MessageEntity.MENTION), handle_message))
+    application = build_application(TELEGRAM_BOT_TOKEN)
+    # Import the search stack and load the index in the background while the bot already polls.
+    application.post_init = _preload
     application.run_polling()
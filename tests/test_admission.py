@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+import admission
+
+
+def test_waiters_are_served_round_robin_across_keys():
+    async def run():
+        controller = admission.AdmissionController(max_concurrent=1, max_queue=10)
+        await controller.acquire("busy")
+        order = []
+
+        async def ask(key, name):
+            await controller.acquire(key)
+            order.append(name)
+            controller.release()
+
+        tasks = [asyncio.create_task(ask("busy", f"busy-{i}")) for i in range(3)]
+        tasks.append(asyncio.create_task(ask("quiet", "quiet-0")))
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 4
+        controller.release()
+        await asyncio.gather(*tasks)
+        return order, controller.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["busy-0", "quiet-0", "busy-1", "busy-2"]
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+
+
+def test_cancelled_waiters_leave_the_queue():
+    async def run():
+        controller = admission.AdmissionController(max_concurrent=1, max_queue=2)
+        await controller.acquire("a")
+        waiters = [asyncio.create_task(controller.acquire(key)) for key in ("b", "c")]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        stats = controller.stats()
+        # Nobody is waiting any more, so a new request is queued instead of rejected.
+        queued = asyncio.create_task(controller.acquire("d"))
+        await asyncio.sleep(0)
+        controller.release()
+        await queued
+        return stats, controller.stats()
+
+    cancelled, after = asyncio.run(run())
+    assert cancelled["queue_depth"] == 0 and cancelled["queued_keys"] == 0
+    assert after["active"] == 1 and after["queue_depth"] == 0 and after["rejected"] == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def run():
+        controller = admission.AdmissionController(max_concurrent=1, max_queue=2)
+        await controller.acquire("a")
+        first = asyncio.create_task(controller.acquire("b"))
+        second = asyncio.create_task(controller.acquire("c"))
+        await asyncio.sleep(0)
+        # The slot goes to "b", which is cancelled before it gets to run.
+        controller.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await second
+        return controller.stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 1 and stats["queue_depth"] == 0
+
+
+def test_full_queue_rejects():
+    async def run():
+        controller = admission.AdmissionController(max_concurrent=1, max_queue=1)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(admission.QueueFullError) as error:
+            await controller.acquire("c")
+        waiter.cancel()
+        return error.value.queue_depth, controller.stats()
+
+    depth, stats = asyncio.run(run())
+    assert depth == 1 and stats["rejected"] == 1
@@ -0,0 +1,93 @@
+import os
+import subprocess
+
+import pytest
+
+import file_utils
+
+
+def git(path, *args):
+    return subprocess.run(["git", "-C", str(path), *args], check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+def commit(work, message):
+    git(work, "add", "-A")
+    git(work, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", message)
+    git(work, "push", "-q", "origin", "HEAD:main")
+    return git(work, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def docs(tmp_path, monkeypatch):
+    """A bare docs repository served over file://, and a working copy that pushes to it."""
+    remote = tmp_path / "docs.git"
+    work = tmp_path / "work"
+    subprocess.run(["git", "init", "-q", "--bare", "-b", "main", str(remote)], check=True)
+    subprocess.run(["git", "clone", "-q", str(remote), str(work)], check=True, capture_output=True)
+    git(work, "checkout", "-q", "-b", "main")
+    (work / "guide").mkdir()
+    (work / "intro.md").write_text("# Intro\n")
+    (work / "guide" / "setup.md").write_text("# Setup\n")
+    (work / "logo.png").write_bytes(b"\x89PNG")
+    commit(work, "initial")
+    # Allow the partial clone to fetch blobs from a local repository.
+    git(remote, "config", "uploadpack.allowFilter", "true")
+    monkeypatch.setenv("REPO_URL", f"file://{remote}")
+    return work
+
+
+def test_update_repo_clone_changes_and_no_op(docs, tmp_path):
+    local = str(tmp_path / "local")
+    cloned = file_utils.update_repo(local)
+    assert cloned.full
+    assert sorted(os.listdir(local)) == [".git", "guide", "intro.md"]
+
+    (docs / "intro.md").write_text("# Intro\n\nMore.\n")
+    (docs / "guide" / "setup.md").unlink()
+    (docs / "faq.md").write_text("# FAQ\n")
+    new_head = commit(docs, "edit")
+
+    changes = file_utils.update_repo(local, since=cloned.new_head)
+    assert changes.moved and changes.new_head == new_head
+    assert changes.added == ["faq.md"]
+    assert changes.modified == ["intro.md"]
+    assert changes.deleted == ["guide/setup.md"]
+    assert not os.path.exists(os.path.join(local, "guide", "setup.md"))
+
+    unchanged = file_utils.update_repo(local, since=new_head)
+    assert not unchanged.moved and not unchanged.full
+    assert unchanged.paths == set()
+
+
+def test_update_repo_diffs_against_indexed_commit(docs, tmp_path):
+    local = str(tmp_path / "local")
+    indexed = file_utils.update_repo(local).new_head
+    (docs / "faq.md").write_text("# FAQ\n")
+    commit(docs, "add faq")
+    # The index update for "add faq" never finished; the next sync still reports the file.
+    file_utils.update_repo(local, since=indexed)
+    (docs / "intro.md").write_text("# Intro\n\nMore.\n")
+    commit(docs, "edit intro")
+
+    changes = file_utils.update_repo(local, since=indexed)
+    assert changes.added == ["faq.md"]
+    assert changes.modified == ["intro.md"]
+
+
+def test_update_repo_without_indexed_commit_is_full(docs, tmp_path):
+    local = str(tmp_path / "local")
+    file_utils.update_repo(local)
+    changes = file_utils.update_repo(local, since="0" * 40)
+    assert changes.full
+
+
+def test_convert_only_reads_listed_sources(docs, tmp_path):
+    output = tmp_path / "input"
+    file_utils.convert_markdown_to_text(str(docs), str(output), workers=1)
+    (docs / "intro.md").write_text("# Intro\n\nMore.\n")
+    (docs / "guide" / "setup.md").write_text("# Setup\n\nChanged, but not listed.\n")
+
+    changeset = file_utils.convert_markdown_to_text(str(docs), str(output), workers=1, only={"intro.md"})
+    assert changeset.changed == ["intro.md"]
+    assert "guide/setup.md" in changeset.unchanged
@@ -0,0 +1,44 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import index_store
+import index_tables
+import index_versions
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build(project):
+    version_id, folder = index_versions.create_version(project)
+    for filename in index_tables.INDEX_TABLES.values():
+        pd.DataFrame({"id": ["1"], "title": [version_id]}).to_parquet(os.path.join(folder, filename))
+    index_versions.activate(project, version_id)
+    return version_id
+
+
+@pytest.fixture
+def project(tmp_path):
+    shutil.copy(os.path.join(REPO_DIR, "settings.yaml"), tmp_path / "settings.yaml")
+    return str(tmp_path)
+
+
+def test_swap_keeps_leased_snapshot_until_it_drains(project):
+    store = index_store.IndexStore()
+    old = build(project)
+    assert store.get(project).version == old
+
+    with index_versions.lease(project) as old_folder:
+        new = build(project)
+        # Queries on the old and the new version interleave without reloading either.
+        for _ in range(3):
+            assert store.get(project, old_folder).version == old
+            assert store.get(project).version == new
+        assert store.loads == 2
+        assert store.loaded_version(project) == new
+
+    assert store.get(project).version == new
+    assert [index["version"] for index in store.stats()["indexes"]] == [new]
+    assert store.loads == 2
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import shutil
+
+import pandas as pd
+import pytest
+import yaml
+
+import index_versions
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABLES = ["entities", "communities", "community_reports", "nodes", "text_units", "relationships"]
+
+
+def text_units(*texts):
+    return pd.DataFrame({"id": [f"unit-{i}" for i in range(len(texts))], "text": list(texts)})
+
+
+def write_tables(folder, units):
+    os.makedirs(folder, exist_ok=True)
+    for table in TABLES:
+        frame = units if table == "text_units" else pd.DataFrame({"id": ["1"]})
+        frame.to_parquet(os.path.join(folder, f"create_final_{table}.parquet"))
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(REPO_DIR, "settings.yaml"), tmp_path / "settings.yaml")
+    monkeypatch.setenv("CACHE_WARM_TOP_N", "0")
+    version_id, folder = index_versions.create_version(str(tmp_path))
+    write_tables(folder, text_units("Swan Chain overview."))
+    index_versions.activate(str(tmp_path), version_id)
+    return str(tmp_path)
+
+
+def test_update_activates_merged_tables(project, monkeypatch):
+    import graphrag_utils
+
+    async def graphrag_update(config_path, root_path, **kwargs):
+        # Like `graphrag update`: the merged tables go to update_index_storage, not to storage.
+        with open(config_path, encoding="utf-8") as f:
+            settings = yaml.safe_load(f)
+        assert settings["storage"]["base_dir"] != settings["update_index_storage"]["base_dir"]
+        write_tables(settings["update_index_storage"]["base_dir"],
+                     text_units("Swan Chain overview.", "How to run a computing provider."))
+
+    monkeypatch.setattr(graphrag_utils, "run_graphrag_update", graphrag_update)
+    base = index_versions.active_version(project)
+    asyncio.run(graphrag_utils.update_index(project))
+
+    active = index_versions.active_version(project)
+    assert active != base
+    folder = index_versions.version_folder(project, active)
+    units = pd.read_parquet(os.path.join(folder, "create_final_text_units.parquet"))
+    assert "How to run a computing provider." in set(units["text"])
+    assert not os.path.exists(os.path.join(folder, index_versions.UPDATE_DIR))
+
+
+def test_update_without_merged_tables_keeps_active_version(project, monkeypatch):
+    import graphrag_utils
+
+    async def graphrag_update(config_path, root_path, **kwargs):
+        pass
+
+    monkeypatch.setattr(graphrag_utils, "run_graphrag_update", graphrag_update)
+    base = index_versions.active_version(project)
+    with pytest.raises(ValueError):
+        asyncio.run(graphrag_utils.update_index(project))
+    assert index_versions.active_version(project) == base
+    assert index_versions.list_versions(project)["versions"] == [base]
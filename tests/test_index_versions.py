@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import index_versions
+
+
+def build(project, base=None):
+    version_id, _ = index_versions.create_version(project, base_version=base)
+    index_versions.activate(project, version_id)
+    return version_id
+
+
+@pytest.fixture
+def other_process():
+    """A live process standing in for an API worker."""
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def test_gc_keeps_version_leased_by_another_process(tmp_path, other_process):
+    project = str(tmp_path)
+    old = build(project)
+    leases = os.path.join(index_versions.version_folder(project, old), index_versions.LEASES_DIR)
+    os.makedirs(leases)
+    open(os.path.join(leases, str(other_process)), "w").close()
+    build(project)
+
+    assert index_versions.gc(project, keep=0) == []
+    os.remove(os.path.join(leases, str(other_process)))
+    assert index_versions.gc(project, keep=0) == [old]
+
+
+def test_gc_ignores_lease_of_dead_process(tmp_path):
+    project = str(tmp_path)
+    old = build(project)
+    process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    leases = os.path.join(index_versions.version_folder(project, old), index_versions.LEASES_DIR)
+    os.makedirs(leases)
+    open(os.path.join(leases, process.stdout.strip()), "w").close()
+    build(project)
+
+    assert index_versions.gc(project, keep=0) == [old]
+
+
+def test_lease_file_lives_as_long_as_the_lease(tmp_path):
+    project = str(tmp_path)
+    version_id = build(project)
+    lease_file = os.path.join(index_versions.version_folder(project, version_id), index_versions.LEASES_DIR,
+                              str(os.getpid()))
+    with index_versions.lease(project):
+        with index_versions.lease(project):
+            assert os.path.exists(lease_file)
+        assert os.path.exists(lease_file)
+        # Copies of a leased version don't inherit its lease files.
+        copy = build(project, base=version_id)
+        assert not os.path.exists(os.path.join(index_versions.version_folder(project, copy),
+                                               index_versions.LEASES_DIR))
+        assert version_id not in index_versions.gc(project, keep=0)
+    assert not os.path.exists(lease_file)
+    assert index_versions.gc(project, keep=0) == [version_id]
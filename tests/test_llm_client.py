@@ -0,0 +1,108 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import llm_client
+
+
+def mock_client(responses, **kwargs):
+    """An LLMClient whose requests get the given (status, headers) responses in turn; records the requests."""
+    client = llm_client.LLMClient("http://llm.test/v1", backoff_base=0.001, **kwargs)
+    requests = []
+
+    def handler(request):
+        status, headers = responses[min(len(requests), len(responses) - 1)]
+        requests.append(request)
+        body = {"choices": [{"message": {"content": "ok"}}]} if status == 200 else {"error": "nope"}
+        return httpx.Response(status, headers=headers, json=body)
+
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client, requests
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Delays the client backs off for, without waiting them out."""
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record(delay, *args, **kwargs):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", record)
+    return delays
+
+
+async def chat(client):
+    try:
+        return await client.chat([{"role": "user", "content": "hi"}], model="test")
+    finally:
+        await client.aclose()
+
+
+def test_retries_rate_limits_and_server_errors(sleeps):
+    client, requests = mock_client([(429, {}), (503, {}), (502, {}), (200, {})])
+    result = asyncio.run(chat(client))
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert len(requests) == 4
+    assert len(sleeps) == 3
+
+
+def test_honours_retry_after(sleeps):
+    client, _ = mock_client([(429, {"Retry-After": "7"}), (200, {})])
+    asyncio.run(chat(client))
+    assert sleeps == [7.0]
+
+    client, _ = mock_client([(503, {"Retry-After": "3600"}), (200, {})], backoff_max=30.0)
+    asyncio.run(chat(client))
+    assert sleeps[-1] == 30.0
+
+
+@pytest.mark.parametrize("status", [400, 401, 409, 422])
+def test_client_errors_are_not_retried(sleeps, status):
+    client, requests = mock_client([(status, {}), (200, {})])
+    with pytest.raises(llm_client.LLMError):
+        asyncio.run(chat(client))
+    assert len(requests) == 1
+    assert sleeps == []
+
+
+def test_gives_up_after_max_retries(sleeps):
+    client, requests = mock_client([(503, {})], max_retries=2)
+    with pytest.raises(llm_client.LLMError):
+        asyncio.run(chat(client))
+    assert len(requests) == 3
+
+
+def test_new_event_loop_closes_superseded_client(monkeypatch):
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "_client_loop", None)
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        async def get_client():
+            return llm_client.get_client()
+
+        superseded = asyncio.run_coroutine_threadsafe(get_client(), other_loop).result(timeout=10)
+
+        async def replace():
+            client = llm_client.get_client()
+            for _ in range(100):
+                if superseded._http.is_closed:
+                    break
+                await asyncio.sleep(0.01)
+            await llm_client.close_client()
+            return client
+
+        client = asyncio.run(replace())
+        assert client is not superseded
+        assert superseded._http.is_closed
+        assert llm_client._client is None
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(timeout=10)
+        other_loop.close()
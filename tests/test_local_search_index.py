@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import local_search_index
+
+
+def snapshot(version):
+    return SimpleNamespace(project_directory="project", output_folder=f"output/versions/{version}", tables={},
+                           version=version)
+
+
+def test_engines_are_kept_per_version_and_report_their_memory(monkeypatch):
+    built = []
+
+    def build(snapshot):
+        built.append(snapshot.version)
+        # Stands in for the indexer objects: 64 MB of private heap.
+        return [b"x" * (1 << 20) for _ in range(64)]
+
+    monkeypatch.setattr(local_search_index, "build_local_search_engine", build)
+    engines = local_search_index.LocalSearchEngines()
+    old, new = snapshot("old"), snapshot("new")
+    for _ in range(3):
+        engines.get(old)
+        engines.get(new)
+    assert built == ["old", "new"]
+
+    engines.get(snapshot("newer"))
+    stats = engines.stats()
+    assert [engine["version"] for engine in stats["engines"]] == ["new", "newer"]
+    if local_search_index._anonymous_bytes():
+        assert all(engine["resident_bytes"] >= 32 << 20 for engine in stats["engines"])
@@ -0,0 +1,30 @@
+import json
+
+import index_builder
+import metrics
+
+
+def test_builder_metrics_are_merged_into_render(tmp_path):
+    builder = metrics.Registry()
+    builder.observe("stage_seconds", 12.0, stage="index_build")
+    builder.observe("stage_seconds", 0.02, stage="search", mode="local")
+    builder.inc("llm_tokens_total", 100, model="m", kind="prompt")
+    (tmp_path / index_builder.METRICS_FILE).write_text(json.dumps(builder.snapshot()))
+
+    api = metrics.Registry()
+    api.describe("stage_seconds", "Latency of each processing stage in seconds.")
+    api.observe("stage_seconds", 0.04, stage="search", mode="local")
+    api.inc("llm_tokens_total", 5, model="m", kind="prompt")
+
+    text = api.merged(index_builder.read_metrics(str(tmp_path))).render()
+    assert 'stage_seconds_count{stage="index_build"} 1' in text
+    assert 'stage_seconds_count{mode="local",stage="search"} 2' in text
+    assert 'stage_seconds_bucket{mode="local",stage="search",le="0.025"} 1' in text
+    assert 'llm_tokens_total{kind="prompt",model="m"} 105' in text
+    assert text.count("# TYPE stage_seconds histogram") == 1
+    # The API's own registry is left as it was.
+    assert 'stage="index_build"' not in api.render()
+
+
+def test_missing_builder_metrics(tmp_path):
+    assert index_builder.read_metrics(str(tmp_path)) is None
@@ -0,0 +1,27 @@
+import asyncio
+import importlib
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORK_DIRECTORY", str(tmp_path / "project"))
+    # agent logs to process_server_<pid>.log in the working directory it is imported from.
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("agent")
+
+
+@pytest.mark.parametrize("path", ["/query", "/query_stream"])
+def test_unknown_mode_is_rejected_before_it_is_recorded(agent, path):
+    async def run():
+        transport = httpx.ASGITransport(app=agent.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://agent") as client:
+            response = await client.post(path, json={"query": "What is Swan Chain?", "mode": "x' OR '1'='1"})
+            metrics = await client.get("/metrics")
+        return response, metrics.text
+
+    response, metrics = asyncio.run(run())
+    assert response.status_code == 422
+    assert "1'='1" not in metrics
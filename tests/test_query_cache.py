@@ -0,0 +1,61 @@
+import asyncio
+
+import query_cache
+
+
+def test_concurrent_identical_questions_compute_once():
+    cache = query_cache.AnswerCache(max_size=8, ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        keys = [cache.key("v1", "local", query) for query in ("What is Swan?", "what is  swan?", "WHAT IS SWAN?")]
+        return await asyncio.gather(*(cache.get_or_compute(key, compute) for key in keys * 4))
+
+    assert asyncio.run(run()) == ["answer"] * 12
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["inflight"]) == (1, 11, 0)
+
+
+def test_failed_compute_is_not_cached():
+    cache = query_cache.AnswerCache(max_size=8, ttl=60)
+    key = cache.key("v1", "local", "What is Swan?")
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("llm down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute(key, failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not cache.has(key)
+
+    async def recovered():
+        return "answer"
+
+    assert asyncio.run(cache.get_or_compute(key, recovered)) == "answer"
+
+
+def test_new_version_misses():
+    cache = query_cache.AnswerCache(max_size=8, ttl=60)
+    cache.put(cache.key("v1", "local", "What is Swan?"), "old answer")
+
+    async def compute():
+        return "new answer"
+
+    new_key = cache.key("v2", "local", "What is Swan?")
+    assert cache.get(new_key) is None
+    assert asyncio.run(cache.get_or_compute(new_key, compute)) == "new answer"
+    assert cache.get(cache.key("v1", "local", "What is Swan?")) == "old answer"
+    assert cache.stats()["misses"] == 1
+
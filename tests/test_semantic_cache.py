@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+import index_store
+import semantic_cache
+
+
+class Embedder:
+    def __init__(self):
+        self.calls = 0
+
+    async def aembed(self, text):
+        self.calls += 1
+        return [1.0, 0.0, 0.0]
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    embedder = Embedder()
+    monkeypatch.setattr(index_store, "text_embedder", lambda snapshot: embedder)
+    return embedder
+
+
+class Snapshot:
+    def __init__(self, project_directory):
+        self.project_directory = project_directory
+        self.version = "v1"
+
+
+def test_unknown_mode_is_not_embedded(tmp_path, embedder):
+    cache = semantic_cache.SemanticCache()
+    answer, vector = asyncio.run(cache.lookup(Snapshot(str(tmp_path)), "local' OR '1'='1", "question"))
+    assert (answer, vector) == (None, None)
+    assert embedder.calls == 0
+
+
+def test_mode_is_matched_as_a_literal(tmp_path, embedder):
+    cache = semantic_cache.SemanticCache()
+    snapshot = Snapshot(str(tmp_path))
+
+    async def run():
+        _, vector = await cache.lookup(snapshot, "local", "What is Swan Chain?")
+        await cache.store(snapshot, "local", "What is Swan Chain?", vector, "A chain.")
+        hit, _ = await cache.lookup(snapshot, "local", "what's swan chain")
+        other_mode, _ = await cache.lookup(snapshot, "global", "what's swan chain")
+        quoted = await asyncio.to_thread(cache._lookup, snapshot.project_directory, "v1", "x' OR mode = 'local",
+                                         vector)
+        return hit, other_mode, quoted
+
+    hit, other_mode, quoted = asyncio.run(run())
+    assert hit == "A chain."
+    assert other_mode is None
+    assert quoted is None
@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+
+import startup
+
+
+def test_failed_import_is_retried(monkeypatch):
+    stack = startup.SearchStack()
+    monkeypatch.setattr(startup, "SEARCH_MODULES", ["search_module_that_does_not_exist"])
+
+    async def run():
+        with pytest.raises(ImportError):
+            await stack.ready()
+        assert not stack.loaded
+        monkeypatch.setattr(startup, "SEARCH_MODULES", ["json"])
+        await stack.ready()
+        assert stack.loaded and "search_imported" in stack.marks
+
+    asyncio.run(run())
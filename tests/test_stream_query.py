@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import index_versions
+import query_cache
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    version_id, _ = index_versions.create_version(str(tmp_path))
+    index_versions.activate(str(tmp_path), version_id)
+    monkeypatch.setattr(query_cache, "cache", query_cache.AnswerCache())
+    return str(tmp_path)
+
+
+def test_concurrent_streams_share_one_search(project, monkeypatch):
+    import graphrag_utils
+    searches = []
+
+    async def stream(project_directory, query, search_mode, start):
+        searches.append(query)
+        yield "context", graphrag_utils._context_event(start, {"entities": 2}, mode=search_mode)
+        for token in ("Swan ", "Chain"):
+            await asyncio.sleep(0.01)
+            yield "token", token
+        yield "done", "Swan Chain"
+
+    monkeypatch.setattr(graphrag_utils, "_stream_active_version", stream)
+
+    async def ask(query):
+        return [event async for event in graphrag_utils.stream_query_index(project, query, "local")]
+
+    async def run():
+        streams = await asyncio.gather(*(ask("What is Swan Chain?") for _ in range(3)))
+        answer, _ = await graphrag_utils.query_index(project, "what is swan  chain?", "local")
+        return streams, answer
+
+    streams, answer = asyncio.run(run())
+    assert searches == ["What is Swan Chain?"]
+    assert [event for event, _ in streams[0]] == ["context", "token", "token", "done"]
+    for events in streams[1:]:
+        assert events[0][1]["cached"] == "answer" and events[-1] == ("done", "Swan Chain")
+    assert answer == "Swan Chain"
+    stats = query_cache.cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 2, 1)
+
+
+def test_failed_stream_is_not_cached(project, monkeypatch):
+    import graphrag_utils
+
+    async def stream(project_directory, query, search_mode, start):
+        yield "context", graphrag_utils._context_event(start, {}, mode=search_mode)
+        raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr(graphrag_utils, "_stream_active_version", stream)
+
+    async def ask():
+        return [event async for event in graphrag_utils.stream_query_index(project, "q", "local")]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(ask())
+    assert query_cache.cache.stats()["size"] == 0
@@ -0,0 +1,73 @@
+import asyncio
+import importlib
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def telegram_bot(tmp_path_factory):
+    # Importing the bot imports agent, which logs to process_server_<pid>.log in the working directory.
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp("logs"))
+        return importlib.import_module("telegram_bot")
+
+
+class SentMessages:
+    """Stands in for the placeholder message the bot edits."""
+
+    def __init__(self):
+        self.text = None
+        self.texts = []
+
+    async def edit_text(self, text, **kwargs):
+        self.texts.append(text)
+
+    reply_text = edit_text
+
+
+def test_split_prefers_paragraph_breaks(telegram_bot):
+    chunks = telegram_bot.split_markdown("para one line\n\n" + "word " * 30, 60)
+    assert chunks[0] == "para one line"
+    assert all(len(chunk) <= 45 for chunk in chunks)
+    assert " ".join(chunks[1:]).split() == ["word"] * 30
+
+
+def test_split_keeps_indentation(telegram_bot):
+    text = "intro text here\n\n    code line one\n    code line two\n" + "x " * 40
+    chunks = telegram_bot.split_markdown(text, 60)
+    assert chunks[1] == "    code line one\n    code line two"
+
+
+def test_split_empty_answer(telegram_bot):
+    assert telegram_bot.split_markdown("") == []
+    assert telegram_bot.split_markdown(" \n") == []
+
+
+def test_finish_replaces_empty_answer(telegram_bot):
+    message = SentMessages()
+    reply = telegram_bot.StreamingReply(message)
+    asyncio.run(reply.finish(None, ""))
+    assert len(message.texts) == 1 and message.texts[0].strip()
+
+
+def test_failed_edit_keeps_streaming(telegram_bot):
+    from telegram.error import NetworkError
+
+    class FlakyMessage(SentMessages):
+        async def edit_text(self, text, **kwargs):
+            if text == "partial":
+                raise NetworkError("connection reset")
+            self.texts.append(text)
+
+    message = FlakyMessage()
+    reply = telegram_bot.StreamingReply(message)
+    reply.interval = 0
+
+    async def run():
+        await reply.update("partial")
+        await reply.update("partial answer")
+        await reply.finish(None, "full answer")
+
+    asyncio.run(run())
+    assert message.texts[0] == "partial answer"
+    assert "full answer" in message.texts[-1]
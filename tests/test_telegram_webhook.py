@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import importlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TOKEN = "123456:TEST"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Swan", "username": "swanchain_bot"}
+
+
+class StubBotApi(BaseHTTPRequestHandler):
+    """Answers Bot API calls like api.telegram.org and records them in server.calls."""
+
+    def do_POST(self):
+        token, method = self.path.split("/")[-2:]
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body or "{}")
+        else:
+            params = dict(parse_qsl(body))
+        self.server.calls.append((method, params))
+        if token != f"bot{TOKEN}":
+            return self._reply(401, {"ok": False, "error_code": 401, "description": "Unauthorized"})
+        if method == "getMe":
+            return self._reply(200, {"ok": True, "result": BOT_USER})
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 1))
+            message = {"message_id": 200, "date": int(time.time()), "chat": {"id": chat_id, "type": "supergroup"},
+                       "from": BOT_USER, "text": params.get("text", "")}
+            return self._reply(200, {"ok": True, "result": message})
+        self._reply(200, {"ok": True, "result": True})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def bot_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBotApi)
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def agent(bot_api, tmp_path, monkeypatch):
+    monkeypatch.setenv("TELEGRAM_API_BASE", f"http://127.0.0.1:{bot_api.server_address[1]}")
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", TOKEN)
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_URL", "https://bot.example.com/telegram/webhook")
+    monkeypatch.setenv("TELEGRAM_EDIT_INTERVAL", "0")
+    monkeypatch.setenv("WORK_DIRECTORY", str(tmp_path / "project"))
+    monkeypatch.delenv("TELEGRAM_WEBHOOK_SECRET", raising=False)
+    monkeypatch.delenv("TELEGRAM_WEBHOOK_REGISTERED", raising=False)
+    # agent logs to process_server_<pid>.log in the working directory it is imported from.
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("agent")
+
+
+def load_update(name):
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def wait_for(calls, method, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found = [params for name, params in calls if name == method]
+        if found:
+            return found
+        await asyncio.sleep(0.1)
+    raise AssertionError(f"Bot API method {method} was not called, calls: {calls}")
+
+
+def test_webhook_handles_recorded_updates(agent, bot_api):
+    async def run():
+        async with agent.lifespan(agent.app):
+            secret = os.environ["TELEGRAM_WEBHOOK_SECRET"]
+            assert secret
+            webhooks = [params for method, params in bot_api.calls if method == "setWebhook"]
+            assert len(webhooks) == 1 and webhooks[0]["secret_token"] == secret
+
+            transport = httpx.ASGITransport(app=agent.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://agent") as client:
+                unsigned = await client.post("/telegram/webhook", json=load_update("telegram_update_start.json"))
+                assert unsigned.status_code == 403
+                headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+                for name in ("telegram_update_start.json", "telegram_update_mention.json"):
+                    response = await client.post("/telegram/webhook", json=load_update(name), headers=headers)
+                    assert response.status_code == 200
+
+            sent = await wait_for(bot_api.calls, "sendMessage")
+            # /start is answered, and the question gets a placeholder that is edited into the answer.
+            assert any("Welcome" in params["text"] for params in sent)
+            assert any("Processing your question" in params["text"] for params in sent)
+            edits = await wait_for(bot_api.calls, "editMessageText")
+            # No index has been built in the empty project.
+            assert any("still being built" in params["text"] for params in edits)
+
+    asyncio.run(run())
+
+
+def test_webhook_start_failure_keeps_serving(agent, bot_api, monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "999:REVOKED")
+
+    async def run():
+        async with agent.lifespan(agent.app):
+            transport = httpx.ASGITransport(app=agent.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://agent") as client:
+                assert (await client.get("/health")).status_code == 200
+                response = await client.post("/telegram/webhook", json=load_update("telegram_update_mention.json"),
+                                             headers={"X-Telegram-Bot-Api-Secret-Token":
+                                                      os.environ["TELEGRAM_WEBHOOK_SECRET"]})
+                assert response.status_code == 404
+        assert [method for method, _ in bot_api.calls] == ["getMe"]
+
+    asyncio.run(run())